@@ -1,6 +1,10 @@
 # ----------------------------------------------------------------------------
 # DataBar: This class displays data as horizontal or vertical bar.
 #
+# Animated bars don't jump to a new value: set_value() only sets the target
+# size, step() moves the bar a fraction of the remaining distance (integer
+# math) and resizes the existing rectangle in place.
+#
 # Author: Bernhard Bablok
 # License: GPL3
 #
@@ -25,7 +29,7 @@ class DataBar(DataCell):
 
   def __init__(self,size, font, color, bg_color=None, format=None,
                text_justify=Justify.LEFT, text_color=None,
-               horizontal=True, range=(0,100)):
+               horizontal=True, range=(0,100), animate=False):
     """ constructor """
 
     if font:
@@ -37,6 +41,8 @@ class DataBar(DataCell):
     self._justify    = text_justify
     self._range      = range
     self._horizontal = horizontal
+    self.animated    = animate
+    self._target     = 0            # target size (pixels) of animated bars
 
     self._palette = displayio.Palette(2)
     self._palette[0] = bg_color
@@ -70,12 +76,25 @@ class DataBar(DataCell):
       return
 
     # otherwise, calculate fractional size of the bar
+    self._set_pixels(self._pixels(value))
+
+  def _pixels(self,value):
+    """ return size of the bar (pixels) for the value """
+
     rel_size = max(0,min(
       (value-self._range[0])/(self._range[1]-self._range[0]),1))
     if self._horizontal:
-      self.width = int(rel_size*self._size[0])
+      return int(rel_size*self._size[0])
+    else:
+      return int(rel_size*self._size[1])
+
+  def _set_pixels(self,pixels):
+    """ set variable dimension """
+
+    if self._horizontal:
+      self.width = pixels
     else:
-      self.height = int(rel_size*self._size[1])
+      self.height = pixels
 
   # --- set position   -------------------------------------------------------
 
@@ -107,6 +126,11 @@ class DataBar(DataCell):
     lbl = label.Label(self.font,
                       color=self._text_color,
                       text=self.format.format(self.value))
+    self._place_label(lbl)
+    return lbl
+
+  def _place_label(self,lbl):
+    """ set position of label relative to the bar """
 
     if self._justify == Justify.LEFT:
       # start of bar
@@ -123,7 +147,6 @@ class DataBar(DataCell):
 
     lbl.anchor_point = (x_anchor,0.5)
     lbl.anchored_position = (x,y)
-    return lbl
 
   # --- set value   -----------------------------------------------------------
 
@@ -131,7 +154,17 @@ class DataBar(DataCell):
     """ set value of content """
 
     super().set_value(value)
+    if self.animated and value is not None and len(self.content):
+      # keep current size, step() moves the bar
+      self._target = self._pixels(value)
+      self._palette[1] = self.value2color(value)
+      if self.format:
+        self.content[1].text = self.format.format(value)
+      return
+
     self._set_size(value)
+    if value is not None:
+      self._target = self.width if self._horizontal else self.height
 
     if value is None or self.height == 0:
       for i in range(len(self.content)):
@@ -140,27 +173,58 @@ class DataBar(DataCell):
       return
 
     self._palette[1] = self.value2color(value)
-    if self.width:
+    self._set_bar()
+
+    if self.format:
+      if len(self.content) == 2:
+        # label already available
+        self.content[1] = self._get_label()
+      else:
+        self.content.append(self._get_label())
+    gc.collect()
+
+  # --- set bar   -----------------------------------------------------------
+
+  def _set_bar(self):
+    """ create bar or resize it in place """
+
+    if not self.width or not self.height:
+      bar = displayio.Group()       # dummy content
+    elif len(self.content) and isinstance(self.content[0],Rectangle):
+      self.content[0].width  = self.width
+      self.content[0].height = self.height
+      return
+    else:
       bar = Rectangle(x=0,y=0,
                       pixel_shader=self._palette,
                       width=self.width,
                       height=self.height,
                       color_index=1)
-    else:
-      bar = displayio.Group()       # dummy content
     if len(self.content):
       # content already available
       self.content[0] = bar
     else:
       self.content.append(bar)
 
-    if self.format:
-      if len(self.content) == 2:
-        # label already available
-        self.content[1] = self._get_label()
-      else:
-        self.content.append(self._get_label())
-    gc.collect()
+  # --- animate bar   ---------------------------------------------------------
+
+  def step(self,shift=2):
+    """ move bar 1/2**shift of the distance (at least one pixel) towards
+    its target. Returns True if the size changed.
+    """
+
+    if not len(self.content):
+      return False
+    size  = self.width if self._horizontal else self.height
+    delta = self._target - size
+    if not delta:
+      return False
+    move = (abs(delta) + (1<<shift) - 1) >> shift
+    self._set_pixels(size + move if delta > 0 else size - move)
+    self._set_bar()
+    if len(self.content) == 2:
+      self._place_label(self.content[1])
+    return True
 
   # --- invert color   -------------------------------------------------------
 
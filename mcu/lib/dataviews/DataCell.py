@@ -27,6 +27,7 @@ class DataCell:
     self.format = format
     self.content = None
     self.value = None
+    self.animated = False
 
   # --- set position   -------------------------------------------------------
 
@@ -53,6 +54,12 @@ class DataCell:
     """ set value of content """
     self.value = value
 
+  # --- animate content   ----------------------------------------------------
+
+  def step(self,shift=2):
+    """ move content towards its value, return True if it changed """
+    return False
+
   # --- set color from color_range and value   -------------------------------
 
   def value2color(self,value):
@@ -0,0 +1,145 @@
+# ----------------------------------------------------------------------------
+# DataHeatmap: This class displays many values as a grid of colored cells.
+#
+# All values share a single Bitmap/TileGrid and a gradient palette. Every
+# value maps to one pixel of the bitmap, which is scaled up by the
+# enclosing group. Updates only write the pixels of changed values.
+#
+# Values are passed as a packed array of bytes (bytes, bytearray,
+# memoryview or a list of ints). No float conversion takes place.
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/circuitpython-dataviews
+# ----------------------------------------------------------------------------
+
+import displayio
+
+from dataviews.Base import Color
+from .DataCell import DataCell
+
+# --- Class implementing heatmaps as cell-content   --------------------------
+
+class DataHeatmap(DataCell):
+
+  # --- constructor   --------------------------------------------------------
+
+  def __init__(self, n, cols, cell_size,
+               color=(Color.GREEN,Color.YELLOW,Color.RED),
+               bg_color=Color.BLACK, levels=16, range=(0,100)):
+    """ constructor """
+
+    super().__init__(None,color,bg_color,None)
+    self._n      = n
+    self._cols   = cols
+    self._rows   = (n+cols-1)//cols
+    self._levels = levels
+    self._range  = range
+
+    self.width  = self._cols*cell_size
+    self.height = self._rows*cell_size
+
+    # palette-index 0 is the background, 1..levels is the gradient
+    self._palette = displayio.Palette(levels+1)
+    self._set_palette()
+    self._create_lut()
+
+    # current palette-index of every value (0: no value)
+    self._index  = bytearray(n)
+    self._bitmap = displayio.Bitmap(self._cols,self._rows,levels+1)
+    self._grid   = displayio.TileGrid(self._bitmap,pixel_shader=self._palette)
+    self.content = displayio.Group(scale=cell_size)
+    self.content.append(self._grid)
+
+  # --- create lookup-table value -> palette-index   --------------------------
+
+  def _create_lut(self):
+    """ map every byte-value to a palette-index """
+
+    lo,hi = self._range
+    self._lut = bytearray(256)
+    for v in range(256):
+      if v <= lo:
+        self._lut[v] = 1
+      elif v >= hi:
+        self._lut[v] = self._levels
+      else:
+        self._lut[v] = 1 + min(self._levels-1,(v-lo)*self._levels//(hi-lo))
+
+  # --- interpolate gradient   -----------------------------------------------
+
+  def _set_palette(self):
+    """ fill palette with background and gradient colors """
+
+    self._palette[0] = self.bg_color
+    stops = self.color
+    if not isinstance(stops,(list,tuple)):
+      stops = (self.bg_color,stops)
+    segs = len(stops)-1
+    den  = max(1,self._levels-1)
+    for i in range(self._levels):
+      # position of level within the gradient: segment and fraction num/den
+      pos = i*segs
+      seg = min(pos//den,segs-1)
+      num = pos - seg*den
+      c0  = stops[seg]
+      c1  = stops[seg+1]
+      rgb = 0
+      for shift in (16,8,0):
+        v0 = (c0 >> shift) & 0xFF
+        v1 = (c1 >> shift) & 0xFF
+        rgb |= (v0 + (v1-v0)*num//den) << shift
+      self._palette[i+1] = rgb
+
+  # --- set position   -------------------------------------------------------
+
+  def set_position(self,anchor_point,anchor_position):
+    """ set position of content """
+
+    self.content.x = int(anchor_position[0]
+                         - round(anchor_point[0] * self.width))
+    self.content.y = int(anchor_position[1]
+                         - round(anchor_point[1] * self.height))
+
+  # --- set color   ----------------------------------------------------------
+
+  def set_color(self,color):
+    """ set color (a single color or a list of gradient stops) """
+    super().set_color(color)
+    self._set_palette()
+
+  # --- set value   -----------------------------------------------------------
+
+  def set_value(self,value):
+    """ set values of the heatmap (packed bytes) """
+
+    super().set_value(value)
+    index  = self._index
+    bitmap = self._bitmap
+    cols   = self._cols
+
+    if value is None:
+      for i in range(self._n):
+        if index[i]:
+          index[i] = 0
+          bitmap[i%cols,i//cols] = 0
+      return
+
+    lut = self._lut
+    for i in range(min(len(value),self._n)):
+      idx = lut[value[i]]
+      if idx != index[i]:
+        index[i] = idx
+        bitmap[i%cols,i//cols] = idx
+
+  # --- invert color   -------------------------------------------------------
+
+  def invert(self):
+    """ swap color and bg_color.
+    Does nothing for gradients: their colors map values.
+    """
+    if isinstance(self.color,(list,tuple)):
+      return
+    self.color,self.bg_color = self.bg_color,self.color
+    self._set_palette()
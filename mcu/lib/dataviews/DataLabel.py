@@ -22,7 +22,7 @@ class DataLabel(DataCell):
     """ constructor """
     super().__init__(font,color,bg_color,format)
     # note: bg_color ignored for performance reasons
-    self.content = label.Label(self.font, color=self.color)
+    self.content = label.Label(self.font, color=self.value2color(None))
 
   # --- width and height properties   ----------------------------------------
 
@@ -55,6 +55,8 @@ class DataLabel(DataCell):
   def set_value(self,value):
     """ set value of content """
 
+    if isinstance(value,(bytes,bytearray)):
+      value = value.decode()          # text sent as an array
     super().set_value(value)
     if value is None:
       self.content.text = "" if not self.format else self.format
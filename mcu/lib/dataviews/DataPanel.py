@@ -27,11 +27,14 @@ class PanelText:
                text="",
                color=None,
                fontname=None,
-               justify=Justify.CENTER):
+               justify=Justify.CENTER,
+               font=None):
     self._text    = text
     self._color   = color
-    self.font     = (terminalio.FONT if fontname is None else
-                    bitmap_font.load_font(fontname))
+    if font is None:                # no loaded font: load fontname
+      font        = (terminalio.FONT if fontname is None else
+                     bitmap_font.load_font(fontname))
+    self.font     = font
     self._justify = justify
 
   # --- get/set text (and update label)   ------------------------------------
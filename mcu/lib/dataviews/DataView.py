@@ -38,6 +38,7 @@ class DataView(BaseGroup):
                divider=False,               # print divider
                padding=1,                   # padding next to border/divider
                fontname=None,               # font (defaults to terminalio.FONT
+               font=None,                   # loaded font (instead of fontname)
                justify=Justify.RIGHT,          # justification of labels
                formats=None,                # format of labels
                objects=None,                # list (row,col,DataCell)
@@ -56,7 +57,8 @@ class DataView(BaseGroup):
 
     self._dim      = dim
     self._divider  = divider
-    font           = (terminalio.FONT if fontname is None else
+    if font is None:
+      font         = (terminalio.FONT if fontname is None else
                       bitmap_font.load_font(fontname))
 
     if isinstance(justify,int):
@@ -238,6 +240,8 @@ class DataView(BaseGroup):
             format=formats[col+row*self._cols])
         group.append(self._cells[col+row*self._cols].content)
 
+    self._animated = [i for i,cell in enumerate(self._cells) if cell.animated]
+
     if self._auto_width:
       self._calc_cell_w()
     self._calc_cell_x()
@@ -259,6 +263,10 @@ class DataView(BaseGroup):
       # set color for given label
       self._cells[index].set_color(color)
 
+  def get_color(self,index):
+    """ get color of given cell """
+    return self._cells[index].color
+
   # --- color property of DataView   -----------------------------------------
 
   @BaseGroup.color.setter
@@ -327,6 +335,26 @@ class DataView(BaseGroup):
     else:
         self._cells[index].set_format(format)
 
+  # --- update layout after value changes   ----------------------------------
+
+  def _update_layout(self,indices=None):
+    """ recalculate column-widths. Lines are only recreated if
+    the widths changed. Otherwise only the given cells are repositioned.
+    """
+
+    cell_w = self._cell_w
+    self._calc_cell_w()
+    if self._cell_w != cell_w:
+      self._calc_cell_x()
+      self._set_positions()
+      self._create_lines()
+    elif indices is None:
+      self._set_positions()
+    else:
+      for index in indices:
+        row,col = divmod(index,self._cols)
+        self._set_position(self._cells[index],row,col)
+
   # --- set values    --------------------------------------------------------
 
   def set_values(self,values,index=None):
@@ -338,7 +366,45 @@ class DataView(BaseGroup):
       self._cells[index].set_value(values)
 
     if self._auto_width:
-      self._calc_cell_w()
-      self._calc_cell_x()
-      self._set_positions()
-      self._create_lines()
+      self._update_layout()
+
+  # --- set values of selected cells   ---------------------------------------
+
+  def set_values_at(self,indices,values=None):
+    """ set values of the given cells only.
+    Either pass a sequence of indices and a sequence of values (e.g. a
+    preallocated list or array), or an iterable of (index,value)-tuples.
+    """
+
+    cells = self._cells
+    if values is None:
+      if self._auto_width:
+        indices = list(indices)
+      for index,value in indices:
+        cells[index].set_value(value)
+      if self._auto_width:
+        self._update_layout([index for index,_ in indices])
+    else:
+      for i in range(len(indices)):
+        cells[indices[i]].set_value(values[i])
+      if self._auto_width:
+        self._update_layout(indices)
+
+  # --- animate cells   ------------------------------------------------------
+
+  def animate(self,shift=2):
+    """ move animated cells one step towards their values.
+    Returns True if a cell changed (i.e. a refresh is necessary).
+    """
+
+    moved = [index for index in self._animated
+             if self._cells[index].step(shift)]
+    if not moved:
+      return False
+    if self._auto_width:
+      self._update_layout(moved)
+    else:
+      for index in moved:
+        row,col = divmod(index,self._cols)
+        self._set_position(self._cells[index],row,col)
+    return True
@@ -0,0 +1,394 @@
+# ----------------------------------------------------------------------------
+# Layout: compile a layout-description (JSON) into the view-tree.
+#
+# The layout file describes the display, the data-source and a grid of
+# cells. Cells are either static texts or metric cells (label, bar,
+# heatmap or text, i.e. text sent as an array). Loading the file validates
+# it and compiles the metric-to-cell map, which is used to write decoded
+# values directly into the cells.
+#
+# Instead of a single view, the layout may define a list of pages (every
+# page is a view). Cells are numbered across all pages: the cells of a page
+# start at the base of the page (the number of cells of all pages before).
+#
+# Loading and validation only need plain Python, so this module also runs
+# under CPython:
+#
+#   python3 mcu/lib/sysmon/Layout.py mcu/layout.json
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/cp-sysmon
+# ----------------------------------------------------------------------------
+
+import json
+
+try:
+  from dataviews.Base import Color
+except ImportError:
+  Color = None                  # plain CPython: skip check of color-names
+
+# metric kinds
+SCALAR = 0                      # a single number
+ARRAY  = 1                      # packed bytes (e.g. per-core values)
+
+CELL_TYPES = {'label': SCALAR, 'bar': SCALAR, 'heatmap': ARRAY,
+              'text': ARRAY}
+JUSTIFY    = {'LEFT': 0, 'CENTER': 1, 'RIGHT': 2}
+
+# --- class Layout   ---------------------------------------------------------
+
+class Layout:
+  """ compiled layout """
+
+  # --- constructor   --------------------------------------------------------
+
+  def __init__(self,path):
+    """ load and compile layout-file """
+
+    with open(path,'r') as f:
+      self._spec = json.load(f)
+
+    self.source  = self._spec.get('source','usb')
+    self.font    = self._spec.get('font',None)
+    self.period  = self._spec.get('period',1000)   # min. update period (ms)
+    self.history = self._spec.get('history',None)  # {width,span} or None
+    self.fps     = self._spec.get('fps',0)         # animation of bars (0: off)
+    self.page_time = self._spec.get('page_time',0)  # rotate pages (seconds)
+    self._colors = self._spec.get('colors',{})
+    self._fonts  = {}           # loaded fonts (shared by all pages)
+    self._compile()
+    # color of cells with outdated values (flagged stale by the collector)
+    self.stale_color = self._color(self._spec.get('stale_color','GRAY'))
+
+  # --- resolve a color   ----------------------------------------------------
+
+  def _color(self,value):
+    """ convert color-name, '#RRGGBB' or int to an int """
+
+    if value is None or isinstance(value,int):
+      return value
+    if isinstance(value,str):
+      if value.startswith('#'):
+        return int(value[1:],16)
+      if Color is None:
+        return value            # resolved when creating the view
+      if hasattr(Color,value):
+        return getattr(Color,value)
+    raise ValueError(f"invalid color: {value}")
+
+  # --- resolve a color-range   ----------------------------------------------
+
+  def _color_range(self,value):
+    """ convert a named or inline color-range, gradient or single color """
+
+    if isinstance(value,str) and value in self._colors:
+      value = self._colors[value]
+    if isinstance(value,list):
+      if value and isinstance(value[0],list):
+        # color-range [[color,limit],...]
+        return [(self._color(c),v) for c,v in value]
+      # list of colors (gradient)
+      return [self._color(c) for c in value]
+    return self._color(value)
+
+  # --- compile view-spec   --------------------------------------------------
+
+  def _compile(self):
+    """ validate the page-specs and build the metric-to-cell map """
+
+    views = self._spec.get('pages',None) or [self._spec.get('view',None)]
+
+    self.pages    = []          # compiled pages
+    self.metrics  = []          # metric-ids in frame-order
+    self.cells    = []          # cell-index for every metric
+    self.kinds    = []          # kind (SCALAR/ARRAY) for every metric
+    self.sizes    = []          # number of values for every metric
+    self.quanta   = []          # smallest visible change for every metric
+    self.bands    = []          # limits of the color-range for every metric
+
+    base = 0
+    for view in views:
+      page = self._compile_page(view,base)
+      self.pages.append(page)
+      base += page['dim'][0]*page['dim'][1]
+
+  # --- compile a page   -----------------------------------------------------
+
+  def _compile_page(self,view,base):
+    """ validate a view-spec, add its metrics. Returns the compiled page """
+
+    if not view or not view.get('rows',None):
+      raise ValueError("layout: missing view.rows")
+
+    rows = view['rows']
+    cols = max([len(row) for row in rows])
+    dim  = (len(rows),cols)
+
+    default_just = JUSTIFY[view.get('justify','RIGHT')]
+    formats      = [None]*(dim[0]*cols)
+    justify      = [default_just]*(dim[0]*cols)
+    objects      = []           # (row,col,type,spec) of non-default cells
+
+    for r,row in enumerate(rows):
+      for c,cell in enumerate(row):
+        index = c+r*cols
+        if 'justify' in cell:
+          justify[index] = JUSTIFY[cell['justify']]
+        if 'text' in cell:
+          formats[index] = cell['text']
+          continue
+        if 'metric' not in cell:
+          raise ValueError(f"layout: cell {r},{c} needs 'text' or 'metric'")
+        ctype = cell.get('type','label')
+        if ctype not in CELL_TYPES:
+          raise ValueError(f"layout: cell {r},{c}: invalid type {ctype}")
+        if cell['metric'] in self.metrics:
+          raise ValueError(f"layout: duplicate metric {cell['metric']}")
+        self.metrics.append(cell['metric'])
+        self.cells.append(base+index)
+        self.kinds.append(CELL_TYPES[ctype])
+        self.sizes.append(1)
+        formats[index] = cell.get('format',None)
+        if ctype != 'label':
+          spec = self._cell_spec(ctype,cell)
+          if ctype == 'heatmap':
+            self.sizes[-1] = spec['n']
+          elif ctype == 'text':
+            self.sizes[-1] = spec.get('n',64)   # max. bytes (logger)
+          if 'justify' in spec:
+            justify[index] = JUSTIFY[spec['justify']]
+          objects.append((r,c,ctype,spec))
+        else:
+          spec = {'format': formats[index]}
+          if 'color' in cell:
+            spec['color'] = self._color_range(cell['color'])
+            objects.append((r,c,ctype,spec))
+        self.quanta.append(self._quantum(ctype,spec))
+        color = spec.get('color',None)
+        self.bands.append([v for _,v in color if v is not None]
+                          if isinstance(color,list) and
+                             isinstance(color[0],tuple) else [])
+
+    return {'name': view.get('name',str(len(self.pages))), 'base': base,
+            'dim': dim, 'formats': formats, 'justify': justify,
+            'objects': objects, 'spec': view}
+
+  # --- smallest visible change of a value   ---------------------------------
+
+  def _quantum(self,ctype,spec):
+    """ return smallest visible change (0 for arrays: every change) """
+
+    if CELL_TYPES[ctype] == ARRAY:
+      return 0
+    quantum = 0.1               # resolution of the protocol
+    fmt     = spec.get('format',None) or ''
+    field   = fmt[fmt.find('{')+1:fmt.find('}')] if '{' in fmt else ''
+    if '.' in field:
+      digits  = field[field.index('.')+1:].rstrip('fFeEgG%')
+      quantum = max(quantum,10**-int(digits or 0))
+    elif field.endswith('d'):
+      quantum = 1
+    if ctype == 'bar':
+      # one pixel of the bar
+      size  = spec['size'][0 if spec.get('horizontal',True) else 1]
+      low,high = spec.get('range',(0,100))
+      quantum = min(quantum,(high-low)/size)
+    return quantum
+
+  # --- merge cell-spec with defaults   --------------------------------------
+
+  def _cell_spec(self,ctype,cell):
+    """ merge cell with type-defaults and resolve colors """
+
+    spec = dict(self._spec.get(ctype,{}))
+    spec.update(cell)
+    for key in ['color','bg_color','text_color']:
+      if key in spec:
+        if key == 'color':
+          spec[key] = self._color_range(spec[key])
+        else:
+          spec[key] = self._color(spec[key])
+    if ctype == 'bar':
+      if 'size' not in spec:
+        raise ValueError(f"layout: bar for {cell['metric']} needs a size")
+      spec['text_justify'] = JUSTIFY[spec.get('text_justify','RIGHT')]
+    elif ctype == 'heatmap' and ('n' not in spec or 'cols' not in spec):
+      raise ValueError(f"layout: heatmap for {cell['metric']} needs n and cols")
+    return spec
+
+  # --- create cell-objects   ------------------------------------------------
+
+  def _create_object(self,ctype,spec,font,view):
+    """ create DataCell for the given spec (view: spec of the page) """
+
+    if ctype == 'bar':
+      from dataviews.DataBar import DataBar
+      return DataBar(size=tuple(spec['size']),
+                     range=tuple(spec.get('range',(0,100))),
+                     format=spec.get('format',None),
+                     color=spec.get('color',Color.GREEN),
+                     text_color=spec.get('text_color',None),
+                     text_justify=spec['text_justify'],
+                     horizontal=spec.get('horizontal',True),
+                     animate=self.fps > 0 and spec.get('animate',True),
+                     font=font,
+                     bg_color=spec.get('bg_color',Color.BLACK))
+    elif ctype == 'heatmap':
+      from dataviews.DataHeatmap import DataHeatmap
+      return DataHeatmap(spec['n'],spec['cols'],spec.get('cell_size',4),
+                         color=spec.get('color',
+                                        (Color.GREEN,Color.YELLOW,Color.RED)),
+                         bg_color=spec.get('bg_color',Color.BLACK),
+                         levels=spec.get('levels',16),
+                         range=tuple(spec.get('range',(0,100))))
+    else:
+      from dataviews.DataLabel import DataLabel
+      color = self._color(view.get('color','WHITE'))
+      return DataLabel(font=font,color=spec.get('color',color),
+                       format=spec.get('format',None))
+
+  # --- create display   -----------------------------------------------------
+
+  def create_display(self):
+    """ create display-object from the display-spec """
+
+    import board
+    spec   = dict(self._spec.get('display',{}))
+    driver = spec.pop('driver','builtin')
+    if driver == 'builtin':
+      return board.DISPLAY
+
+    import busio
+    from dataviews.DisplayFactory import DisplayFactory
+    if 'spi' in spec:
+      spi = spec['spi']
+      spec['spi'] = busio.SPI(clock=getattr(board,spi['clock']),
+                              MOSI=getattr(board,spi['MOSI']))
+    for key,value in spec.items():
+      if (key.startswith('pin_') or key.endswith('_pin')) and value:
+        spec[key] = getattr(board,value)
+    return getattr(DisplayFactory,driver)(**spec)
+
+  # --- create logger   ------------------------------------------------------
+
+  def create_logger(self):
+    """ create logger from the log-spec, None if logging is off """
+
+    spec = dict(self._spec.get('log',{}))
+    if not spec:
+      return None
+    sdcard = spec.pop('sdcard',None)
+    if sdcard:
+      self._mount_sdcard(sdcard,spec.get('path','/sd'))
+    from sysmon.Logger import Logger
+    return Logger(self,**spec)
+
+  # --- mount SD-card   ------------------------------------------------------
+
+  def _mount_sdcard(self,spec,path):
+    """ mount SD-card (SPI) at the given path """
+
+    import board
+    import busio
+    import sdcardio
+    import storage
+    spi = spec['spi']
+    if spi == 'board':
+      spi = board.SPI()
+    else:
+      spi = busio.SPI(clock=getattr(board,spi['clock']),
+                      MOSI=getattr(board,spi['MOSI']),
+                      MISO=getattr(board,spi['MISO']))
+    sdcard = sdcardio.SDCard(spi,getattr(board,spec['cs']),
+                             baudrate=spec.get('baudrate',8000000))
+    storage.mount(storage.VfsFat(sdcard),path)
+
+  # --- load font   ---------------------------------------------------------
+
+  def _load_font(self,name):
+    """ load font once for all pages (None: builtin font) """
+
+    if name not in self._fonts:
+      if name is None:
+        import terminalio
+        self._fonts[name] = terminalio.FONT
+      else:
+        from adafruit_bitmap_font import bitmap_font
+        self._fonts[name] = bitmap_font.load_font(name)
+    return self._fonts[name]
+
+  # --- create view   --------------------------------------------------------
+
+  def create_view(self,width,height,page=0):
+    """ create the view-tree of a page, return the root-group and the view """
+
+    from dataviews.DataView import DataView
+    page = self.pages[page]
+    spec = page['spec']
+
+    font    = self._load_font(self.font)
+    objects = [(r,c,self._create_object(ctype,cspec,font,spec))
+               for r,c,ctype,cspec in page['objects']]
+    view = DataView(
+      dim=page['dim'],
+      width=spec.get('width',width),height=spec.get('height',height),
+      justify=page['justify'],
+      font=font,
+      formats=page['formats'],
+      border=spec.get('border',0),
+      divider=spec.get('divider',False),
+      padding=spec.get('padding',1),
+      color=self._color(spec.get('color','WHITE')),
+      bg_color=self._color(spec.get('bg_color','BLACK')),
+      col_width=spec.get('col_width',None),
+      objects=objects)
+
+    if not 'title' in spec and not 'footer' in spec:
+      return view,view
+
+    from dataviews.DataPanel import DataPanel, PanelText
+    panel_texts = []
+    for key in ['title','footer']:
+      if key in spec:
+        text = spec[key]
+        panel_texts.append(PanelText(text=text.get('text',''),
+                                     color=self._color(text.get('color',None)),
+                                     font=self._load_font(
+                                       text.get('font',None)),
+                                     justify=JUSTIFY[
+                                       text.get('justify','CENTER')]))
+      else:
+        panel_texts.append(None)
+    panel = DataPanel(width,height,view,
+                      title=panel_texts[0],footer=panel_texts[1],
+                      color=self._color(spec.get('color','WHITE')),
+                      bg_color=self._color(spec.get('bg_color','BLACK')))
+    return panel,view
+
+  # --- create pages   -------------------------------------------------------
+
+  def create_pages(self,display):
+    """ create the view-trees of all pages and return the pages """
+
+    from sysmon.Pages import Pages
+    return Pages(display,self,
+                 [self.create_view(display.width,display.height,page)
+                  for page in range(len(self.pages))])
+
+# --- validate layout-files (CPython)   ----------------------------------------
+
+if __name__ == '__main__':
+  import sys
+  for path in sys.argv[1:]:
+    layout = Layout(path)
+    for page in layout.pages:
+      print(f"{path}: page {page['name']}: "
+            f"{page['dim'][0]}x{page['dim'][1]} cells from {page['base']}")
+    for metric,cell,kind,q,bands in zip(layout.metrics,layout.cells,
+                                        layout.kinds,layout.quanta,
+                                        layout.bands):
+      print(f"  {metric:12s} -> cell {cell:3d} "
+            f"({'array' if kind == ARRAY else 'scalar'}, "
+            f"q={q:g}, bands={bands})")
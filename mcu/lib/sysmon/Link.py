@@ -0,0 +1,453 @@
+# ----------------------------------------------------------------------------
+# Link: read and decode frames from the collector.
+#
+# The link announces the metrics of the layout to the collector (hello)
+# and waits for the schema, i.e. the list of metrics the collector will
+# actually send. Data frames are decoded in place into a preallocated list
+# of values (data) with a parallel list of cell-indices (cells), suitable
+# for DataView.set_values_at(). See pc/.../collector/protocol.py for a
+# description of the wire-protocol. Binary frames are ignored until the
+# schema arrives, frames not matching the schema are dropped.
+#
+# Frames carry a sequence number and the send-time of the collector. The
+# link counts received and dropped frames and measures the parse-time
+# (receiving and decoding the rest of a frame after its first byte).
+# report() echoes these together with render- and refresh-times back to the
+# collector.
+#
+# The hello also passes the smallest visible change and the limits of the
+# color-bands of every metric (from the layout), so the collector only
+# sends frames with visible changes (plus a heartbeat).
+#
+# The collector flags metrics with outdated values (e.g. a hung source) as
+# stale, stale holds the cell-indices of these metrics. It may also request
+# another page of the layout (page).
+#
+# With the delta-encoding, the link keeps the fields of the last keyframe
+# (base) and decodes change frames in place: changed fields are computed
+# from the base, fields changed by an earlier frame (dirty) are reset. The
+# statistics report the seq of the base, so the collector sends a new
+# keyframe if the link missed one.
+#
+# If the layout has a history-section, the hello asks for a history and
+# the link decodes the history-frame sent after the schema into history
+# (one list of values per scalar metric of history_ids, oldest first).
+#
+# read() waits for the next data-frame, poll() only processes pending input
+# (e.g. in a reader-task of asyncio).
+#
+# The stream is any object with read(), readline(), readinto(), write() and
+# in_waiting, e.g. usb_cdc.data or busio.UART.
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/cp-sysmon
+# ----------------------------------------------------------------------------
+
+import time
+import binascii
+
+from sysmon.Layout import ARRAY
+
+VERSION  = 1
+SYNC     = 0xA5
+T_DATA   = ord('D')
+T_HIST   = ord('H')
+T_KEY    = ord('K')
+T_CHANGE = ord('C')
+NO_VALUE = -0x8000
+
+HELLO_INTERVAL = 2                 # resend hello while not synchronized
+
+# --- class Link   -----------------------------------------------------------
+
+class Link:
+  """ decode frames into cell-values """
+
+  # --- constructor   --------------------------------------------------------
+
+  def __init__(self,stream,layout,encodings='bin,delta,csv'):
+    """ constructor """
+
+    self._stream    = stream
+    self._layout    = layout
+    self._encodings = encodings
+
+    self._buffer = bytearray(64)
+
+    # until we receive a schema, assume the collector sends all metrics
+    self._set_schema(layout.metrics)
+    self.synced     = False
+    self._connected = False
+    self._hello_ts  = 0
+
+    # frame statistics
+    self.seq      = None           # sequence number of last frame
+    self.ts       = 0              # send-time of last frame
+    self.rx       = 0              # number of received frames
+    self.dropped  = 0              # number of dropped frames
+    self.parse_us = 0              # parse-time of last frame
+
+    self.stale    = set()          # cells of stale metrics
+    self.page     = None           # page requested by the collector
+
+    # history sent by the collector after the schema
+    self.history      = None
+    self.history_ids  = []
+    self.history_step = 0          # time between points (ms)
+
+  # --- map metric-ids to cells   --------------------------------------------
+
+  def _set_schema(self,ids):
+    """ set list of metrics sent by the collector.
+    Cells of missing metrics are appended and cleared with the next frame.
+    """
+
+    metrics = self._layout.metrics
+    ids     = [m for m in ids if m in metrics]
+    missing = [m for m in metrics if m not in ids]
+    self._n      = len(ids)
+    self._ids    = ids
+    self.cells   = [self._layout.cells[metrics.index(m)] for m in ids+missing]
+    self.data    = [None]*len(self.cells)
+    self._arrays = [self._layout.kinds[metrics.index(m)] == ARRAY for m in ids]
+    self._size   = 6 + sum([1 if a else 2 for a in self._arrays]) # min. size
+
+    # state of the delta-encoding
+    self._base     = [NO_VALUE]*self._n  # fields of the last keyframe
+    self._dirty    = bytearray(self._n)  # field differs from base
+    self._base_seq = None
+    self._pos      = 0
+
+  # --- send hello   ---------------------------------------------------------
+
+  def hello(self):
+    """ announce metrics of the layout """
+
+    self._hello_ts = time.monotonic()
+    history = self._layout.history
+    if history:
+      history = f" hist={history['width']} hspan={history.get('span',0)}"
+    layout = self._layout
+    quanta = ','.join([f"{q:g}" for q in layout.quanta])
+    bands  = ','.join(['/'.join([f"{v:g}" for v in b]) for b in layout.bands])
+    self._stream.write(bytes(
+      f"!hello v={VERSION} period={layout.period} enc={self._encodings} "
+      f"ids={','.join(layout.metrics)} q={quanta} bands={bands}"
+      f"{history or ''}\n",'utf-8'))
+
+  # --- check connection state   ---------------------------------------------
+
+  def _check_hello(self):
+    """ send hello on (re-)connect or periodically while not synced """
+
+    connected = getattr(self._stream,'connected',True)
+    if connected and not self._connected:
+      self.synced = False
+      self.hello()
+    elif (connected and not self.synced and
+          time.monotonic() - self._hello_ts > HELLO_INTERVAL):
+      self.hello()
+    self._connected = connected
+
+  # --- process control-line   -----------------------------------------------
+
+  def _control(self,line):
+    """ process control line """
+
+    tokens = line.decode().strip().split()
+    if not tokens:
+      return
+    args = {}
+    for token in tokens[1:]:
+      key,_,value = token.partition('=')
+      args[key] = value
+
+    if tokens[0] == '!schema':
+      self._set_schema([m for m in args.get('ids','').split(',') if m])
+      if args.get('unknown',None):
+        print(f"collector does not provide: {args['unknown']}")
+      self.synced = True
+      self.seq    = None
+      self.stale  = set()
+    elif tokens[0] == '!stale':
+      metrics = self._layout.metrics
+      self.stale = set([self._layout.cells[metrics.index(m)]
+                        for m in args.get('ids','').split(',')
+                        if m in metrics])
+    elif tokens[0] == '!page':
+      self.page = args.get('n','next')
+    elif tokens[0] == '!hello':
+      # collector asks for our hello
+      self.hello()
+
+  # --- update frame statistics   --------------------------------------------
+
+  def _stamp(self,seq,ts):
+    """ update counters from sequence number """
+
+    if self.seq is not None:
+      gap = (seq - self.seq - 1) & 0xFFFF
+      if gap < 0x8000:
+        self.dropped += gap
+    self.seq = seq
+    self.ts  = ts
+
+  # --- echo statistics to the collector   -----------------------------------
+
+  def report(self,render_us,refresh_us):
+    """ send statistics of the last frame """
+
+    if not self.synced or self.seq is None:
+      return
+    base = '' if self._base_seq is None else f" base={self._base_seq}"
+    self._stream.write(bytes(
+      f"!stats seq={self.seq} t={self.ts} rx={self.rx} drop={self.dropped} "
+      f"parse={self.parse_us} render={render_us} refresh={refresh_us}"
+      f"{base}\n",'utf-8'))
+
+  # --- parse csv-line   -----------------------------------------------------
+
+  def _parse_csv(self,line):
+    """ parse csv-line into data """
+
+    data   = self.data
+    arrays = self._arrays
+    fields = line.decode().strip().split(',')
+    if fields[0][0] == '@':
+      self._stamp(int(fields[0][1:]),int(fields[1]))
+      fields = fields[2:]
+    for i,d in enumerate(fields):
+      if not d:
+        data[i] = None                  # no value
+      elif arrays[i]:
+        data[i] = binascii.unhexlify(d)
+      else:
+        data[i] = float(d)
+
+  # --- read exactly n bytes into the buffer   -------------------------------
+
+  def _read_n(self,n):
+    """ read n bytes into the buffer, return False on timeout """
+
+    if n > len(self._buffer):
+      self._buffer = bytearray(n)
+    view = memoryview(self._buffer)
+    pos  = 0
+    while pos < n:
+      count = self._stream.readinto(view[pos:n])
+      if not count:
+        return False
+      pos += count
+    return True
+
+  # --- parse binary frame   -------------------------------------------------
+
+  def _read_frame(self):
+    """ read and decode binary frame, return True for a valid data-frame """
+
+    if not self._read_n(3):
+      return False
+    ftype = self._buffer[0]
+    n     = self._buffer[1] | self._buffer[2] << 8
+    if not self._read_n(n+1):
+      return False
+    buf = self._buffer
+    if sum(memoryview(buf)[:n]) & 0xFF != buf[n]:
+      return False
+    if not self.synced:
+      return False                      # no schema yet, e.g. after a reload
+    if ftype == T_HIST:
+      self._decode_history()
+      return False
+    if ftype == T_CHANGE:
+      return self._decode_changes(n)
+    if ftype != T_DATA and ftype != T_KEY or n < self._size:
+      return False
+
+    self._stamp(buf[0] | buf[1] << 8,
+                buf[2] | buf[3] << 8 | buf[4] << 16 | buf[5] << 24)
+    arrays = self._arrays
+    data   = self.data
+    key    = ftype == T_KEY
+    base   = self._base
+    pos    = 6
+    if key:
+      self._base_seq = None             # until the keyframe is complete
+    elif self._base_seq is not None:
+      # sent while a keyframe is unacknowledged: fields may differ from base
+      for i in range(self._n):
+        self._dirty[i] = 1
+    for i in range(self._n):
+      if arrays[i]:
+        count = buf[pos]
+        data[i] = bytes(buf[pos+1:pos+1+count]) if count else None
+        pos += 1+count
+        if key:
+          base[i] = data[i]
+      else:
+        v = buf[pos] | buf[pos+1] << 8
+        if v & 0x8000:
+          v -= 0x10000
+        data[i] = None if v == NO_VALUE else v/10
+        pos += 2
+        if key:
+          base[i] = v
+    if pos != n:
+      return False                      # corrupt frame
+    if key:
+      self._base_seq = self.seq
+      for i in range(self._n):
+        self._dirty[i] = 0
+    return True
+
+  # --- decode change frame   ------------------------------------------------
+
+  def _varint(self):
+    """ read varint at the current position """
+
+    buf   = self._buffer
+    value = 0
+    shift = 0
+    while True:
+      b = buf[self._pos]
+      self._pos += 1
+      value |= (b & 0x7F) << shift
+      if b < 0x80:
+        return value
+      shift += 7
+
+  def _decode_changes(self,n):
+    """ decode changes against the last keyframe in place """
+
+    buf = self._buffer
+    self._stamp(buf[0] | buf[1] << 8,
+                buf[2] | buf[3] << 8 | buf[4] << 16 | buf[5] << 24)
+    if buf[6] | buf[7] << 8 != self._base_seq:
+      self.dropped += 1                 # missed the keyframe
+      return False
+
+    arrays = self._arrays
+    data   = self.data
+    base   = self._base
+    dirty  = self._dirty
+    self._pos = 8
+    nxt = self._varint() if self._pos < n else self._n
+    for i in range(self._n):
+      if i == nxt:
+        dirty[i] = 1
+        if arrays[i]:
+          h = self._varint()
+          if not h:
+            data[i] = None
+          elif h & 1:
+            data[i] = bytes(buf[self._pos:self._pos+(h >> 1)])
+            self._pos += h >> 1
+          else:
+            values = bytearray(base[i])
+            j = 0
+            for _ in range(h >> 1):
+              j += self._varint()
+              values[j] = buf[self._pos]
+              self._pos += 1
+              j += 1
+            data[i] = values
+        else:
+          v = self._varint()
+          v = base[i] + ((v >> 1) ^ -(v & 1))
+          data[i] = None if v == NO_VALUE else v/10
+        nxt = i+1 + self._varint() if self._pos < n else self._n
+      elif dirty[i]:
+        # changed before, now equal to the keyframe again
+        dirty[i] = 0
+        if arrays[i]:
+          data[i] = base[i]
+        else:
+          data[i] = None if base[i] == NO_VALUE else base[i]/10
+    return True
+
+  # --- decode history-frame   -----------------------------------------------
+
+  def _decode_history(self):
+    """ decode history into one list of values per scalar metric """
+
+    buf   = self._buffer
+    count = buf[0] | buf[1] << 8
+    self.history_step = buf[2] | buf[3] << 8 | buf[4] << 16 | buf[5] << 24
+    m     = buf[6]
+    self.history_ids = [i for i,a in zip(self._ids,self._arrays) if not a]
+    history = [[None]*count for _ in range(m)]
+    pos = 7
+    for p in range(count):
+      for k in range(m):
+        v = buf[pos] | buf[pos+1] << 8
+        if v & 0x8000:
+          v -= 0x10000
+        if v != NO_VALUE:
+          history[k][p] = v/10
+        pos += 2
+    self.history = history
+
+  # --- account for a decoded frame   ---------------------------------------
+
+  def _frame_done(self,start):
+    """ update counter and parse-time """
+    self.rx      += 1
+    self.parse_us = (time.monotonic_ns() - start)//1000
+
+  # --- read next data-frame   -----------------------------------------------
+
+  def done(self):
+    """ the last frame is shown: drop cells of missing metrics (they were
+    cleared with this frame)
+    """
+
+    if len(self.cells) > self._n:
+      self.cells = self.cells[:self._n]
+      self.data  = self.data[:self._n]
+
+  def _read_next(self):
+    """ read and process the next frame or line, True for a data-frame """
+
+    self._check_hello()
+    b = self._stream.read(1)
+    if not b or b[0] == 10:
+      return False
+    start = time.monotonic_ns()
+    try:
+      if b[0] == SYNC:
+        if not self._read_frame():
+          return False
+      else:
+        line = self._stream.readline()
+        if not line or line[-1] != 10:  # timeout: discard partial line
+          return False
+        if b[0] == 33:                  # '!'
+          self._control(b+line)
+          return False
+        self._parse_csv(b+line)
+      self._frame_done(start)
+      return True
+    except (ValueError,IndexError,TypeError):
+      return False                      # ignore garbage
+
+  def read(self):
+    """ read until the next data-frame, return data """
+
+    self.done()
+    while not self._read_next():
+      pass
+    return self.data
+
+  def poll(self):
+    """ process pending input without waiting for new input.
+    Returns data if a data-frame was complete, else None. Call done()
+    after showing the data.
+    """
+
+    while self._stream.in_waiting:
+      if self._read_next():
+        return self.data
+    self._check_hello()
+    return None
@@ -0,0 +1,212 @@
+# ----------------------------------------------------------------------------
+# Logger: log received samples as fixed-size binary records.
+#
+# Records are packed into a preallocated buffer and written to the log-file
+# in whole blocks of 512 bytes (the sector-size of SD-cards), so logging
+# neither formats strings nor does small writes. Records never span blocks:
+# a block holds a whole number of records, the rest is padded with 0xFF
+# (records larger than 512 bytes use blocks of a multiple of 512 bytes).
+# Files are rotated at block-boundaries, so every file starts with a whole
+# record. add() only packs the record and returns True once a block is
+# complete, flush() writes the complete blocks (e.g. from a separate task).
+# The buffer has room for two blocks, if it is full add() flushes itself.
+#
+# Every file starts with a header (magic, json-description of the records,
+# padded with zeros to a multiple of the block-size). Files are rotated by
+# size and only the newest files are kept.
+#
+# Record: seq (uint16) and t (uint32, send-time of the collector in ms),
+# then one field per metric of the layout: scalars are int16 (fixed point
+# with one decimal, -32768 for no value), arrays are n packed bytes
+# (zero-padded). A partial block written by close() is padded with 0xFF.
+#
+# pc/tools/logdecode.py converts log-files to csv.
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/cp-sysmon
+# ----------------------------------------------------------------------------
+
+import os
+import time
+import json
+import struct
+
+from sysmon.Layout import ARRAY
+
+VERSION  = 1
+MAGIC    = b'SYSMONLOG'
+BLOCK    = 512
+NO_VALUE = -0x8000
+PREFIX   = 'sysmon-'
+SUFFIX   = '.log'
+
+# --- class Logger   ---------------------------------------------------------
+
+class Logger:
+  """ buffered binary logger """
+
+  # --- constructor   --------------------------------------------------------
+
+  def __init__(self,layout,path='/sd',max_size=1048576,files=4,every=0):
+    """ constructor """
+
+    self._path     = path
+    self._max_size = max(max_size,4*BLOCK)
+    self._files    = files
+    self._every    = every         # min. seconds between records (0: all)
+    self._next     = 0
+
+    self._arrays = [k == ARRAY for k in layout.kinds]
+    self._slots  = {cell: i+2 for i,cell in enumerate(layout.cells)}
+    self._format = '<HI' + ''.join(
+      [f"{n}s" if a else 'h' for a,n in zip(self._arrays,layout.sizes)])
+    self.size    = struct.calcsize(self._format)
+    self._values = [0]*(2+len(layout.metrics))
+
+    # buffer for two blocks, the tail of every block is padding
+    self._block  = BLOCK*((self.size+BLOCK-1)//BLOCK)
+    self._fill   = self._block//self.size*self.size
+    self._buffer = bytearray(b'\xff'*2*self._block)
+    self._pos    = 0
+
+    header = MAGIC + bytes(' ' + json.dumps({
+      'v': VERSION, 'format': self._format, 'size': self.size,
+      'block': self._block, 'ids': layout.metrics, 'kinds': layout.kinds,
+      'sizes': layout.sizes}) + '\n','utf-8')
+    self._header = header + bytes(-len(header) % BLOCK)
+
+    self._file    = None
+    self._written = 0
+    self._index   = self._last_index()
+
+  # --- find index of newest log-file   --------------------------------------
+
+  def _last_index(self):
+    """ return index of the newest existing log-file (or -1) """
+
+    index = -1
+    try:
+      names = os.listdir(self._path)
+    except OSError as ex:
+      print(f"logger: {ex}")          # e.g. no card, _open() will retry
+      return index
+    for name in names:
+      if name.startswith(PREFIX) and name.endswith(SUFFIX):
+        try:
+          index = max(index,int(name[len(PREFIX):-len(SUFFIX)]))
+        except ValueError:
+          pass
+    return index
+
+  def _name(self,index):
+    """ name of the log-file with the given index """
+    return f"{self._path}/{PREFIX}{index:04d}{SUFFIX}"
+
+  # --- open next log-file   -------------------------------------------------
+
+  def _open(self):
+    """ open next log-file, remove old files """
+
+    self._index += 1
+    try:
+      os.remove(self._name(self._index-self._files))
+    except OSError:
+      pass
+    self._file = open(self._name(self._index),'wb')
+    self._file.write(self._header)
+    self._written = len(self._header)
+
+  # --- write block   --------------------------------------------------------
+
+  def _write(self,block):
+    """ write block, rotate by size """
+
+    try:
+      if self._file and self._written + self._block > self._max_size:
+        self._close_file()
+      if not self._file:
+        self._open()
+      self._file.write(block)
+      self._file.flush()
+      self._written += self._block
+    except OSError as ex:
+      # e.g. card removed: drop block and retry with a new file
+      print(f"logger: {ex}")
+      self._close_file()
+
+  # --- add sample   ---------------------------------------------------------
+
+  def add(self,seq,ts,cells,data):
+    """ append record for the given values (see Link.cells/Link.data).
+    Returns True if a complete block is ready for flush().
+    """
+
+    if self._every:
+      now = time.monotonic()
+      if now < self._next:
+        return False
+      self._next = now + self._every
+
+    values = self._values
+    arrays = self._arrays
+    values[0] = seq or 0
+    values[1] = ts & 0xFFFFFFFF
+    for i,array in enumerate(arrays):
+      values[i+2] = b'' if array else NO_VALUE
+    for cell,value in zip(cells,data):
+      i = self._slots[cell]
+      if value is None:
+        continue
+      if arrays[i-2]:
+        values[i] = value
+      else:
+        values[i] = max(-32767,min(32767,round(value*10)))
+
+    block = self._block
+    if self._pos >= 2*block:
+      self.flush()                      # flush() did not keep up
+    struct.pack_into(self._format,self._buffer,self._pos,*values)
+    self._pos += self.size
+    if self._pos % block == self._fill:
+      self._pos += block - self._fill   # skip padding of the block
+    return self._pos >= block
+
+  # --- write complete blocks   ----------------------------------------------
+
+  def flush(self):
+    """ write complete blocks of the buffer """
+
+    buf   = self._buffer
+    block = self._block
+    while self._pos >= block:
+      self._write(memoryview(buf)[:block])
+      self._pos -= block
+      buf[:block] = buf[block:]
+
+  # --- close current file   -------------------------------------------------
+
+  def _close_file(self):
+    """ close current log-file """
+
+    if self._file:
+      try:
+        self._file.close()
+      except OSError:
+        pass
+    self._file = None
+
+  # --- flush buffer and close   ---------------------------------------------
+
+  def close(self):
+    """ write partial block (padded with 0xFF) and close log-file """
+
+    self.flush()
+    if self._pos:
+      buf = self._buffer
+      for i in range(self._pos,self._block):
+        buf[i] = 0xFF
+      self._write(memoryview(buf)[:self._block])
+      self._pos = 0
+    self._close_file()
@@ -0,0 +1,101 @@
+# ----------------------------------------------------------------------------
+# Pages: views of all pages of a layout.
+#
+# The view-trees of all pages are created once at boot and kept alive.
+# Switching a page only sets the root-group of the display, no widgets are
+# created and no fonts are loaded. Values are only written to the cells of
+# the current page: hidden pages are updated with the latest values when
+# they are shown.
+#
+# Pages mimics the methods of DataView used by main.py, cell-indices are
+# the indices of the layout (see Layout.cells).
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/cp-sysmon
+# ----------------------------------------------------------------------------
+
+# --- class Pages   ----------------------------------------------------------
+
+class Pages:
+  """ cached views of all pages """
+
+  # --- constructor   --------------------------------------------------------
+
+  def __init__(self,display,layout,views):
+    """ constructor: views is a list of (root,view) for every page """
+
+    self._display = display
+    self._names   = [page['name'] for page in layout.pages]
+    self._roots   = [root for root,_ in views]
+    self._views   = [view for _,view in views]
+
+    # cell-index of the layout -> (page,cell-index of the view)
+    self._where = {}
+    for page,spec in enumerate(layout.pages):
+      base = spec['base']
+      for cell in range(spec['dim'][0]*spec['dim'][1]):
+        self._where[base+cell] = (page,cell)
+
+    self.current = 0
+    self._next   = None
+    display.root_group = self._roots[0]
+
+  # --- select and switch pages   --------------------------------------------
+
+  def select(self,page):
+    """ select page by index, name or 'next'. Takes effect with switch() """
+
+    if page == 'next':
+      self._next = (self.current+1) % len(self._roots)
+    elif page in self._names:
+      self._next = self._names.index(page)
+    else:
+      try:
+        self._next = int(page) % len(self._roots)
+      except ValueError:
+        print(f"unknown page: {page}")
+
+  def switch(self):
+    """ show the selected page, return True if the page changed """
+
+    page,self._next = self._next,None
+    if page is None or page == self.current:
+      return False
+    self.current = page
+    self._display.root_group = self._roots[page]
+    return True
+
+  # --- set values   ---------------------------------------------------------
+
+  def set_values_at(self,cells,values):
+    """ set values of the cells of the current page """
+
+    view = self._views[self.current]
+    if len(self._views) == 1:
+      view.set_values_at(cells,values)
+      return
+    current = self.current
+    where   = self._where
+    view.set_values_at((where[cell][1],value)
+                       for cell,value in zip(cells,values)
+                       if where[cell][0] == current)
+
+  # --- colors   -------------------------------------------------------------
+
+  def get_color(self,cell):
+    """ get color of the given cell """
+    page,index = self._where[cell]
+    return self._views[page].get_color(index)
+
+  def set_color(self,color,cell):
+    """ set color of the given cell """
+    page,index = self._where[cell]
+    self._views[page].set_color(color,index)
+
+  # --- animate   ------------------------------------------------------------
+
+  def animate(self,shift=2):
+    """ animate cells of the current page """
+    return self._views[self.current].animate(shift)
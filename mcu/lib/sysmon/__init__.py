@@ -0,0 +1,10 @@
+# -------------------------------------------------------------------------
+# Module sysmon - layout, link and helper classes for the display-side of
+# cp-sysmon.
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/cp-sysmon
+#
+# -------------------------------------------------------------------------
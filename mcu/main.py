@@ -7,6 +7,13 @@
 # This is the partner program for the program cp_sysmon.py that is expected
 # to run on the PC and collect and send data.
 #
+# The program runs as asyncio-tasks: the reader drains the serial and
+# decodes frames in place (only the latest frame is shown), the renderer
+# updates the view and refreshes the display on its own schedule, the
+# logger writes complete blocks and housekeeping runs the garbage
+# collector. Layouts with pages switch pages by timer or by request of the
+# collector. A slow refresh therefore no longer stalls the serial.
+#
 # Author: Bernhard Bablok
 # License: GPL3
 #
@@ -16,161 +23,179 @@
 import board
 import busio
 import time
+import gc
+import asyncio
 
-try:
-  import psutil
-except:
-  pass
-
-from dataviews.Base import Color, Justify
-from dataviews.DisplayFactory import DisplayFactory
-from dataviews.DataView  import DataView
-from dataviews.DataPanel import DataPanel, PanelText
-from dataviews.DataBar import DataBar
+from sysmon.Layout import Layout
+from sysmon.Link import Link
 
 # --- core configuration   ---------------------------------------------------
 
-DATA_SOURCE = 'usb'  # 'usb' or (rx-pin,tx-pin)
-
-# --- display configuration   ------------------------------------------------
-
-# values optimized for 240x135 displays, e.g. Adafruit Mini-Pi-TFT
-# or the display integrated into the Waveshare RP2040-Geek.
-# Other displays need other values, especially if you add more statistics
-WIDTH      = 240
-HEIGHT     = 135
-BAR_WIDTH  = 180
-BAR_HEIGHT =  30
-FONT       = 'fonts/DejaVuSans-16-subset.bdf'
-
-# Waveshare RP2040-Geek: use board.DISPLAY
-
-# Adafruit Mini-Pi-TFT, using Pico-to-Pi adapter
-#spi = busio.SPI(clock=board.SCLK,MOSI=board.MOSI)
-#PIN_CS   = board.CE0
-#PIN_DC   = board.GPIO25
-#PIN_RST  = None
-#driver   = 'st7789'
-#args     = [PIN_DC, PIN_CS]
-#kwargs   = {'pin_rst': PIN_RST, 'spi': spi,
-#            'rotation': 90, 'rowstart': 40, 'colstart': 53}
-
-# Waveshare Pico-Res-Touch-LCD 2.8
-WIDTH      = 320
-HEIGHT     = 240
-BAR_WIDTH  = 240
-BAR_HEIGHT =  50
-FONT       = 'fonts/DejaVuSans-16-subset.bdf'
-
-spi = busio.SPI(clock=board.GP10,MOSI=board.GP11)
-PIN_CS   = board.GP9
-PIN_DC   = board.GP8
-PIN_RST  = board.GP15
-PIN_BL   = board.GP13
-driver   = 'st7789'
-args     = [PIN_DC, PIN_CS]
-kwargs   = {'pin_rst': PIN_RST, 'spi': spi,
-            'rotation': 90, 'rowstart': 0, 'colstart': 0,
-            'backlight_pin': PIN_BL, 'backlight_pwm_frequency': 100}
-
-# --- system statistics configuration   ----------------------------------------
-
-BAR_N      =   4  # cpu, memory, disk, temperature
-
-formats = ["CPU:", "{0:.1f}%",
-           "Mem:", "{0:.1f}%",
-           "Disk:","{0:.1f}%",
-           "Temp:","{0}°C",]
-ranges = [
-  (0,100),
-  (0,100),
-  (0,100),
-  (35,85),
-  ]
-colors = [
-  [(Color.GREEN,70),(Color.YELLOW,85),(Color.RED,None)],
-  [(Color.GREEN,70),(Color.YELLOW,85),(Color.RED,None)],
-  [(Color.GREEN,70),(Color.YELLOW,85),(Color.RED,None)],
-  [(Color.GREEN,65),(Color.YELLOW,80),(Color.RED,None)],
-  ]
+# The layout file defines the data-source, the display and the cells.
+# See directory layouts for ready to use examples.
+LAYOUT = 'layout.json'
+
+layout = Layout(LAYOUT)
+DATA_SOURCE = layout.source  # 'usb' or {"rx": pin, "tx": pin, "baudrate": n}
 
 # --- helpers for system statistics   ----------------------------------------
 
-_usb_serial = None
-def get_data_usb():
-  """ read data from USB """
-  global _usb_serial
-  if not _usb_serial:
-    import usb_cdc
-    if not usb_cdc.data:
-      raise ValueError("need to enable usb_cdc.data in boot.py!")
-    else:
-      _usb_serial = usb_cdc.data
-  data = _usb_serial.readline().decode().strip('\n').split(',')
-  data = [float(d) for d in data]
-  return [val for pair in zip([None]*4, data) for val in pair]
-
-_uart = None
-def get_data_uart():
-  """ read data from UART """
-  global _uart
-  if not _uart:
-    _uart = busio.UART(DATA_SOURCE[1], DATA_SOURCE[0], baudrate=115200)
-  data = _uart.readline().decode().strip('\n').split(',')
-  data = [float(d) for d in data]
-  return [val for pair in zip([None]*4, data) for val in pair]
-
-def get_data():
-  """ read data from data-source """
+def open_usb():
+  """ return USB data-serial """
+  import usb_cdc
+  if not usb_cdc.data:
+    raise ValueError("need to enable usb_cdc.data in boot.py!")
+  return usb_cdc.data
+
+def open_uart():
+  """ return UART """
+  return busio.UART(getattr(board,DATA_SOURCE['tx']),
+                    getattr(board,DATA_SOURCE['rx']),
+                    baudrate=DATA_SOURCE.get('baudrate',115200),
+                    receiver_buffer_size=DATA_SOURCE.get('buffer',1024))
+
+def open_data_source():
+  """ open data-source """
   if DATA_SOURCE == 'usb':
-    data = get_data_usb()
+    return open_usb()
   else:
-    data = get_data_uart()
-  #print(f"{data=}")
-  return data
+    return open_uart()
+
+link = Link(open_data_source(),layout)
+
+# optional: log samples to SD-card (see "log" in the layout file)
+logger = layout.create_logger()
 
 # --- create display and UI objects   -----------------------------------------
 
-if hasattr(board,'DISPLAY'):
-  display = board.DISPLAY
-else:
-  display = getattr(DisplayFactory,driver)(*args,width=WIDTH,height=HEIGHT,
-                                           **kwargs)
+display = layout.create_display()
 display.auto_refresh=False
 
-bars = [None]*BAR_N
-for i in range(BAR_N):
-  bars[i] = (0,2*i+1,DataBar(size=(BAR_WIDTH,BAR_HEIGHT),range=(0,100),
-                             format=formats[2*i+1],
-                             color=colors[i],
-                             text_color=Color.AQUA,
-                             text_justify=Justify.RIGHT,
-                             font=FONT,
-                             bg_color=Color.BLACK))
-
-# create view with BAR_N rows (right align labels)
-view = DataView(
-  dim=(BAR_N,2),
-  width=display.width,height=display.height,
-  justify=Justify.RIGHT,
-  fontname=FONT,
-  formats=formats,
-  border=1,
-  divider=1,
-  padding=3,
-  bg_color=Color.BLACK,
-  col_width=[0,1],
-  objects = bars
-)
-
-# left align hbars
-for index in range(1,2*BAR_N,2):
-  view.justify(Justify.LEFT,index=index)
-
-display.root_group = view
-
-# --- main loop   ------------------------------------------------------------
-
-while True:
-  view.set_values(get_data())
+# all pages are created once, view only updates the current page
+view = layout.create_pages(display)
+
+# --- task configuration   ---------------------------------------------------
+
+READ_SLEEP   = 0.005         # poll serial every n seconds while idle
+HOUSEKEEPING = 60            # run gc and print statistics every n seconds
+TICK         = 1/layout.fps if layout.fps else 0   # animation of bars
+
+new_frame = asyncio.Event()  # reader -> renderer (new frame or page)
+log_block = asyncio.Event()  # reader -> logger
+
+# --- reader task   ----------------------------------------------------------
+
+async def reader():
+  """ drain serial, decode frames into link.data """
+
+  while True:
+    data = link.poll()
+    if link.page is not None:
+      view.select(link.page)
+      link.page = None
+      new_frame.set()
+    if data is None:
+      await asyncio.sleep(READ_SLEEP)
+      continue
+    if logger and logger.add(link.seq,link.ts,link.cells,link.data):
+      log_block.set()
+    new_frame.set()
+    await asyncio.sleep(0)
+
+# --- renderer task   --------------------------------------------------------
+
+stale  = set()               # cells shown in the stale-color
+colors = {}                  # original colors of stale cells
+
+def show_frame(report=True):
+  """ update view with the values of the latest frame, refresh display.
+  Returns True if animated bars are moving.
+  """
+  global stale
+
+  start = time.monotonic_ns()
+  view.set_values_at(link.cells,link.data)
+  link.done()
+  if link.stale != stale:
+    for cell in link.stale - stale:
+      colors[cell] = view.get_color(cell)
+      view.set_color(layout.stale_color,cell)
+    for cell in stale - link.stale:
+      view.set_color(colors.pop(cell),cell)
+    stale = set(link.stale)
+  moving = TICK > 0 and view.animate()
+  rendered = time.monotonic_ns()
   display.refresh()
+  if report:
+    link.report((rendered-start)//1000,(time.monotonic_ns()-rendered)//1000)
+  return moving
+
+async def renderer():
+  """ show new frames, move animated bars with layout.fps """
+
+  moving = False
+  shown  = 0                 # link.rx of the last frame shown
+  while True:
+    if not moving:
+      await new_frame.wait()
+    else:
+      try:
+        await asyncio.wait_for(new_frame.wait(),TICK)
+      except asyncio.TimeoutError:
+        moving = view.animate()
+        if moving:
+          display.refresh()
+        continue
+    new_frame.clear()
+    view.switch()
+    moving = show_frame(report=link.rx != shown)   # or only a new page
+    shown  = link.rx
+
+# --- logger task   ----------------------------------------------------------
+
+async def log_writer():
+  """ write complete blocks of the logger """
+
+  while True:
+    await log_block.wait()
+    log_block.clear()
+    logger.flush()
+
+# --- page rotation task   ---------------------------------------------------
+
+async def pager():
+  """ show the next page every layout.page_time seconds """
+
+  while True:
+    await asyncio.sleep(layout.page_time)
+    view.select('next')
+    new_frame.set()
+
+# --- housekeeping task   ----------------------------------------------------
+
+async def housekeeping():
+  """ collect garbage, print statistics """
+
+  while True:
+    await asyncio.sleep(HOUSEKEEPING)
+    gc.collect()
+    free = f", free: {gc.mem_free()}" if hasattr(gc,'mem_free') else ''
+    print(f"rx: {link.rx}, dropped: {link.dropped}{free}")
+
+# --- main program   ---------------------------------------------------------
+
+async def main():
+  tasks = [asyncio.create_task(reader()),
+           asyncio.create_task(renderer()),
+           asyncio.create_task(housekeeping())]
+  if logger:
+    tasks.append(asyncio.create_task(log_writer()))
+  if layout.page_time and len(layout.pages) > 1:
+    tasks.append(asyncio.create_task(pager()))
+  await asyncio.gather(*tasks)
+
+try:
+  asyncio.run(main())
+finally:
+  if logger:
+    logger.close()
@@ -15,11 +15,59 @@ import psutil
 import time
 import os
 import sys
+import socket
+import signal
+import asyncio
+import threading
+from argparse import ArgumentParser
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                               '..','lib','cp_sysmon'))
+from collector import protocol
+from collector.protocol import SCALAR, ARRAY
+from collector.linkstats import LinkStats
+from collector.history import History
+from collector.hub import Hub, split_url
+from collector.shm import Publisher
+from collector.core import Port, Sampler
+from collector.mounts import Mounts
+from collector.cgroups import CGroups, format_top
+from collector.power import Power
+from collector.rolling import Rolling, derived_ids
 
 BAUD = 115200          # communication speed on serial
 CPU_TEMP_LABEL = 'CPU' # depends on the system
 DISK_MOUNT = '/'       # depends on preferences
+DISK_MOUNTS = ['/','/var','/home','/srv/*']  # mounts of 'disks' (globs)
+DISK_FSTYPES = []      # also add all mounts of these types, e.g. ['ext4']
 INTERVAL = 1           # depends on update speed of display partner program
+SAMPLE_WORKERS = 4     # min. threads for sampling metrics (0: no threads)
+SAMPLE_TIMEOUT = 0.5   # keep last value if a metric takes longer (seconds)
+SOURCE_TIMEOUTS = {}   # per-metric timeouts, e.g. {'disk': 0.2}
+SOURCE_RETRIES = 3     # back off after n consecutive timeouts of a metric
+BACKOFF_MAX = 60       # max. seconds between retries of a backed off metric
+ENCODING = 'bin'       # preferred encoding ('bin', 'delta' or 'csv')
+KEYFRAME_EVERY = 30    # delta: send a keyframe at least every n frames
+CHANGE_DRIVEN = True   # only send frames with visible changes (handshake)
+HEARTBEAT = 10         # but send at least one frame every n seconds
+HELLO_TIMEOUT = 3      # wait for hello of the MCU, then fall back to legacy
+STATS_INTERVAL = 60    # log latency statistics every n seconds (0: off)
+HISTORY_FILE = '/var/lib/cp_sysmon/history.ring'  # ring-file (None: off)
+HISTORY_HOURS = 24     # keep samples of the last n hours
+HISTORY_INTERVAL = 10  # add a sample to the history every n seconds
+HISTORY_IDS = ['cpu','mem','disk','temp']  # scalar metrics of the history
+SHM_FILE = '/dev/shm/cp_sysmon'  # publish latest sample here (None: off)
+SHM_IDS = ['cpu','mem']  # also sample these metrics for local consumers
+CGROUP_ROOT = '/sys/fs/cgroup'  # root of the cgroup-tree (v2)
+CGROUP_DEPTH = 3       # track cgroups up to n levels below the root
+CGROUP_TOP = 3         # number of cgroups in 'cgcpu' and 'cgmem'
+CGROUP_NAME_LEN = 12   # truncate names of cgroups
+SYSFS_ROOT = '/sys'    # root of sysfs (power-metrics)
+ROLLING = {'cpu': (0,100), 'mem': (0,100), 'temp': (0,120),
+           'power': (0,250)}  # rolling statistics of these metrics (range)
+ROLLING_HALF_LIFE = 10 # half-life of <id>_avg in seconds
+ROLLING_WINDOW = 60    # <id>_p95 and <id>_max of the last n samples
+HUB_STALE = 5          # hub: values of hosts silent for n seconds are stale
 
 def get_temp():
   """ return CPU-temperature """
@@ -30,33 +78,510 @@ def get_temp():
         return int(round(value.current,0))
   return 0
 
-if len(sys.argv) < 2:
-  port = "/dev/ttyACM1"
-else:
-  port = sys.argv[1]
-  if not port.startswith('/dev'):
-    port = f"/dev/{port}"
-
-print(f"using port {port}")
-ser = None
-while True:
-  # wait for serial device
-  while ser is None and not os.path.exists(port):
-    print(f"waiting for {port}") 
-    time.sleep(INTERVAL)
-  # create serial
-  if ser is None:
-    time.sleep(0.25)                # give udev time to set permissions
-    ser = serial.Serial(port,BAUD)
-    print(f"serial device created")
-  data = [f"{psutil.cpu_percent()}",
-          f"{psutil.virtual_memory().percent}",
-          f"{psutil.disk_usage(DISK_MOUNT).percent}",
-          f"{get_temp()}"]
-  #print(f"{data=}")
+def get_cores():
+  """ return load of all cores as packed bytes """
+  return bytes([int(v) for v in psutil.cpu_percent(percpu=True)])
+
+_mounts = None
+
+def get_disks():
+  """ return usage of all selected mounts as packed bytes """
+  global _mounts
+  if _mounts is None:
+    _mounts = Mounts(DISK_MOUNTS,DISK_FSTYPES)
+  return _mounts.usage()
+
+_cgroups = None
+_cgroups_lock = threading.Lock()
+
+def get_cgroups(key):
+  """ return top cgroups by cpu or mem as text (one line per cgroup) """
+  global _cgroups
+  with _cgroups_lock:
+    if _cgroups is None:
+      _cgroups = CGroups(CGROUP_ROOT,CGROUP_DEPTH,min_age=INTERVAL/2)
+  return format_top(_cgroups.top(key,CGROUP_TOP),key,
+                    CGROUP_NAME_LEN).encode()
+
+_power = None
+_power_lock = threading.Lock()
+
+def get_power(what):
+  """ return power-metric (see collector/power.py) """
+  global _power
+  with _power_lock:
+    if _power is None:
+      _power = Power(SYSFS_ROOT,min_age=INTERVAL/2)
+  return getattr(_power,what)()
+
+# available metrics: id -> (kind, function)
+METRICS = {
+  'cpu':   (SCALAR, lambda: psutil.cpu_percent()),
+  'mem':   (SCALAR, lambda: psutil.virtual_memory().percent),
+  'disk':  (SCALAR, lambda: psutil.disk_usage(DISK_MOUNT).percent),
+  'temp':  (SCALAR, get_temp),
+  'cores': (ARRAY,  get_cores),
+  'disks': (ARRAY,  get_disks),
+  'cgcpu': (ARRAY,  lambda: get_cgroups('cpu')),
+  'cgmem': (ARRAY,  lambda: get_cgroups('mem')),
+  'power': (SCALAR, lambda: get_power('watts')),
+  'ac':    (SCALAR, lambda: get_power('ac')),
+  'bat':   (SCALAR, lambda: get_power('battery')),
+  'batw':  (SCALAR, lambda: get_power('battery_watts')),
+  }
+
+# derived metrics (rolling statistics): <id>_avg, <id>_p95 and <id>_max
+DERIVED = {m: (SCALAR, None) for m in derived_ids(ROLLING)}
+
+# metrics sent to MCUs without handshake
+LEGACY_IDS = ['cpu','mem','disk','temp']
+
+# --- schema negotiated with the MCU   ---------------------------------------
+
+class Schema:
+  """ metrics, encoding and interval for the connected MCU """
+
+  SAME    = 0                     # no visible change since the last frame
+  CHANGED = 1                     # a value changed by at least its quantum
+  BAND    = 2                     # a value moved into another color-band
+
+  def __init__(self,ids,encoding,interval,stamped=True,metrics=None,
+               quanta=None,bands=None):
+    metrics = {**METRICS,**DERIVED} if metrics is None else metrics
+    quanta  = quanta or {}
+    bands   = bands or {}
+    self.ids      = [m for m in ids if m in metrics]
+    self.unknown  = [m for m in ids if not m in metrics]
+    self.kinds    = [metrics[m][0] for m in self.ids]
+    self.funcs    = [metrics[m][1] for m in self.ids]
+    self.quanta   = [quanta.get(m,0) for m in self.ids]
+    self.bands    = [bands.get(m,[]) for m in self.ids]
+    self.encoding = encoding
+    if encoding == 'delta':
+      self._delta  = protocol.DeltaEncoder(KEYFRAME_EVERY)
+      self._encode = self._delta.encode
+    else:
+      self._delta  = None
+      self._encode = protocol.ENCODERS[encoding]
+    self.interval = interval
+    self.stamped  = stamped       # frames carry sequence-number and time
+    self.seq      = 0
+    self._sent    = None          # values of the last frame
+
+  def encode(self,data):
+    """ encode data, stamp with sequence-number and monotonic time """
+    if not self.stamped:
+      return self._encode(data,self.kinds)
+    self.seq = (self.seq + 1) & 0xFFFF
+    return self._encode(data,self.kinds,self.seq,time_ms())
+
+  def ack(self,seq,base=None):
+    """ MCU processed frame seq (base: seq of its keyframe) """
+    if self._delta:
+      self._delta.ack(seq,base)
+
+  def sent(self,data):
+    """ remember values of the last frame sent """
+    self._sent = data
+
+  def change(self,data):
+    """ compare data with the last frame, return SAME, CHANGED or BAND """
+
+    if self._sent is None:
+      return Schema.BAND
+    result = Schema.SAME
+    for kind,q,bands,old,new in zip(self.kinds,self.quanta,self.bands,
+                                    self._sent,data):
+      if old == new:
+        continue
+      if kind == ARRAY or old is None or new is None:
+        result = Schema.CHANGED
+        continue
+      if (sum(1 for b in bands if old > b) !=
+          sum(1 for b in bands if new > b)):
+        return Schema.BAND
+      if abs(new-old) >= q:
+        result = Schema.CHANGED
+    return result
+
+# --- process hello of the MCU   ---------------------------------------------
+
+def process_hello(ser,args,history=None,metrics=None):
+  """ create schema from hello and send it (and the history) to the MCU """
+
+  encodings = protocol.split_list(args.get('enc','csv'))
+  encoding  = ENCODING if ENCODING in encodings else 'csv'
+  interval  = max(INTERVAL,int(args.get('period',0))/1000)
+  ids       = protocol.split_list(args.get('ids',''))
+  quanta    = [float(q) if q else 0 for q in args.get('q','').split(',')]
+  bands     = [[float(b) for b in band.split('/') if b]
+               for band in args.get('bands','').split(',')]
+  schema    = Schema(ids,encoding,interval,metrics=metrics,
+                     quanta=dict(zip(ids,quanta)),bands=dict(zip(ids,bands)))
+  ser.write(protocol.format_control('schema',
+                                    enc=schema.encoding,
+                                    ids=','.join(schema.ids),
+                                    unknown=','.join(schema.unknown)))
+  print(f"schema: {schema.ids}, encoding: {schema.encoding}, "
+        f"interval: {schema.interval}s")
+  if schema.unknown:
+    print(f"unknown metrics: {schema.unknown}")
+  send_history(ser,schema,history,args)
+  return schema
+
+# --- send history (backfill) to the MCU   -----------------------------------
+
+def send_history(ser,schema,history,args):
+  """ send history downsampled to the width requested by the MCU """
+
+  width = int(args.get('hist',0))
+  if not width or not history or schema.encoding == 'csv':
+    return
+  span   = int(args.get('hspan',0)) or width*schema.interval
+  ids    = [m for m,k in zip(schema.ids,schema.kinds) if k == SCALAR]
+  points = history.downsample(ids,width,span)
+  ser.write(protocol.encode_history(points,int(1000*span/width)))
+  print(f"history: {width} points, {span}s")
+
+# --- history of samples   ---------------------------------------------------
+
+def open_history():
+  """ open history ring-file """
+
+  if not HISTORY_FILE:
+    return None
+  ids = [m for m in HISTORY_IDS if METRICS.get(m,(None,))[0] == SCALAR]
+  try:
+    return History(HISTORY_FILE,ids,int(HISTORY_HOURS*3600/HISTORY_INTERVAL))
+  except (OSError,ValueError) as ex:
+    print(f"history disabled: {ex}")
+    return None
+
+# --- publish samples in shared memory   -------------------------------------
+
+def open_shm():
+  """ open shared memory for local consumers """
+
+  if not SHM_FILE:
+    return None
   try:
-    ser.write(bytes(f"{','.join(data)}\n",'UTF-8'))
-  except:
-    ser.close()
-    ser = None
-  time.sleep(INTERVAL)
+    return Publisher(SHM_FILE,list(METRICS),
+                     [kind for kind,_ in METRICS.values()])
+  except OSError as ex:
+    print(f"shared memory disabled: {ex}")
+    return None
+
+# --- monotonic time in milliseconds   --------------------------------------
+
+def time_ms():
+  """ monotonic time in ms """
+  return time.monotonic_ns()//1000000
+
+# --- class Writer   ---------------------------------------------------------
+
+class Writer:
+  """ device watcher and writer for one serial port """
+
+  def __init__(self,path,sampler,history=None,metrics=None,legacy=True):
+    self.path     = path
+    self.stats    = LinkStats(STATS_INTERVAL)
+    self._sampler = sampler
+    self._history = history
+    self._metrics = metrics
+    self._legacy  = legacy         # fall back to legacy schema (no hello)
+    self._schema  = None
+    self._stale   = set()          # stale ids sent to the MCU
+    self._port    = None           # port while connected
+
+  # --- set schema   ---------------------------------------------------------
+
+  def _set_schema(self,schema):
+    """ set schema, update metrics of the sampler """
+
+    if self._schema:
+      self._sampler.remove_ids(self._schema.ids)
+    self._schema = schema
+    self._stale  = set()
+    if schema:
+      self._sampler.add_ids(schema.ids)
+
+  # --- wait for hello of the MCU   ------------------------------------------
+
+  async def _handshake(self,port):
+    """ wait for hello, fall back to legacy schema """
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + HELLO_TIMEOUT
+    while True:
+      line = await port.readline(deadline - loop.time())
+      if line is None:
+        if self._legacy:
+          print("no hello from MCU, using legacy schema")
+          return Schema(LEGACY_IDS,'csv',INTERVAL,stamped=False)
+        port.write(protocol.format_control('hello'))   # ask for hello
+        deadline = loop.time() + HELLO_TIMEOUT
+        continue
+      cmd,args = protocol.parse_control(line)
+      if cmd == 'hello':
+        return process_hello(port,args,self._history,self._metrics)
+
+  # --- process input of the MCU   -------------------------------------------
+
+  async def _input(self,port):
+    """ process control-lines of the MCU """
+
+    while True:
+      line = await port.readline(HELLO_TIMEOUT)
+      if line is None:
+        continue
+      cmd,args = protocol.parse_control(line)
+      if cmd == 'hello':
+        # MCU restarted
+        self._set_schema(process_hello(port,args,self._history,
+                                       self._metrics))
+      elif cmd == 'stats':
+        self.stats.add(args,time_ms())
+        if self._schema and args.get('seq','').isdigit():
+          base = args.get('base','')
+          self._schema.ack(int(args['seq']),
+                           int(base) if base.isdigit() else None)
+
+  # --- write frames   -------------------------------------------------------
+
+  async def _write_frames(self,port):
+    """ send a frame for new samples (if due and changed, or urgent) """
+
+    loop = asyncio.get_running_loop()
+    due  = 0
+    sent = 0
+    while True:
+      await self._sampler.wait()
+      schema = self._schema
+      now    = loop.time()
+      sample = self._sampler.sample
+      data   = [sample.get(m,None) for m in schema.ids]
+      stale  = self._sampler.stale.intersection(schema.ids)
+      if CHANGE_DRIVEN and schema.stamped:
+        change = schema.change(data)
+      else:
+        change = Schema.CHANGED
+      if change != Schema.BAND and stale == self._stale:
+        # not urgent: wait for the interval, skip unchanged frames
+        slack = schema.interval/2
+        if now < due - slack:
+          continue
+        if change == Schema.SAME and now - sent < HEARTBEAT - slack:
+          continue
+      due  = max(due,now) + schema.interval
+      sent = now
+      if stale != self._stale and schema.stamped:
+        port.write(protocol.format_control('stale',ids=','.join(stale)))
+        self._stale = stale
+      if port.write(schema.encode(data),frame=True):
+        schema.sent(data)
+        self.stats.frame_sent()
+
+  # --- switch page of the MCU   --------------------------------------------
+
+  def page(self,page='next'):
+    """ ask the MCU to show a page (index, name or 'next') """
+
+    if self._port and self._schema and self._schema.stamped:
+      try:
+        self._port.write(protocol.format_control('page',n=page))
+      except EOFError:
+        pass                          # device gone, run() handles it
+
+  # --- watch device and serve it   ------------------------------------------
+
+  async def run(self):
+    """ wait for the device, then handshake and send frames (forever) """
+
+    print(f"using port {self.path}")
+    while True:
+      while not os.path.exists(self.path):
+        await asyncio.sleep(1)
+      await asyncio.sleep(0.25)       # give udev time to set permissions
+      try:
+        port = Port(self.path,BAUD)
+      except (OSError,serial.SerialException) as ex:
+        print(f"{self.path}: {ex}")
+        await asyncio.sleep(INTERVAL)
+        continue
+      print(f"serial device created")
+      tasks = []
+      try:
+        self._set_schema(await self._handshake(port))
+        self._port = port
+        tasks = [asyncio.ensure_future(self._input(port)),
+                 asyncio.ensure_future(self._write_frames(port))]
+        done,_ = await asyncio.wait(tasks,
+                                    return_when=asyncio.FIRST_COMPLETED)
+        for ex in [task.exception() for task in done]:
+          if ex:
+            raise ex                  # the first exception of the tasks
+      except EOFError:
+        print(f"{self.path}: device gone")
+      except Exception as ex:
+        print(f"{self.path}: {ex!r}") # e.g. a malformed hello: reconnect
+      finally:
+        for task in tasks:
+          task.cancel()
+        self._set_schema(None)
+        self._port = None
+        port.close()
+      await asyncio.sleep(INTERVAL)
+
+# --- tasks for history, shared memory and statistics   ----------------------
+
+async def history_task(history,sampler):
+  """ add latest sample to the history every HISTORY_INTERVAL seconds """
+
+  while True:
+    await asyncio.sleep(HISTORY_INTERVAL)
+    history.add([sampler.sample.get(m,None) for m in history.ids])
+
+async def publish_task(shm,sampler):
+  """ publish every sample in shared memory """
+
+  while True:
+    await sampler.wait()
+    shm.publish(sampler.sample,sampler.time)
+
+async def stats_task(writers):
+  """ log statistics of the links """
+
+  while True:
+    await asyncio.sleep(1)
+    for writer in writers:
+      writer.stats.log()
+
+# --- sample and send data   -------------------------------------------------
+
+async def collect(ports):
+  """ sample data and write it to the ports """
+
+  sampler = Sampler(METRICS,INTERVAL,SAMPLE_WORKERS,SAMPLE_TIMEOUT,
+                    SOURCE_TIMEOUTS,SOURCE_RETRIES,BACKOFF_MAX,
+                    Rolling(ROLLING,ROLLING_HALF_LIFE,ROLLING_WINDOW))
+  tasks   = [sampler.run()]
+  history = open_history()
+  if history:
+    sampler.add_ids(history.ids)
+    tasks.append(history_task(history,sampler))
+  shm = open_shm()
+  if shm:
+    # publish what is sampled anyway (plus SHM_IDS)
+    sampler.add_ids([m for m in SHM_IDS if m in METRICS])
+    tasks.append(publish_task(shm,sampler))
+  writers = [Writer(port,sampler,history) for port in ports]
+  tasks.extend([writer.run() for writer in writers])
+  # kill -USR1 shows the next page of the MCUs
+  asyncio.get_running_loop().add_signal_handler(
+    signal.SIGUSR1,lambda: [writer.page() for writer in writers])
+  tasks.append(stats_task(writers))
+  await asyncio.gather(*tasks)
+
+def run(*ports):
+  """ sample data and write it to the ports (forever) """
+  asyncio.run(collect(ports))
+
+# --- send samples to a hub   -----------------------------------------------
+
+async def send_remote(url,name,sampler,ids):
+  """ send every sample to the hub """
+
+  scheme,host,port = split_url(url)
+  kinds  = [METRICS[m][0] for m in ids]
+  sock   = None                     # udp
+  writer = None                     # tcp
+  stale  = None                     # stale ids of the last announce
+  seq    = 0
+  while True:
+    await sampler.wait()
+    seq = (seq + 1) & 0xFFFF
+    try:
+      frame = protocol.encode_bin([sampler.sample.get(m,None) for m in ids],
+                                  kinds,seq,time_ms())
+    except (TypeError,ValueError) as ex:
+      print(f"{name}: invalid sample: {ex}")
+      continue
+    try:
+      if scheme == 'udp' and sock is None:
+        sock = socket.socket(socket.AF_INET,socket.SOCK_DGRAM)
+        sock.setblocking(False)
+        sock.connect((host,port))
+      elif scheme == 'tcp' and writer is None:
+        _,writer = await asyncio.wait_for(asyncio.open_connection(host,port),
+                                          INTERVAL)
+        stale = None
+      # every datagram announces the host, tcp only after changes
+      announce = b''
+      if sock or sampler.stale != stale:
+        stale    = set(sampler.stale)
+        announce = protocol.format_control('host',name=name,ids=','.join(ids),
+                                           stale=','.join(sorted(stale)))
+      if sock:
+        sock.send(announce+frame)
+      else:
+        writer.write(announce+frame)
+        await asyncio.wait_for(writer.drain(),INTERVAL)
+    except (OSError,asyncio.TimeoutError) as ex:
+      print(f"{url}: {ex!r}")
+      if sock:
+        sock.close()
+      if writer:
+        writer.close()
+      sock   = None
+      writer = None
+
+async def run_remote(url,name):
+  """ sample all metrics and send them to the hub (forever) """
+
+  split_url(url)                    # fail early for invalid urls
+  ids     = list(METRICS)
+  sampler = Sampler(METRICS,INTERVAL,SAMPLE_WORKERS,SAMPLE_TIMEOUT,
+                    SOURCE_TIMEOUTS,SOURCE_RETRIES,BACKOFF_MAX)
+  sampler.add_ids(ids)
+  print(f"sending to {url} as {name}")
+  await asyncio.gather(sampler.run(),send_remote(url,name,sampler,ids))
+
+# --- hub: forward samples of remote hosts to the display   ------------------
+
+async def run_hub(port,urls):
+  """ receive samples of remote hosts and forward them to the port """
+
+  hub = Hub({m: kind for m,(kind,_) in METRICS.items()},HUB_STALE)
+  await hub.listen(urls)
+  sampler = Sampler(hub,INTERVAL,workers=0)
+  writer  = Writer(port,sampler,metrics=hub,legacy=False)
+  await asyncio.gather(sampler.run(),writer.run(),stats_task([writer]))
+
+# --- main program   ---------------------------------------------------------
+
+def get_parser():
+  """ configure argument-parser """
+
+  parser = ArgumentParser(description='send system statistics to a display')
+  parser.add_argument('--hub',metavar='URL',
+                      help='send samples to hub (udp://host:port or tcp://...)')
+  parser.add_argument('--name',default=socket.gethostname().split('.')[0],
+                      help='name of this host for the hub (default: hostname)')
+  parser.add_argument('--listen',metavar='URL',action='append',default=[],
+                      help='run as hub, receive samples on this url')
+  parser.add_argument('ports',nargs='*',default=['/dev/ttyACM1'],
+                      metavar='port',
+                      help='serial device(s) (default: /dev/ttyACM1)')
+  return parser
+
+if __name__ == '__main__':
+  options = get_parser().parse_args()
+  ports = [port if port.startswith('/dev') else f"/dev/{port}"
+           for port in options.ports]
+
+  if options.hub:
+    asyncio.run(run_remote(options.hub,options.name))
+  elif options.listen:
+    asyncio.run(run_hub(ports[0],options.listen))
+  else:
+    run(*ports)
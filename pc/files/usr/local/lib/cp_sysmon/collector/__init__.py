@@ -0,0 +1,9 @@
+# -------------------------------------------------------------------------
+# Package collector - protocol and helper modules for cp_sysmon.py.
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/cp-sysmon
+#
+# -------------------------------------------------------------------------
@@ -0,0 +1,287 @@
+# ----------------------------------------------------------------------------
+# cgroups.py
+#
+# Top consumers of CPU and memory among the cgroups (v2), e.g. containers
+# and services.
+#
+# The cgroups below the root are discovered once, then inotify reports
+# new and removed cgroups, so there is no directory walk per sample. The
+# files cpu.stat and memory.current of every cgroup stay open and are
+# re-read with pread. CPU usage counters are turned into rates (percent of
+# all CPUs). Only leaf cgroups (no child within `depth` levels) are ranked,
+# since parents include the usage of their children.
+#
+# The root is configurable, so the module also works with a fake tree of
+# directories and files. As a script it prints the top cgroups:
+#
+#   python3 /usr/local/lib/cp_sysmon/collector/cgroups.py [-r root] [-k 5]
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/cp-sysmon
+# ---------------------------------------------------------------------------
+
+import os
+import time
+import struct
+import ctypes
+import threading
+
+try:
+  from collector.rate import Rate
+except ImportError:
+  from rate import Rate         # run as a script
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO   = 0x00000080
+IN_CREATE     = 0x00000100
+IN_DELETE     = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED    = 0x00008000
+IN_ONLYDIR    = 0x01000000
+IN_ISDIR      = 0x40000000
+EVENT         = struct.Struct('iIII')
+
+SUFFIXES      = ('.scope','.slice','.service')
+
+# --- inotify (via libc)   ---------------------------------------------------
+
+class _Inotify:
+  """ minimal inotify-wrapper for directory-events """
+
+  MASK = IN_CREATE|IN_DELETE|IN_MOVED_FROM|IN_MOVED_TO|IN_ONLYDIR
+
+  def __init__(self):
+    self._libc = ctypes.CDLL(None,use_errno=True)
+    self.fd    = self._libc.inotify_init1(os.O_NONBLOCK|os.O_CLOEXEC)
+    if self.fd < 0:
+      raise OSError(ctypes.get_errno(),"inotify_init1 failed")
+
+  def add_watch(self,path):
+    """ watch directory, return watch-descriptor (-1 on error) """
+    return self._libc.inotify_add_watch(self.fd,os.fsencode(path),
+                                        _Inotify.MASK)
+
+  def events(self):
+    """ yield pending events as (wd,mask,name) """
+
+    while True:
+      try:
+        data = os.read(self.fd,65536)
+      except BlockingIOError:
+        return
+      pos = 0
+      while pos < len(data):
+        wd,mask,_,length = EVENT.unpack_from(data,pos)
+        pos += EVENT.size
+        name = os.fsdecode(data[pos:pos+length].rstrip(b'\0'))
+        pos += length
+        yield wd,mask,name
+
+  def close(self):
+    os.close(self.fd)
+
+# --- class Group   ----------------------------------------------------------
+
+class Group:
+  """ open files and rates of a cgroup """
+
+  def __init__(self,path,level):
+    self.path   = path
+    self.name   = os.path.basename(path)
+    self.level  = level
+    self.cpu    = 0             # percent of all CPUs
+    self.mem    = 0             # bytes
+    self._usage = Rate()        # usage_usec -> usec per second
+    self._fds   = []
+    for suffix in SUFFIXES:
+      if self.name.endswith(suffix):
+        self.name = self.name[:-len(suffix)]
+    for fname in ['cpu.stat','memory.current']:
+      try:
+        self._fds.append(os.open(os.path.join(path,fname),os.O_RDONLY))
+      except OSError:
+        self._fds.append(None)
+
+  def update(self,now,ncpu):
+    """ re-read files. Raises OSError if the cgroup is gone """
+
+    cpu_fd,mem_fd = self._fds
+    if cpu_fd is not None:
+      for line in os.pread(cpu_fd,4096,0).split(b'\n'):
+        if line.startswith(b'usage_usec '):
+          rate = self._usage.update(int(line[11:]),now)
+          if rate is not None:
+            self.cpu = rate/ncpu/1e4
+          break
+    if mem_fd is not None:
+      self.mem = int(os.pread(mem_fd,64,0) or 0)
+
+  def close(self):
+    for fd in self._fds:
+      if fd is not None:
+        os.close(fd)
+
+# --- class CGroups   --------------------------------------------------------
+
+class CGroups:
+  """ track cgroups below root """
+
+  def __init__(self,root=CGROUP_ROOT,depth=3,min_age=0.5):
+    self._root    = root
+    self._depth   = depth
+    self._min_age = min_age     # reuse updates younger than this (seconds)
+    self._ncpu    = os.cpu_count() or 1
+    self._lock    = threading.Lock()
+    self._updated = 0
+    self._groups  = {}          # path -> Group
+    self._watches = {}          # wd -> (path,level)
+    try:
+      self._inotify = _Inotify()
+    except (OSError,AttributeError):
+      self._inotify = None      # no inotify: rescan every update
+    self._add(root,0)
+
+  # --- add and remove cgroups   ---------------------------------------------
+
+  def _walk(self,path,level):
+    """ yield (path,level) of path and its children, watch directories """
+
+    yield path,level
+    if level == self._depth:
+      return
+    if self._inotify:
+      wd = self._inotify.add_watch(path)  # watch first: no missed children
+      if wd >= 0:
+        self._watches[wd] = (path,level)
+    try:
+      children = [e.path for e in os.scandir(path) if e.is_dir()]
+    except OSError:
+      return
+    for child in children:
+      yield from self._walk(child,level+1)
+
+  def _add(self,path,level):
+    """ add cgroup and its children """
+
+    for p,l in self._walk(path,level):
+      if l and p not in self._groups:
+        self._groups[p] = Group(p,l)
+
+  def _remove(self,path):
+    """ remove cgroup and its children """
+
+    for p in [p for p in self._groups
+              if p == path or p.startswith(path+os.sep)]:
+      self._groups.pop(p).close()
+
+  def _rescan(self):
+    """ full rescan (no inotify or event-queue overflow) """
+
+    found = dict(self._walk(self._root,0))
+    for p in [p for p in self._groups if p not in found]:
+      self._groups.pop(p).close()
+    for p,level in found.items():
+      if level and p not in self._groups:
+        self._groups[p] = Group(p,level)
+
+  def _process_events(self):
+    """ apply changes of the tree """
+
+    if not self._inotify:
+      self._rescan()
+      return
+    for wd,mask,name in self._inotify.events():
+      if mask & IN_Q_OVERFLOW:
+        self._rescan()
+        return
+      if mask & IN_IGNORED:
+        self._watches.pop(wd,None)
+        continue
+      if wd not in self._watches or not mask & IN_ISDIR:
+        continue
+      parent,level = self._watches[wd]
+      path = os.path.join(parent,name)
+      if mask & (IN_CREATE|IN_MOVED_TO):
+        self._add(path,level+1)
+      else:
+        self._remove(path)
+
+  # --- update all cgroups   -------------------------------------------------
+
+  def update(self):
+    """ update rates of all cgroups (at most once every min_age seconds) """
+
+    with self._lock:
+      now = time.monotonic()
+      if now - self._updated < self._min_age:
+        return
+      self._updated = now
+      self._process_events()
+      for path in list(self._groups):
+        try:
+          if path in self._groups:
+            self._groups[path].update(now,self._ncpu)
+        except (OSError,ValueError):
+          self._remove(path)    # removed between event and read
+
+  # --- top consumers   ------------------------------------------------------
+
+  def top(self,key,k):
+    """ return the k leaf cgroups with the highest cpu or mem """
+
+    self.update()
+    with self._lock:
+      parents = set(os.path.dirname(p) for p in self._groups)
+      leaves  = [g for p,g in self._groups.items() if p not in parents]
+      return sorted(leaves,key=lambda g: getattr(g,key),reverse=True)[:k]
+
+  def close(self):
+    for group in self._groups.values():
+      group.close()
+    if self._inotify:
+      self._inotify.close()
+
+# --- format values   --------------------------------------------------------
+
+def format_size(n):
+  """ format number of bytes with unit (K, M, G) """
+
+  for unit in ['K','M','G']:
+    n /= 1024
+    if n < 1000:
+      break
+  return f"{n:.0f}{unit}" if n >= 10 else f"{n:.1f}{unit}"
+
+def format_top(groups,key,width=12):
+  """ format top cgroups as text, one line per cgroup """
+
+  if key == 'cpu':
+    return '\n'.join(f"{g.name[:width]} {g.cpu:.0f}%" for g in groups)
+  return '\n'.join(f"{g.name[:width]} {format_size(g.mem)}" for g in groups)
+
+# --- print top cgroups   ----------------------------------------------------
+
+if __name__ == '__main__':
+  from argparse import ArgumentParser
+  parser = ArgumentParser(description='print top cgroups by cpu and memory')
+  parser.add_argument('-r','--root',default=CGROUP_ROOT,
+                      help=f"root of the cgroup-tree (default: {CGROUP_ROOT})")
+  parser.add_argument('-d','--depth',type=int,default=3,
+                      help='max. depth below root (default: 3)')
+  parser.add_argument('-k','--top',type=int,default=5,
+                      help='number of cgroups (default: 5)')
+  parser.add_argument('-i','--interval',type=float,default=1,
+                      help='interval in seconds (default: 1)')
+  options = parser.parse_args()
+
+  cgroups = CGroups(options.root,options.depth)
+  cgroups.update()
+  while True:
+    time.sleep(options.interval)
+    print(format_top(cgroups.top('cpu',options.top),'cpu',width=32))
+    print(format_top(cgroups.top('mem',options.top),'mem',width=32))
+    print()
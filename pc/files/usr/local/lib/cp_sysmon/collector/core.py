@@ -0,0 +1,320 @@
+# ----------------------------------------------------------------------------
+# core.py
+#
+# Building blocks of the asyncio-based collector: a non-blocking serial
+# port and the sampler.
+#
+# The sampler runs the functions of the metrics in a bounded thread pool.
+# A function that does not return within its deadline keeps its last value
+# (and is flagged as stale). It is not called again until the hung call
+# returns and repeat offenders are only retried with backoff, so a stalled
+# source (e.g. statvfs of a hung NFS-mount) does not delay the samples.
+# Since every source has at most one running call, the pool has at least
+# one thread per metric plus one: even if all sources hang, there is a
+# free thread. Threads are only started when needed.
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/cp-sysmon
+# ---------------------------------------------------------------------------
+
+import os
+import time
+import asyncio
+import concurrent.futures
+
+import serial
+
+# --- class Port   -----------------------------------------------------------
+
+class Port:
+  """ serial port with non-blocking reads and writes """
+
+  MAX_PENDING = 4096               # skip frames if more bytes are pending
+
+  def __init__(self,path,baud):
+    self.path     = path
+    self._ser     = serial.Serial(path,baud,timeout=0)
+    self._fd      = self._ser.fileno()
+    self._loop    = asyncio.get_running_loop()
+    self._lines   = asyncio.Queue()
+    self._line    = bytearray()
+    self._pending = bytearray()
+    self.skipped  = 0               # frames skipped due to backpressure
+    self.closed   = False
+    self._loop.add_reader(self._fd,self._readable)
+
+  # --- read data   ----------------------------------------------------------
+
+  def _readable(self):
+    """ read available data and queue complete lines """
+
+    try:
+      data = os.read(self._fd,4096)
+    except BlockingIOError:
+      return
+    except OSError:
+      data = b''
+    if not data:
+      self.close()                      # device gone
+      return
+    self._line.extend(data)
+    while b'\n' in self._line:
+      pos = self._line.find(b'\n')
+      self._lines.put_nowait(bytes(self._line[:pos+1]))
+      del self._line[:pos+1]
+
+  async def readline(self,timeout):
+    """ return next line, None on timeout. Raises EOFError if closed """
+
+    if self.closed and self._lines.empty():
+      raise EOFError(self.path)
+    try:
+      line = await asyncio.wait_for(self._lines.get(),max(0,timeout))
+    except asyncio.TimeoutError:
+      return None
+    if line is None:
+      raise EOFError(self.path)
+    return line
+
+  # --- write data   ---------------------------------------------------------
+
+  def write(self,data,frame=False):
+    """ write without blocking. Frames are skipped if the port is busy,
+    other data (control-lines) is always queued. Returns False if skipped.
+    """
+
+    if self.closed:
+      raise EOFError(self.path)
+    if self._pending:
+      if frame and len(self._pending) > Port.MAX_PENDING:
+        self.skipped += 1
+        return False
+      self._pending.extend(data)
+      return True
+    try:
+      n = os.write(self._fd,data)
+    except BlockingIOError:
+      n = 0
+    except OSError:
+      self.close()
+      raise EOFError(self.path)
+    if n < len(data):
+      self._pending.extend(data[n:])
+      self._loop.add_writer(self._fd,self._writable)
+    return True
+
+  def _writable(self):
+    """ write pending data """
+
+    try:
+      n = os.write(self._fd,self._pending)
+    except BlockingIOError:
+      return
+    except OSError:
+      self.close()
+      return
+    del self._pending[:n]
+    if not self._pending:
+      self._loop.remove_writer(self._fd)
+
+  # --- close port   ---------------------------------------------------------
+
+  def close(self):
+    """ close port, wake up readers """
+
+    if self.closed:
+      return
+    self.closed = True
+    self._loop.remove_reader(self._fd)
+    self._loop.remove_writer(self._fd)
+    self._lines.put_nowait(None)
+    try:
+      self._ser.close()
+    except (OSError,serial.SerialException):
+      pass
+
+# --- class Source   ---------------------------------------------------------
+
+class Source:
+  """ state of a metric-source """
+
+  def __init__(self,func,timeout):
+    self.func     = func
+    self.timeout  = timeout        # deadline of a call (seconds)
+    self.future   = None           # running call
+    self.started  = 0
+    self.overruns = 0              # consecutive calls exceeding the deadline
+    self.backoff  = 0              # current backoff (seconds)
+    self.retry_at = 0
+
+  def done(self,future):
+    """ callback: update state from the duration of the call """
+
+    if time.monotonic() - self.started <= self.timeout:
+      self.overruns = 0
+      self.backoff  = 0
+
+# --- class Sampler   --------------------------------------------------------
+
+class Sampler:
+  """ sample metrics periodically, notify waiting consumers.
+
+  Every source has a deadline. A source missing its deadline is stale: it
+  keeps its last value and is not called again while the call is running.
+  After `retries` consecutive overruns, the source is only retried in the
+  background with exponential backoff (up to `backoff` seconds) until a
+  call meets the deadline again.
+
+  Derived metrics (rolling statistics) are computed after every sample,
+  registering a derived metric also registers its base-metric.
+  """
+
+  def __init__(self,metrics,interval,workers=4,timeout=0.5,timeouts=None,
+               retries=3,backoff=60,rolling=None):
+    self._metrics  = metrics
+    self._rolling  = rolling        # derived metrics (collector/rolling.py)
+    self._interval = interval
+    self._timeout  = timeout
+    self._timeouts = timeouts or {} # per-source timeouts
+    self._retries  = retries
+    self._backoff  = backoff
+    self._pool     = (concurrent.futures.ThreadPoolExecutor(
+                        max_workers=max(workers,len(metrics)+1),
+                        thread_name_prefix='sampler')
+                      if workers else None)
+    self._sources  = {}             # id -> Source
+    self._ids      = {}             # id -> number of consumers
+    self._new      = asyncio.Event()
+    self.sample    = {}             # latest values
+    self.stale     = set()          # ids with values older than this sample
+    self.time      = 0              # time of the latest sample (epoch)
+
+  # --- register ids of consumers   ------------------------------------------
+
+  def _with_bases(self,ids):
+    """ add the base-metrics of derived metrics """
+    if not self._rolling:
+      return ids
+    return list(ids) + [self._rolling.ids[m][0] for m in ids
+                        if m in self._rolling.ids]
+
+  def add_ids(self,ids):
+    for m in self._with_bases(ids):
+      self._ids[m] = self._ids.get(m,0) + 1
+
+  def remove_ids(self,ids):
+    for m in self._with_bases(ids):
+      self._ids[m] -= 1
+      if not self._ids[m]:
+        del self._ids[m]
+        self.sample.pop(m,None)
+        self.stale.discard(m)
+
+  # --- start call of a source   ---------------------------------------------
+
+  def _source(self,m):
+    """ return source of metric """
+
+    source = self._sources.get(m,None)
+    if source is None:
+      source = self._sources[m] = Source(self._metrics[m][1],
+                                         self._timeouts.get(m,self._timeout))
+    return source
+
+  def _start(self,source):
+    """ run function in the pool """
+
+    source.started = time.monotonic()
+    source.future  = asyncio.get_running_loop().run_in_executor(
+      self._pool,source.func)
+    source.future.add_done_callback(source.done)
+
+  # --- sample once   --------------------------------------------------------
+
+  async def _sample(self):
+    """ sample all registered metrics """
+
+    ids = [m for m in self._ids if m in self._metrics]
+    if not self._pool:
+      self.sample = {m: self._metrics[m][1]() for m in ids}
+      # metrics of the hub flag stale values of remote sources
+      self.stale  = getattr(self._metrics,'stale',set()).intersection(ids)
+      return
+
+    # start calls of healthy sources, retry others in the background
+    now     = time.monotonic()
+    started = {}
+    for m in ids:
+      source = self._source(m)
+      if source.future:
+        continue                        # still running from last time
+      if source.overruns < self._retries:
+        self._start(source)
+        started[m] = source
+      elif now >= source.retry_at:
+        source.backoff  = min(2*source.backoff or self._interval,
+                              self._backoff)
+        source.retry_at = now + source.backoff
+        self._start(source)
+
+    # wait for the deadlines of the started calls
+    pending = set(s.future for s in started.values())
+    for timeout in sorted(set(s.timeout for s in started.values())):
+      if pending:
+        _,pending = await asyncio.wait(
+          pending,timeout=max(0,now+timeout-time.monotonic()))
+      for m,source in started.items():
+        if source.timeout == timeout and not source.future.done():
+          source.overruns += 1
+          if source.overruns == self._retries:
+            print(f"{m}: missed deadline {self._retries} times, backing off")
+
+    # collect results (including late results of earlier calls)
+    stale = set()
+    for m in ids:
+      source = self._sources[m]
+      if not source.future or not source.future.done():
+        stale.add(m)                    # keep last value
+        continue
+      future,source.future = source.future,None
+      try:
+        self.sample[m] = future.result()
+      except Exception as ex:
+        print(f"{m}: {ex}")
+        self.sample[m] = None
+    self.stale = stale
+
+  # --- derived metrics   ----------------------------------------------------
+
+  def _derive(self):
+    """ add derived metrics of the registered ids to the sample """
+
+    values = self._rolling.update(self.sample,self.stale)
+    for m in self._ids:
+      if m in values:
+        self.sample[m] = values[m]
+        if self._rolling.ids[m][0] in self.stale:
+          self.stale.add(m)
+
+  # --- sampler task   -------------------------------------------------------
+
+  async def run(self):
+    """ sample every interval, notify consumers """
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time()
+    while True:
+      await self._sample()
+      if self._rolling:
+        self._derive()
+      self.time = time.time()
+      self._new.set()
+      self._new.clear()
+      deadline = max(deadline + self._interval,loop.time())
+      await asyncio.sleep(deadline - loop.time())
+
+  async def wait(self):
+    """ wait for the next sample """
+    await self._new.wait()
@@ -0,0 +1,147 @@
+# ----------------------------------------------------------------------------
+# history.py
+#
+# History of samples in a memory-mapped ring-file.
+#
+# The file has a header (magic and a json-description, padded to 4096
+# bytes) followed by a fixed number of fixed-size records:
+#
+#   crc (uint32), n (uint32), time (double, epoch), one int16 per metric
+#
+# n counts the records ever written, the crc covers the rest of the record.
+# Since only complete records with a valid crc are used, an interrupted
+# write loses at most this record. The newest record is found by scanning
+# the file once when opening it, so the header never changes after
+# creation. Memory usage is constant (the mapped file).
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/cp-sysmon
+# ---------------------------------------------------------------------------
+
+import os
+import json
+import mmap
+import time
+import struct
+import zlib
+
+MAGIC    = b'CPSYSMONRING'
+VERSION  = 1
+HEADER   = 4096
+NO_VALUE = -0x8000
+
+# --- class History   --------------------------------------------------------
+
+class History:
+  """ ring of samples in a memory-mapped file """
+
+  def __init__(self,path,ids,capacity):
+    self.ids      = list(ids)
+    self.capacity = capacity
+    self._record  = struct.Struct('<IId' + 'h'*len(self.ids))
+    self._body    = struct.Struct('<Id' + 'h'*len(self.ids))
+    self._mm      = self._open(path)
+    self.n        = self._scan()
+
+  # --- open or create ring-file   -------------------------------------------
+
+  def _open(self,path):
+    """ map ring-file, recreate it if the description does not match """
+
+    header = MAGIC + bytes(' ' + json.dumps({
+      'v': VERSION, 'ids': self.ids, 'capacity': self.capacity,
+      'size': self._record.size}) + '\n','utf-8')
+    if len(header) > HEADER:
+      raise ValueError("history: too many metrics")
+    header += bytes(HEADER-len(header))
+    size = HEADER + self.capacity*self._record.size
+
+    os.makedirs(os.path.dirname(path) or '.',exist_ok=True)
+    fd = os.open(path,os.O_RDWR|os.O_CREAT,0o644)
+    try:
+      if (os.fstat(fd).st_size != size or
+          os.pread(fd,HEADER,0) != header):
+        os.ftruncate(fd,0)
+        os.ftruncate(fd,size)
+        os.pwrite(fd,header,0)
+      return mmap.mmap(fd,size)
+    finally:
+      os.close(fd)
+
+  # --- find newest record   -------------------------------------------------
+
+  def _record_at(self,slot):
+    """ return (n,time,values) of the given slot or None if invalid """
+
+    offset = HEADER + slot*self._record.size
+    crc    = struct.unpack_from('<I',self._mm,offset)[0]
+    body   = self._mm[offset+4:offset+self._record.size]
+    if crc != zlib.crc32(body) or not any(body):
+      return None
+    n,t,*values = self._body.unpack(body)
+    return (n,t,values)
+
+  def _scan(self):
+    """ return number of records written so far """
+
+    n = 0
+    for slot in range(self.capacity):
+      record = self._record_at(slot)
+      if record and record[0] > n:
+        n = record[0]
+    return n
+
+  # --- add sample   ---------------------------------------------------------
+
+  def add(self,values,t=None):
+    """ add sample (one value per metric, None for no value) """
+
+    self.n += 1
+    values = [NO_VALUE if v is None else max(-32767,min(32767,round(10*v)))
+              for v in values]
+    body   = self._body.pack(self.n,time.time() if t is None else t,*values)
+    offset = HEADER + ((self.n-1) % self.capacity)*self._record.size
+    self._mm[offset+4:offset+self._record.size] = body
+    struct.pack_into('<I',self._mm,offset,zlib.crc32(body))
+
+  # --- iterate records   ----------------------------------------------------
+
+  def records(self,since=0):
+    """ yield (time,values) of valid records newer than since, oldest first """
+
+    first = max(1,self.n-self.capacity+1)
+    for n in range(first,self.n+1):
+      record = self._record_at((n-1) % self.capacity)
+      if record and record[0] == n and record[1] >= since:
+        yield record[1],record[2]
+
+  # --- downsample   ---------------------------------------------------------
+
+  def downsample(self,ids,width,span,now=None):
+    """ return width points (averages) of the last span seconds.
+    Every point has one value per id, None for no value.
+    """
+
+    now   = time.time() if now is None else now
+    start = now - span
+    step  = span/width
+    index = [self.ids.index(m) if m in self.ids else None for m in ids]
+    sums  = [[0]*len(ids) for _ in range(width)]
+    count = [[0]*len(ids) for _ in range(width)]
+    for t,values in self.records(start):
+      p = min(width-1,int((t-start)/step))
+      for k,i in enumerate(index):
+        if i is not None and values[i] != NO_VALUE:
+          sums[p][k]  += values[i]
+          count[p][k] += 1
+    return [[s/(10*c) if c else None for s,c in zip(sums[p],count[p])]
+            for p in range(width)]
+
+  # --- close   --------------------------------------------------------------
+
+  def close(self):
+    """ flush and unmap file """
+    self._mm.flush()
+    self._mm.close()
@@ -0,0 +1,167 @@
+# ----------------------------------------------------------------------------
+# hub.py
+#
+# Merge the samples of remote collectors (multi-host display).
+#
+# Remote collectors send their samples as binary data-frames over UDP or
+# TCP. Every UDP-datagram starts with a control-line naming the host and
+# its metrics, followed by one data-frame:
+#
+#   !host name=build1 ids=cpu,mem,disk,temp,cores stale=disk
+#   SYNC 'D' len payload checksum
+#
+# On TCP, the control-line is only sent after connecting and when the
+# stale metrics of the host (sources missing their deadline) change. The
+# hub keeps the latest sample per host. Metric-ids of the display have the
+# form host.metric (e.g. build1.cpu), values of hosts without a sample
+# for more than `stale` seconds are reported as missing (None).
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/cp-sysmon
+# ---------------------------------------------------------------------------
+
+import time
+import asyncio
+from urllib.parse import urlsplit
+
+from collector import protocol
+
+# --- split url   ------------------------------------------------------------
+
+def split_url(url):
+  """ split udp://host:port or tcp://host:port into (scheme,host,port) """
+
+  parts = urlsplit(url)
+  if parts.scheme not in ['udp','tcp'] or not parts.port:
+    raise ValueError(f"invalid url: {url}")
+  return (parts.scheme,parts.hostname or '0.0.0.0',parts.port)
+
+# --- class Host   -----------------------------------------------------------
+
+class Host:
+  """ latest sample of a remote host """
+
+  def __init__(self,name):
+    self.name   = name
+    self.ids    = []
+    self.kinds  = []
+    self.values = {}
+    self.stale  = []
+    self.seen   = 0
+
+# --- class Hub   ------------------------------------------------------------
+
+class Hub:
+  """ latest samples of all hosts. The hub maps ids host.metric to
+  (kind,function), like the METRICS-dict of cp_sysmon.py.
+  """
+
+  def __init__(self,kinds,stale=5):
+    self._kinds = kinds            # kind of every known metric
+    self._stale = stale
+    self.hosts  = {}
+
+  # --- metric-mapping   -----------------------------------------------------
+
+  def _split(self,id):
+    host,_,metric = id.rpartition('.')
+    return host,metric
+
+  def __contains__(self,id):
+    host,metric = self._split(id)
+    return bool(host) and metric in self._kinds
+
+  def __getitem__(self,id):
+    host,metric = self._split(id)
+    if not host or not metric in self._kinds:
+      raise KeyError(id)
+    return (self._kinds[metric],lambda: self.value(host,metric))
+
+  # --- latest value   -------------------------------------------------------
+
+  def value(self,host,metric):
+    """ return latest value, None for unknown or stale hosts """
+
+    h = self.hosts.get(host,None)
+    if h is None or time.monotonic() - h.seen > self._stale:
+      return None
+    return h.values.get(metric,None)
+
+  @property
+  def stale(self):
+    """ ids (host.metric) flagged as stale by their hosts """
+    return set([f"{h.name}.{m}" for h in self.hosts.values() for m in h.stale])
+
+  # --- process data of a remote collector   ---------------------------------
+
+  def _announce(self,name,ids):
+    """ register host and its metrics """
+
+    host = self.hosts.get(name,None)
+    if host is None:
+      host = self.hosts[name] = Host(name)
+      print(f"hub: new host {name}")
+    if host.ids != ids:
+      host.ids   = ids
+      host.kinds = [self._kinds.get(m,protocol.SCALAR) for m in ids]
+    return host
+
+  def feed(self,decoder,data,host=None):
+    """ process data (of one datagram or connection), return host """
+
+    for ftype,payload in decoder.feed(data):
+      if ftype is None:
+        cmd,args = protocol.parse_control(payload)
+        if cmd == 'host' and args.get('name',None):
+          host = self._announce(args['name'],
+                                protocol.split_list(args.get('ids','')))
+          host.stale = protocol.split_list(args.get('stale',''))
+      elif ftype == protocol.T_DATA and host:
+        try:
+          _,_,values = protocol.decode_bin(payload,host.kinds)
+        except ValueError:
+          continue                      # schema changed, wait for announce
+        host.values = dict(zip(host.ids,values))
+        host.seen   = time.monotonic()
+    return host
+
+  # --- network endpoints   --------------------------------------------------
+
+  async def listen(self,urls):
+    """ start UDP- and TCP-endpoints for the given urls """
+
+    loop = asyncio.get_running_loop()
+    for url in urls:
+      scheme,host,port = split_url(url)
+      if scheme == 'udp':
+        await loop.create_datagram_endpoint(lambda: _UdpProtocol(self),
+                                            local_addr=(host,port))
+      else:
+        await asyncio.start_server(self._tcp_client,host,port)
+      print(f"hub: listening on {url}")
+
+  async def _tcp_client(self,reader,writer):
+    """ process data of a TCP-connection """
+
+    decoder = protocol.Decoder()
+    host    = None
+    try:
+      while data := await reader.read(4096):
+        host = self.feed(decoder,data,host)
+    except OSError:
+      pass
+    finally:
+      writer.close()
+
+# --- UDP-endpoint   ---------------------------------------------------------
+
+class _UdpProtocol(asyncio.DatagramProtocol):
+  """ every datagram is self-contained """
+
+  def __init__(self,hub):
+    self._hub = hub
+
+  def datagram_received(self,data,addr):
+    self._hub.feed(protocol.Decoder(),data)
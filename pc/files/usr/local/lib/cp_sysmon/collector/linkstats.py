@@ -0,0 +1,76 @@
+# ----------------------------------------------------------------------------
+# linkstats.py
+#
+# Collect the statistics echoed by the MCU and log latency distributions.
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/cp-sysmon
+# ---------------------------------------------------------------------------
+
+import time
+
+# --- percentiles of a list of samples   --------------------------------------
+
+def percentiles(samples,pcts=(50,90,99)):
+  """ return list of percentiles and the maximum """
+
+  if not samples:
+    return [0]*(len(pcts)+1)
+  samples = sorted(samples)
+  n = len(samples)
+  return [samples[min(n-1,p*n//100)] for p in pcts] + [samples[-1]]
+
+# --- class LinkStats   ------------------------------------------------------
+
+class LinkStats:
+  """ statistics of the link and the MCU """
+
+  KEYS = ['rtt','parse','render','refresh']
+
+  def __init__(self,interval):
+    self._interval = interval
+    self._next_log = time.monotonic() + interval
+    self._samples  = {key: [] for key in LinkStats.KEYS}
+    self.sent      = 0
+    self._rx       = 0
+    self._drop     = 0
+
+  # --- register sent frame   ------------------------------------------------
+
+  def frame_sent(self):
+    """ count sent frames """
+    self.sent += 1
+
+  # --- add statistics echoed by the MCU   -----------------------------------
+
+  def add(self,args,now_ms):
+    """ add statistics of one frame """
+
+    try:
+      rtt = (now_ms - int(args['t'])) & 0xFFFFFFFF
+      self._samples['rtt'].append(rtt)
+      for key in LinkStats.KEYS[1:]:
+        # MCU reports microseconds, we log milliseconds
+        self._samples[key].append(int(args[key])/1000)
+      self._rx   = int(args['rx'])
+      self._drop = int(args['drop'])
+    except (KeyError,ValueError):
+      pass
+
+  # --- log statistics   -----------------------------------------------------
+
+  def log(self):
+    """ log distributions if the interval has passed """
+
+    if not self._interval or time.monotonic() < self._next_log:
+      return
+    self._next_log += self._interval
+
+    print(f"frames: sent={self.sent} rx={self._rx} drop={self._drop}")
+    for key in LinkStats.KEYS:
+      p50,p90,p99,pmax = percentiles(self._samples[key])
+      print(f"  {key:8s} ms: p50={p50:.1f} p90={p90:.1f} "
+            f"p99={p99:.1f} max={pmax:.1f} (n={len(self._samples[key])})")
+      self._samples[key].clear()
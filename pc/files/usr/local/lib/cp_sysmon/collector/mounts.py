@@ -0,0 +1,91 @@
+# ----------------------------------------------------------------------------
+# mounts.py
+#
+# Disk usage of many mounts as one packed array.
+#
+# The mount table (/proc/self/mountinfo) is only parsed again after the
+# kernel signals a change: polling the open file returns POLLPRI/POLLERR
+# after a mount or umount. Every call then runs one statvfs per selected
+# mount. Mounts are selected by glob-patterns of the mount point or by
+# filesystem type, so new volumes show up without a restart.
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/cp-sysmon
+# ---------------------------------------------------------------------------
+
+import os
+import re
+import select
+import fnmatch
+
+MOUNTINFO = '/proc/self/mountinfo'
+_ESCAPE   = re.compile(r'\\([0-7]{3})')
+
+# --- parse mountinfo   ------------------------------------------------------
+
+def parse_mountinfo(text):
+  """ return dict mount point -> fstype (in mount order) """
+
+  mounts = {}
+  for line in text.splitlines():
+    fields = line.split()
+    try:
+      sep = fields.index('-',6)
+    except ValueError:
+      continue
+    mount = _ESCAPE.sub(lambda m: chr(int(m.group(1),8)),fields[4])
+    mounts.pop(mount,None)              # over-mounts hide older mounts
+    mounts[mount] = fields[sep+1]
+  return mounts
+
+# --- class Mounts   ---------------------------------------------------------
+
+class Mounts:
+  """ usage of selected mounts """
+
+  def __init__(self,patterns=None,fstypes=None,path=MOUNTINFO):
+    self._patterns = ['/'] if patterns is None else patterns
+    self._fstypes  = fstypes or []
+    self._fd       = os.open(path,os.O_RDONLY)
+    self._poll     = select.poll()
+    self._poll.register(self._fd,select.POLLPRI|select.POLLERR)
+    self.mounts    = self._read()
+
+  # --- (re-)read mount table   ----------------------------------------------
+
+  def _read(self):
+    """ return selected mount points """
+
+    os.lseek(self._fd,0,os.SEEK_SET)
+    data = bytearray()
+    while chunk := os.read(self._fd,65536):
+      data.extend(chunk)
+    return [m for m,fstype in parse_mountinfo(data.decode()).items()
+            if fstype in self._fstypes or
+            any(fnmatch.fnmatchcase(m,p) for p in self._patterns)]
+
+  # --- usage of all mounts   ------------------------------------------------
+
+  def usage(self):
+    """ return usage (percent) of all mounts as packed bytes """
+
+    if self._poll.poll(0):
+      self.mounts = self._read()
+    values = bytearray()
+    for m in self.mounts:
+      try:
+        st = os.statvfs(m)
+      except OSError:
+        values.append(0)                # e.g. removed since last change
+        continue
+      used  = st.f_blocks - st.f_bfree
+      total = used + st.f_bavail
+      values.append(round(100*used/total) if total else 0)
+    return bytes(values)
+
+  # --- close   --------------------------------------------------------------
+
+  def close(self):
+    os.close(self._fd)
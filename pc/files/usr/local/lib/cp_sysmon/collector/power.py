@@ -0,0 +1,198 @@
+# ----------------------------------------------------------------------------
+# power.py
+#
+# Power and energy metrics from sysfs:
+#
+#   - powercap/RAPL: energy counters (microjoule) of the CPU-packages,
+#     converted to watts. The counters wrap at max_energy_range_uj.
+#   - power_supply: AC-state, capacity and power of batteries.
+#
+# Files are opened once and re-read with pread. The root of sysfs is
+# configurable, so the module also works with a tree of fixture files.
+# As a script it prints the values every second:
+#
+#   python3 /usr/local/lib/cp_sysmon/collector/power.py [-r root]
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/cp-sysmon
+# ---------------------------------------------------------------------------
+
+import os
+import time
+import threading
+
+try:
+  from collector.rate import Rate
+except ImportError:
+  from rate import Rate         # run as a script
+
+SYSFS_ROOT = '/sys'
+
+# --- read a sysfs-attribute   -----------------------------------------------
+
+def _read(path):
+  """ read attribute, None if missing """
+  try:
+    with open(path,'r') as f:
+      return f.read().strip()
+  except OSError:
+    return None
+
+def _open(path):
+  """ open attribute, None if missing or unreadable """
+  try:
+    return os.open(path,os.O_RDONLY)
+  except OSError:
+    return None
+
+def _value(fd):
+  """ re-read an open numeric attribute """
+  return int(os.pread(fd,32,0))
+
+# --- class Zone   -----------------------------------------------------------
+
+class Zone:
+  """ energy counter of a RAPL-zone """
+
+  def __init__(self,path):
+    self.name  = _read(os.path.join(path,'name'))
+    self.fd    = _open(os.path.join(path,'energy_uj'))
+    wrap       = _read(os.path.join(path,'max_energy_range_uj'))
+    self._rate = Rate(int(wrap) if wrap else None)
+    self.watts = None
+
+  def update(self,now):
+    """ update power from the energy counter """
+
+    rate = self._rate.update(_value(self.fd),now)
+    if rate is not None:
+      self.watts = rate/1e6
+
+# --- class Power   ----------------------------------------------------------
+
+class Power:
+  """ power of the CPU-packages and state of the power-supplies """
+
+  def __init__(self,root=SYSFS_ROOT,min_age=0.5):
+    self._root    = root
+    self._min_age = min_age     # reuse updates younger than this (seconds)
+    self._lock    = threading.Lock()
+    self._updated = 0
+    self._zones   = self._find_zones()
+    self._supplies = None
+
+  # --- RAPL   ---------------------------------------------------------------
+
+  def _find_zones(self):
+    """ return zones of the packages (no subzones, no mmio-duplicates) """
+
+    base  = os.path.join(self._root,'class','powercap')
+    zones = []
+    try:
+      names = sorted(os.listdir(base))
+    except OSError:
+      return zones
+    for name in names:
+      if name.count(':') != 1 or 'mmio' in name:
+        continue
+      zone = Zone(os.path.join(base,name))
+      if zone.fd is not None and (zone.name or '').startswith('package'):
+        zones.append(zone)
+    return zones
+
+  def watts(self):
+    """ return power of all packages (W), None without RAPL """
+
+    if not self._zones:
+      return None
+    with self._lock:
+      now = time.monotonic()
+      if now - self._updated >= self._min_age:
+        self._updated = now
+        for zone in self._zones:
+          zone.update(now)
+      if any(zone.watts is None for zone in self._zones):
+        return None
+      return sum(zone.watts for zone in self._zones)
+
+  # --- power-supplies   -----------------------------------------------------
+
+  def _find_supplies(self):
+    """ return open attributes of mains (online) and batteries """
+
+    base     = os.path.join(self._root,'class','power_supply')
+    supplies = {'mains': [], 'battery': []}
+    try:
+      names = sorted(os.listdir(base))
+    except OSError:
+      return supplies
+    for name in names:
+      path  = os.path.join(base,name)
+      ptype = _read(os.path.join(path,'type'))
+      if ptype == 'Mains':
+        fd = _open(os.path.join(path,'online'))
+        if fd is not None:
+          supplies['mains'].append(fd)
+      elif ptype == 'Battery' and _read(os.path.join(path,'scope')) != 'Device':
+        supplies['battery'].append(
+          {key: _open(os.path.join(path,key))
+           for key in ['capacity','power_now','current_now','voltage_now',
+                       'status']})
+    return supplies
+
+  def _get_supplies(self):
+    """ find supplies once """
+    with self._lock:
+      if self._supplies is None:
+        self._supplies = self._find_supplies()
+      return self._supplies
+
+  def ac(self):
+    """ return 1 if on AC, 0 if not and None without power-supply info """
+
+    mains = self._get_supplies()['mains']
+    if not mains:
+      return None
+    return 1 if any(_value(fd) for fd in mains) else 0
+
+  def battery(self):
+    """ return capacity of the batteries (percent), None without battery """
+
+    values = [_value(b['capacity']) for b in self._get_supplies()['battery']
+              if b['capacity'] is not None]
+    return sum(values)/len(values) if values else None
+
+  def battery_watts(self):
+    """ return power of the batteries (W), negative while charging """
+
+    total = None
+    for b in self._get_supplies()['battery']:
+      if b['power_now'] is not None:
+        watts = _value(b['power_now'])/1e6
+      elif b['current_now'] is not None and b['voltage_now'] is not None:
+        watts = _value(b['current_now'])*_value(b['voltage_now'])/1e12
+      else:
+        continue
+      if b['status'] is not None and os.pread(b['status'],32,0).startswith(
+          b'Charging'):
+        watts = -abs(watts)
+      total = (total or 0) + watts
+    return total
+
+# --- print values   ---------------------------------------------------------
+
+if __name__ == '__main__':
+  from argparse import ArgumentParser
+  parser = ArgumentParser(description='print power and energy metrics')
+  parser.add_argument('-r','--root',default=SYSFS_ROOT,
+                      help=f"root of sysfs (default: {SYSFS_ROOT})")
+  options = parser.parse_args()
+
+  power = Power(options.root)
+  power.watts()
+  while True:
+    time.sleep(1)
+    print(f"power: {power.watts()}, ac: {power.ac()}, "
+          f"battery: {power.battery()}, battery_power: {power.battery_watts()}")
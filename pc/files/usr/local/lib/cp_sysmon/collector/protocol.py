@@ -0,0 +1,342 @@
+# ----------------------------------------------------------------------------
+# protocol.py
+#
+# Wire-protocol between cp_sysmon.py and the MCU.
+#
+# Control messages are text-lines starting with '!' and consist of a command
+# followed by key=value tokens, e.g.
+#
+#   MCU -> PC: !hello v=1 period=1000 enc=bin,csv ids=cpu,mem,disk,temp
+#   PC -> MCU: !schema enc=bin ids=cpu,mem,disk unknown=temp
+#
+#   MCU -> PC: !stats seq=17 t=123456 rx=17 drop=0 parse=850 render=9100 ...
+#              (delta-encoding: base=15, seq of the keyframe of the MCU)
+#   PC -> MCU: !stale ids=disk   (metrics with outdated values, sent on change)
+#   PC -> MCU: !page n=next      (show page: index, name or next)
+#
+# Data frames are either csv-lines (arrays as hex-strings) or binary frames:
+#
+#   SYNC type len_lo len_hi payload checksum
+#
+# The payload of a data frame ('D') starts with a header (sequence number
+# as uint16 and send-time in ms as uint32, both little endian). Then
+# follows one field per metric of the schema: scalars are int16 (fixed
+# point with one decimal, -32768: no value), arrays are a count byte
+# followed by the packed bytes (count 0: no value). Csv-lines after the
+# handshake carry the same header (empty fields: no value):
+#
+#   @seq,t,v1,v2,...
+#
+# The MCU echoes seq and t with its statistics after every frame.
+#
+# The hello may also pass the smallest visible change of every metric
+# (q=0.5,0.1,...) and the limits of its color-bands (bands=70/85,,...), both
+# in the order of the ids. The collector then skips frames without visible
+# changes, but sends at least one frame per heartbeat. Frames moving a
+# value into another color-band are sent at once.
+#
+# If the hello of the MCU asks for history (hist=width hspan=seconds), the
+# collector sends a history frame ('H') after the schema: count (uint16),
+# step in ms (uint32), number of metrics m (uint8), then count points of
+# m int16 values (the scalar metrics of the schema, -32768: no value).
+#
+# The encoding 'delta' sends keyframes ('K', payload as 'D') and change
+# frames ('C') relative to the last keyframe acknowledged by the MCU (i.e.
+# echoed as base with its statistics). While a keyframe is not yet
+# acknowledged, data frames ('D') are sent, they don't change the base of
+# the MCU. Keyframes are repeated if not acknowledged within
+# DeltaEncoder.every frames, refreshed every DeltaEncoder.every frames and
+# sent at once if the MCU reports another base (e.g. it missed a
+# keyframe). Payload of a change frame:
+# seq (uint16), send-time (uint32), seq of the keyframe (uint16), then one
+# entry per changed field: the number of skipped (unchanged) fields as
+# varint, followed by the value:
+#
+#   scalar: zigzag-varint of the difference to the keyframe (fixed point)
+#   array:  varint h, then h=0: no value, h odd: h>>1 bytes (all values),
+#           h even: h>>1 pairs of varint skip and byte (changed values)
+#
+# Varints are little endian base-128 (7 bits per byte, MSB: more bytes).
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/cp-sysmon
+# ---------------------------------------------------------------------------
+
+import struct
+
+VERSION   = 1
+SYNC      = 0xA5
+T_DATA    = ord('D')
+T_HISTORY = ord('H')
+T_KEY     = ord('K')
+T_CHANGES = ord('C')
+
+SCALAR    = 0                     # a single number
+ARRAY     = 1                     # packed bytes (e.g. per-core values)
+
+ENCODINGS = ['bin','delta','csv'] # supported encodings, preferred first
+NO_VALUE  = -0x8000               # int16 for scalars without value
+
+# --- parse control-line   ---------------------------------------------------
+
+def parse_control(line):
+  """ parse control-line, return (command,dict) or (None,None) """
+
+  if isinstance(line,bytes):
+    line = line.decode('UTF-8',errors='replace')
+  line = line.strip()
+  if not line.startswith('!'):
+    return (None,None)
+  tokens = line[1:].split()
+  if not tokens:
+    return (None,None)
+  args = {}
+  for token in tokens[1:]:
+    key,_,value = token.partition('=')
+    args[key] = value
+  return (tokens[0],args)
+
+# --- format control-line   --------------------------------------------------
+
+def format_control(cmd,**kwargs):
+  """ create control-line """
+
+  args = " ".join([f"{key}={value}" for key,value in kwargs.items()])
+  return bytes(f"!{cmd} {args}\n",'UTF-8')
+
+# --- split comma-separated list   -------------------------------------------
+
+def split_list(value):
+  """ split comma-separated list (empty value: empty list) """
+  return [v for v in value.split(',') if v] if value else []
+
+# --- create frame   ---------------------------------------------------------
+
+def frame(ftype,payload):
+  """ wrap payload into binary frame """
+
+  return (struct.pack('<BBH',SYNC,ftype,len(payload)) + payload +
+          bytes([sum(payload) & 0xFF]))
+
+# --- encode data as csv   ---------------------------------------------------
+
+def encode_csv(values,kinds,seq=None,ts=None):
+  """ encode values as csv-line (with header, unless seq is None) """
+
+  fields = [] if seq is None else [f"@{seq}",f"{ts}"]
+  for value,kind in zip(values,kinds):
+    if value is None:
+      fields.append('')
+    elif kind == ARRAY:
+      fields.append(bytes(value).hex())
+    else:
+      fields.append(f"{value}")
+  return bytes(f"{','.join(fields)}\n",'UTF-8')
+
+# --- encode data as binary frame   ------------------------------------------
+
+def to_fixed(value):
+  """ convert scalar to int16 (fixed point with one decimal) """
+  return (NO_VALUE if value is None else
+          max(-32767,min(32767,round(10*value))))
+
+def _pack(fixed,kinds,payload):
+  """ append fields (fixed point scalars or bytes) to payload """
+
+  for value,kind in zip(fixed,kinds):
+    if kind == ARRAY:
+      payload.append(len(value))
+      payload.extend(value)
+    else:
+      payload.extend(struct.pack('<h',value))
+  return payload
+
+def _to_fields(values,kinds):
+  """ convert values to fixed point scalars and bytes """
+  return [bytes(v or b'')[:255] if k == ARRAY else to_fixed(v)
+          for v,k in zip(values,kinds)]
+
+def encode_bin(values,kinds,seq=0,ts=0):
+  """ encode values as binary data-frame """
+
+  payload = bytearray(struct.pack('<HI',seq & 0xFFFF,ts & 0xFFFFFFFF))
+  return frame(T_DATA,_pack(_to_fields(values,kinds),kinds,payload))
+
+# --- encode data as keyframes and changes   ---------------------------------
+
+def append_varint(value,payload):
+  """ append unsigned varint """
+
+  while value >= 0x80:
+    payload.append(value & 0x7F | 0x80)
+    value >>= 7
+  payload.append(value)
+
+def zigzag(value):
+  """ map signed to unsigned ints (0,-1,1,-2,... -> 0,1,2,3,...) """
+  return value << 1 if value >= 0 else (-value << 1) - 1
+
+class DeltaEncoder:
+  """ encode data-frames as keyframes or changes against the last
+  keyframe acknowledged by the MCU.
+
+  The last PENDING keyframes are kept until one of them is acknowledged,
+  so an acknowledgement arriving several frames later (slow round-trip)
+  still matches.
+  """
+
+  PENDING = 4
+
+  def __init__(self,every=30):
+    self.every    = every           # refresh keyframe every n frames
+    self._base    = None            # fields of the acknowledged keyframe
+    self._seq     = 0               # its sequence number
+    self._pending = {}              # seq -> fields of unacknowledged keyframes
+    self._count   = 0               # frames since the last keyframe
+
+  def ack(self,seq,base=None):
+    """ MCU processed frame seq, base: seq of its keyframe (if reported) """
+
+    key = seq if base is None else base
+    if key in self._pending:
+      self._seq,self._base = key,self._pending[key]
+      seqs = list(self._pending)
+      self._pending = {s: self._pending[s]
+                       for s in seqs[seqs.index(key)+1:]}
+    elif base is not None and not self._pending and base != self._seq:
+      self._base = None             # MCU lost the base: send a keyframe
+
+  def encode(self,values,kinds,seq=0,ts=0):
+    """ encode values as keyframe or change frame """
+
+    fields = _to_fields(values,kinds)
+    seq    = seq & 0xFFFF
+    ts     = ts & 0xFFFFFFFF
+    key    = _pack(fields,kinds,bytearray(struct.pack('<HI',seq,ts)))
+    if self._pending and self._count < self.every:
+      self._count += 1
+      return frame(T_DATA,key)                # keyframe in flight
+    if self._base is None or self._pending or self._count >= self.every:
+      return self._keyframe(seq,fields,key)
+
+    payload = bytearray(struct.pack('<HIH',seq,ts,self._seq))
+    skip    = 0
+    for kind,old,new in zip(kinds,self._base,fields):
+      if old == new:
+        skip += 1
+        continue
+      append_varint(skip,payload)
+      skip = 0
+      if kind == ARRAY:
+        self._append_array(old,new,payload)
+      else:
+        append_varint(zigzag(new-old),payload)
+    if len(payload) >= len(key):
+      return self._keyframe(seq,fields,key)   # values drifted too far
+    self._count += 1
+    return frame(T_CHANGES,payload)
+
+  def _keyframe(self,seq,fields,payload):
+    """ send keyframe, wait for the acknowledgement """
+
+    self._pending[seq] = fields
+    if len(self._pending) > DeltaEncoder.PENDING:
+      del self._pending[next(iter(self._pending))]
+    self._count = 0
+    return frame(T_KEY,payload)
+
+  def _append_array(self,old,new,payload):
+    """ append changed array: only changed values if this is shorter """
+
+    if old and len(old) == len(new):
+      changed = [i for i in range(len(new)) if old[i] != new[i]]
+      if 2*len(changed) < len(new):
+        append_varint(len(changed) << 1,payload)
+        last = 0
+        for i in changed:
+          append_varint(i-last,payload)
+          payload.append(new[i])
+          last = i+1
+        return
+    append_varint(len(new) << 1 | 1 if new else 0,payload)
+    payload.extend(new)
+
+# --- decode binary data-frame   ---------------------------------------------
+
+def decode_bin(payload,kinds):
+  """ decode payload of a data-frame, return (seq,ts,values).
+  Raises ValueError if the payload does not match the kinds.
+  """
+
+  try:
+    seq,ts = struct.unpack_from('<HI',payload)
+    pos    = 6
+    values = []
+    for kind in kinds:
+      if kind == ARRAY:
+        count = payload[pos]
+        values.append(bytes(payload[pos+1:pos+1+count]) if count else None)
+        pos += 1+count
+      else:
+        value = struct.unpack_from('<h',payload,pos)[0]
+        values.append(None if value == NO_VALUE else value/10)
+        pos += 2
+  except (struct.error,IndexError):
+    raise ValueError("data-frame too short") from None
+  if pos != len(payload):
+    raise ValueError(f"data-frame has {len(payload)} bytes, expected {pos}")
+  return (seq,ts,values)
+
+ENCODERS = {'csv': encode_csv, 'bin': encode_bin}
+
+# --- encode history as binary frame   ---------------------------------------
+
+def encode_history(points,step_ms):
+  """ encode points (lists of scalar values, None: no value) """
+
+  m = len(points[0]) if points else 0
+  payload = bytearray(struct.pack('<HIB',len(points),step_ms,m))
+  for point in points:
+    for value in point:
+      payload.extend(struct.pack('<h',to_fixed(value)))
+  return frame(T_HISTORY,payload)
+
+# --- class Decoder   --------------------------------------------------------
+
+class Decoder:
+  """ split a byte-stream into control-lines and binary frames """
+
+  MAX_LINE = 4096
+
+  def __init__(self):
+    self._buffer = bytearray()
+
+  def feed(self,data):
+    """ add data, yield (None,line) for lines and (type,payload) for frames """
+
+    buf = self._buffer
+    buf.extend(data)
+    while buf:
+      if buf[0] == SYNC:
+        if len(buf) < 4:
+          break
+        n = buf[2] | buf[3] << 8
+        if len(buf) < n+5:
+          break
+        ftype   = buf[1]
+        payload = bytes(buf[4:n+4])
+        valid   = sum(payload) & 0xFF == buf[n+4]
+        del buf[:n+5]
+        if valid:
+          yield (ftype,payload)
+      else:
+        pos = buf.find(b'\n')
+        if pos < 0:
+          if len(buf) > Decoder.MAX_LINE:
+            buf.clear()                   # garbage
+          break
+        line = bytes(buf[:pos+1])
+        del buf[:pos+1]
+        yield (None,line)
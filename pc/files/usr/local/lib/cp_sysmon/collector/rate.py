@@ -0,0 +1,38 @@
+# ----------------------------------------------------------------------------
+# rate.py
+#
+# Turn monotonic counters (e.g. CPU-time or energy) into rates.
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/cp-sysmon
+# ---------------------------------------------------------------------------
+
+import time
+
+# --- class Rate   -----------------------------------------------------------
+
+class Rate:
+  """ rate (per second) of a counter, optionally wrapping at a maximum """
+
+  def __init__(self,wrap=None):
+    self._wrap = wrap           # counter restarts at 0 after this value
+    self._last = None
+    self._time = 0
+
+  def update(self,value,now=None):
+    """ add a reading, return the rate since the last reading.
+    Returns None for the first reading and after a reset of the counter.
+    """
+
+    now  = time.monotonic() if now is None else now
+    rate = None
+    if self._last is not None and now > self._time:
+      delta = value - self._last
+      if delta < 0 and self._wrap:
+        delta += self._wrap + 1
+      if delta >= 0:
+        rate = delta/(now-self._time)
+    self._last,self._time = value,now
+    return rate
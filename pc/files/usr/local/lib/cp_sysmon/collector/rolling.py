@@ -0,0 +1,135 @@
+# ----------------------------------------------------------------------------
+# rolling.py
+#
+# Rolling statistics of scalar metrics, available as derived metrics:
+#
+#   <id>_avg   exponentially weighted moving average (half-life in seconds)
+#   <id>_p95   95th percentile of the last n samples
+#   <id>_max   maximum of the last n samples
+#
+# The window is a fixed-size ring (array) of histogram-buckets: adding a
+# sample increments the count of its bucket and decrements the count of the
+# sample falling out of the window, so no sorting is necessary. The
+# percentile has the resolution of a bucket ((hi-lo)/buckets), the maximum
+# is exact (monotonic queue).
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/cp-sysmon
+# ---------------------------------------------------------------------------
+
+import math
+import time
+from array import array
+from collections import deque
+
+STATS = ['avg','p95','max']
+
+def derived_ids(bases):
+  """ return dict derived id -> (base id, statistic) """
+  return {f"{m}_{stat}": (m,stat) for m in bases for stat in STATS}
+
+# --- class Ewma   -----------------------------------------------------------
+
+class Ewma:
+  """ exponentially weighted moving average with a half-life (seconds) """
+
+  def __init__(self,half_life):
+    self._half_life = half_life
+    self._time      = 0
+    self.value      = None
+
+  def update(self,value,now):
+    """ add a sample, return the average """
+
+    if self.value is None or self._half_life <= 0:
+      self.value = value
+    else:
+      alpha = 1 - 0.5**((now-self._time)/self._half_life)
+      self.value += alpha*(value-self.value)
+    self._time = now
+    return self.value
+
+# --- class Window   ---------------------------------------------------------
+
+class Window:
+  """ percentiles and maximum of the last size samples """
+
+  def __init__(self,size,lo=0,hi=100,buckets=100):
+    self._size   = size
+    self._lo     = lo
+    self._width  = (hi-lo)/buckets
+    self._counts = array('I',bytes(4*buckets))
+    self._ring   = array('H',bytes(2*size))   # bucket of every sample
+    self._max    = deque()                    # (n,value), values decreasing
+    self.n       = 0                          # samples ever added
+
+  def _bucket(self,value):
+    """ return bucket of value (clamped to the range) """
+    b = int((value-self._lo)/self._width)
+    return min(max(b,0),len(self._counts)-1)
+
+  def add(self,value):
+    """ add a sample, drop the oldest if the window is full """
+
+    pos = self.n % self._size
+    if self.n >= self._size:
+      self._counts[self._ring[pos]] -= 1
+    b = self._bucket(value)
+    self._ring[pos] = b
+    self._counts[b] += 1
+
+    while self._max and self._max[-1][1] <= value:
+      self._max.pop()
+    self._max.append((self.n,value))
+    if self._max[0][0] <= self.n - self._size:
+      self._max.popleft()
+    self.n += 1
+
+  def max(self):
+    """ return maximum of the window (None if empty) """
+    return self._max[0][1] if self._max else None
+
+  def percentile(self,q):
+    """ return q-quantile (0..1) of the window (None if empty) """
+
+    count = min(self.n,self._size)
+    if not count:
+      return None
+    above = count - max(1,math.ceil(q*count))  # samples above the rank
+    for b in range(len(self._counts)-1,-1,-1):
+      above -= self._counts[b]
+      if above < 0:
+        return min(self._lo+(b+0.5)*self._width,self.max())
+
+# --- class Rolling   --------------------------------------------------------
+
+class Rolling:
+  """ statistics of the configured metrics (dict id -> (lo,hi)) """
+
+  def __init__(self,ranges,half_life=10,window=60,buckets=100):
+    self.ids      = derived_ids(ranges)
+    self._ewma    = {m: Ewma(half_life) for m in ranges}
+    self._windows = {m: Window(window,lo,hi,buckets)
+                     for m,(lo,hi) in ranges.items()}
+
+  def update(self,sample,stale=(),now=None):
+    """ add new values of the sample, return dict derived id -> value """
+
+    now = time.monotonic() if now is None else now
+    for m,ewma in self._ewma.items():
+      value = sample.get(m,None)
+      if value is not None and m not in stale:
+        ewma.update(value,now)
+        self._windows[m].add(value)
+
+    values = {}
+    for m,(base,stat) in self.ids.items():
+      if stat == 'avg':
+        values[m] = self._ewma[base].value
+      elif stat == 'p95':
+        values[m] = self._windows[base].percentile(0.95)
+      else:
+        values[m] = self._windows[base].max()
+    return values
@@ -0,0 +1,212 @@
+# ----------------------------------------------------------------------------
+# shm.py
+#
+# Publish the latest sample of the collector in shared memory (a file in
+# /dev/shm) for local consumers, e.g. a status-line of tmux.
+#
+# Layout of the file (little endian):
+#
+#   0  magic 'CPSYSSHM'
+#   8  version counter (uint32), odd while the writer updates the data
+#  12  number of metrics n (uint32)
+#  16  crc of the metric-descriptors (uint32)
+#  24  time of the sample (double, epoch)
+#  32  n descriptors: name (16 bytes), kind (uint32), offset (uint32),
+#      size (uint32), 4 bytes padding
+#      data: scalars are doubles (NaN: no value), arrays are a length
+#      (uint16) followed by the bytes
+#
+# Readers retry until they read the same even version counter before and
+# after copying the data (seqlock), so they always get a consistent
+# snapshot without locking. While the writer is busy, readers sleep
+# briefly between retries and give up after a timeout (e.g. if the writer
+# died during an update).
+#
+# This module only needs the standard library. As a script it prints the
+# latest sample:
+#
+#   python3 /usr/local/lib/cp_sysmon/collector/shm.py [-f '{cpu:.0f}%']
+#
+# Metrics without value are formatted as '-'.
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/cp-sysmon
+# ---------------------------------------------------------------------------
+
+import os
+import mmap
+import math
+import time
+import struct
+import zlib
+
+MAGIC      = b'CPSYSSHM'
+SHM_FILE   = '/dev/shm/cp_sysmon'
+HEADER     = struct.Struct('<8sIIIId')
+DESCRIPTOR = struct.Struct('<16sIII4x')
+SCALAR     = 0
+ARRAY      = 1
+ARRAY_SIZE = 256                  # max. length of arrays
+RETRY_SLEEP = 0.0005              # sleep of readers while the writer is busy
+
+# --- class Publisher   ------------------------------------------------------
+
+class Publisher:
+  """ write samples to shared memory """
+
+  def __init__(self,path,ids,kinds):
+    self.ids    = list(ids)
+    self._kinds = list(kinds)
+
+    descriptors = bytearray()
+    self._slots = []
+    offset = HEADER.size + len(ids)*DESCRIPTOR.size
+    for m,kind in zip(ids,kinds):
+      size = 8 if kind == SCALAR else 2+ARRAY_SIZE
+      descriptors.extend(DESCRIPTOR.pack(m.encode()[:16],kind,offset,size))
+      self._slots.append(offset)
+      offset += size
+    crc = zlib.crc32(descriptors)
+
+    fd = os.open(path,os.O_RDWR|os.O_CREAT,0o644)
+    try:
+      if os.fstat(fd).st_size != offset:
+        os.ftruncate(fd,offset)
+      self._mm = mmap.mmap(fd,offset)
+    finally:
+      os.close(fd)
+
+    # (re-)initialize with an odd version: readers wait until we are done
+    magic,version,n,old_crc,_,_ = HEADER.unpack_from(self._mm)
+    if magic != MAGIC:
+      version = 0
+    self._version = version | 1
+    struct.pack_into('<I',self._mm,8,self._version)
+    if n != len(ids) or old_crc != crc:
+      self._mm[HEADER.size:HEADER.size+len(descriptors)] = descriptors
+      struct.pack_into('<8s',self._mm,0,MAGIC)
+      struct.pack_into('<II',self._mm,12,len(ids),crc)
+    self._version += 1
+    struct.pack_into('<I',self._mm,8,self._version)
+
+  # --- publish sample   -----------------------------------------------------
+
+  def publish(self,values,t):
+    """ publish sample (dict id -> value, None for no value) """
+
+    mm = self._mm
+    self._version += 1                  # odd: update in progress
+    struct.pack_into('<I',mm,8,self._version)
+    struct.pack_into('<d',mm,24,t)
+    for m,kind,offset in zip(self.ids,self._kinds,self._slots):
+      value = values.get(m,None)
+      if kind == SCALAR:
+        struct.pack_into('<d',mm,offset,math.nan if value is None else value)
+      else:
+        value = bytes(value or b'')[:ARRAY_SIZE]
+        struct.pack_into('<H',mm,offset,len(value))
+        mm[offset+2:offset+2+len(value)] = value
+    self._version += 1                  # even: data is consistent
+    struct.pack_into('<I',mm,8,self._version)
+
+  def close(self):
+    self._mm.close()
+
+# --- class Reader   ---------------------------------------------------------
+
+class Reader:
+  """ read consistent snapshots from shared memory """
+
+  def __init__(self,path=SHM_FILE):
+    self._path = path
+    self._mm   = None
+    self._crc  = None
+    self._map()
+
+  def _map(self):
+    """ map file (again, the writer may have changed its size) """
+
+    if self._mm:
+      self._mm.close()
+    with open(self._path,'rb') as f:
+      self._mm = mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+    if self._mm[:8] != MAGIC:
+      raise ValueError(f"{self._path}: no data of cp_sysmon")
+
+  def _parse(self,n,crc):
+    """ parse metric-descriptors """
+
+    self._map()
+    self._crc   = crc
+    self._slots = []
+    for i in range(n):
+      name,kind,offset,size = DESCRIPTOR.unpack_from(
+        self._mm,HEADER.size+i*DESCRIPTOR.size)
+      self._slots.append((name.rstrip(b'\0').decode(),kind,offset))
+
+  def read(self,timeout=1):
+    """ return (time,dict id -> value) of the latest sample.
+    Raises TimeoutError if there is no consistent snapshot within timeout.
+    """
+
+    mm       = self._mm
+    deadline = time.monotonic() + timeout
+    while True:
+      magic,version,n,crc,_,t = HEADER.unpack_from(mm)
+      if version & 1:
+        if time.monotonic() > deadline:
+          raise TimeoutError(f"{self._path}: writer does not finish update")
+        time.sleep(RETRY_SLEEP)         # writer is busy
+        continue
+      if crc != self._crc:
+        self._parse(n,crc)
+        mm = self._mm
+      values = {}
+      for name,kind,offset in self._slots:
+        if kind == SCALAR:
+          value = struct.unpack_from('<d',mm,offset)[0]
+          values[name] = None if math.isnan(value) else value
+        else:
+          length = struct.unpack_from('<H',mm,offset)[0]
+          values[name] = mm[offset+2:offset+2+length]
+      if struct.unpack_from('<I',mm,8)[0] == version:
+        return (t,values)
+      if time.monotonic() > deadline:
+        raise TimeoutError(f"{self._path}: no consistent snapshot")
+
+  def close(self):
+    self._mm.close()
+
+# --- print latest sample   --------------------------------------------------
+
+class _Missing:
+  """ placeholder for metrics without value, ignores the format-spec """
+  def __format__(self,spec):
+    return '-'
+
+class _Values(dict):
+  """ values for str.format_map(), unknown metrics have no value """
+  def __missing__(self,key):
+    return _Missing()
+
+if __name__ == '__main__':
+  from argparse import ArgumentParser
+  parser = ArgumentParser(description='print latest sample of cp_sysmon')
+  parser.add_argument('-f','--format',
+                      help="format, e.g. '{cpu:.0f}%% {mem:.0f}%%'")
+  parser.add_argument('path',nargs='?',default=SHM_FILE,
+                      help=f"shared memory file (default: {SHM_FILE})")
+  options = parser.parse_args()
+
+  try:
+    t,values = Reader(options.path).read()
+  except (OSError,ValueError) as ex:
+    raise SystemExit(ex)
+  if options.format:
+    print(options.format.format_map(
+      _Values([(k,_Missing() if v is None else v) for k,v in values.items()])))
+  else:
+    for name,value in values.items():
+      print(f"{name}: {value.hex() if isinstance(value,bytes) else value}")
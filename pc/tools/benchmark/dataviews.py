@@ -0,0 +1,220 @@
+#!/usr/bin/python3
+# ----------------------------------------------------------------------------
+# dataviews.py
+#
+# Micro-benchmarks for the dataviews package (CPython).
+#
+# Every benchmark runs an operation a number of times and records the time
+# per run and the allocations (number of blocks and bytes still allocated
+# after the run). With --memory, the benchmark also records the high-water
+# mark of the heap, similar to gc.mem_free() before/during/after on the
+# device. Results are written as json, use --compare to compare two runs.
+#
+# Needs the requirements of the emulator (Blinka-displayio).
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/cp-sysmon
+# ----------------------------------------------------------------------------
+
+import os
+import sys
+import gc
+import json
+import time
+import subprocess
+import statistics
+import tracemalloc
+from argparse import ArgumentParser
+
+TOOLS_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+REPO_DIR  = os.path.realpath(os.path.join(TOOLS_DIR,'..','..'))
+MCU_DIR   = os.path.join(REPO_DIR,'mcu')
+FONT      = os.path.join(MCU_DIR,'fonts','DejaVuSans-16-subset.bdf')
+
+sys.path[0:0] = [os.path.join(TOOLS_DIR,'emulator','modules'),
+                 os.path.join(TOOLS_DIR,'emulator'),
+                 os.path.join(MCU_DIR,'lib')]
+
+from dataviews.Base import Color, Justify
+from dataviews.DataView import DataView
+from dataviews.DataBar import DataBar
+from dataviews.LabelItem import LabelItem
+from dataviews.ListView import ListView
+
+# --- benchmarks   -----------------------------------------------------------
+#
+# Every benchmark is a function returning (setup,run): setup() creates the
+# state outside of the measurement, run(state,i) is measured.
+
+BENCHMARKS = {}
+
+def benchmark(name):
+  """ register benchmark """
+  def register(func):
+    BENCHMARKS[name] = func
+    return func
+  return register
+
+def create_view(rows,cols,col_width=None):
+  """ create view with default (label) cells """
+  return DataView(dim=(rows,cols),width=320,height=240,
+                  col_width=col_width,border=1,divider=1,
+                  formats='{0:.1f}')
+
+def values(rows,cols,i):
+  """ values for all cells, different for every i """
+  return [float(i+k) for k in range(rows*cols)]
+
+for _rows,_cols in [(4,2),(8,4),(16,4)]:
+  def _init(rows=_rows,cols=_cols):
+    return (lambda: None,
+            lambda state,i: create_view(rows,cols))
+  benchmark(f"DataView.__init__[{_rows}x{_cols}]")(_init)
+
+  def _changed(rows=_rows,cols=_cols):
+    return (lambda: create_view(rows,cols),
+            lambda view,i: view.set_values(values(rows,cols,i)))
+  benchmark(f"DataView.set_values[{_rows}x{_cols},changed]")(_changed)
+
+  def _unchanged(rows=_rows,cols=_cols):
+    return (lambda: create_view(rows,cols),
+            lambda view,i: view.set_values(values(rows,cols,0)))
+  benchmark(f"DataView.set_values[{_rows}x{_cols},unchanged]")(_unchanged)
+
+@benchmark("DataView.set_values_at[8x2,data-column]")
+def _sparse():
+  indices = list(range(1,16,2))
+  data    = [0.0]*8
+  def run(view,i):
+    for k in range(8):
+      data[k] = float(i+k)
+    view.set_values_at(indices,data)
+  return (lambda: create_view(8,2,col_width=[0,1]),run)
+
+@benchmark("DataView.set_values[4x2,auto-width]")
+def _auto_width():
+  return (lambda: create_view(4,2,col_width='AUTO'),
+          lambda view,i: view.set_values(values(4,2,10**(i%5))))
+
+@benchmark("DataBar.set_value[sweep]")
+def _bar_sweep():
+  def setup():
+    return DataBar(size=(240,50),font=FONT,format="{0:.1f}%",
+                   color=[(Color.GREEN,70),(Color.YELLOW,85),(Color.RED,None)],
+                   text_color=Color.AQUA,text_justify=Justify.RIGHT,
+                   bg_color=Color.BLACK)
+  return (setup,lambda bar,i: bar.set_value(i%101))
+
+@benchmark("DataView.set_font[4x2]")
+def _set_font():
+  return (lambda: create_view(4,2,col_width='AUTO'),
+          lambda view,i: view.set_font(FONT))
+
+@benchmark("DataView.invert[8x4]")
+def _invert():
+  return (lambda: create_view(8,4),
+          lambda view,i: view.invert())
+
+@benchmark("ListView.layout[8 items,focus]")
+def _list_layout():
+  def setup():
+    view = ListView(width=320,height=240,border=1)
+    view.add_items([LabelItem(text=f"item {i}",border=1) for i in range(8)])
+    view.layout()
+    return view
+  def run(view,i):
+    view.set_focus(i%8)
+    view.layout()
+  return (setup,run)
+
+# --- run benchmark   --------------------------------------------------------
+
+def run_benchmark(name,repeat,memory):
+  """ run benchmark, return result-dict """
+
+  setup,run = BENCHMARKS[name]()
+  state = setup()
+  run(state,0)                          # warm up (e.g. glyph-cache)
+
+  times = []
+  for i in range(1,repeat+1):
+    start = time.perf_counter_ns()
+    run(state,i)
+    times.append((time.perf_counter_ns()-start)/1000)
+
+  # allocations of a single run (still allocated after the run)
+  gc.collect()
+  tracemalloc.start()
+  before = tracemalloc.take_snapshot()
+  run(state,repeat+1)
+  after  = tracemalloc.take_snapshot()
+  stats  = after.compare_to(before,'filename')
+  result = {'runs':         repeat,
+            'min_us':       round(min(times),1),
+            'median_us':    round(statistics.median(times),1),
+            'alloc_blocks': sum(s.count_diff for s in stats),
+            'alloc_bytes':  sum(s.size_diff for s in stats)}
+
+  if memory:
+    # high-water mark relative to the heap before the run (like the
+    # difference of gc.mem_free() on the device)
+    gc.collect()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    run(state,repeat+2)
+    result['peak_bytes'] = tracemalloc.get_traced_memory()[1] - base
+  tracemalloc.stop()
+  return result
+
+# --- compare results   ------------------------------------------------------
+
+def compare(old,new):
+  """ print relative change of the median time and allocations """
+
+  for name,res in new['results'].items():
+    if name not in old['results']:
+      continue
+    ref = old['results'][name]
+    ratio = res['median_us']/ref['median_us'] if ref['median_us'] else 0
+    print(f"{name:45s} {ref['median_us']:10.1f} -> {res['median_us']:10.1f} us "
+          f"({ratio:5.2f}x)  bytes: {ref['alloc_bytes']} -> {res['alloc_bytes']}")
+
+# --- main program   ---------------------------------------------------------
+
+if __name__ == '__main__':
+  parser = ArgumentParser(description='benchmarks for dataviews')
+  parser.add_argument('-r','--repeat',type=int,default=20,
+                      help='number of measured runs (default: 20)')
+  parser.add_argument('-m','--memory',action='store_true',
+                      help='also record heap high-water mark')
+  parser.add_argument('-k','--filter',default='',
+                      help='only run benchmarks containing this string')
+  parser.add_argument('-o','--output',help='write results to this file')
+  parser.add_argument('-c','--compare',help='compare with results in file')
+  options = parser.parse_args()
+
+  try:
+    commit = subprocess.run(['git','-C',REPO_DIR,'rev-parse','--short','HEAD'],
+                            capture_output=True,text=True).stdout.strip()
+  except OSError:
+    commit = None
+  results = {'commit': commit,
+             'python': sys.version.split()[0],
+             'results': {}}
+  for name in BENCHMARKS:
+    if options.filter in name:
+      results['results'][name] = run_benchmark(name,options.repeat,
+                                               options.memory)
+      print(f"{name:45s} {results['results'][name]}",file=sys.stderr)
+
+  if options.output:
+    with open(options.output,'w') as f:
+      json.dump(results,f,indent=2)
+  else:
+    print(json.dumps(results,indent=2))
+
+  if options.compare:
+    with open(options.compare,'r') as f:
+      compare(json.load(f),results)
@@ -0,0 +1,135 @@
+#!/usr/bin/python3
+# ----------------------------------------------------------------------------
+# imports.py
+#
+# Import-time and peak heap of the MCU-libraries from source versus
+# precompiled bytecode (emulator, CPython).
+#
+# CPython cannot load .mpy files, so the benchmark compares the same
+# situation with the bytecode of CPython: "source" imports the .py files
+# and compiles them on every import (no bytecode cache, like CircuitPython
+# without .mpy), "compiled" imports sourceless .pyc files (like a bundle of
+# pc/tools/build.py). Every run is a fresh interpreter. The libraries of
+# Blinka are imported before the measurement, so only the modules of
+# mcu/lib are measured.
+#
+# Needs the requirements of the emulator (Blinka-displayio).
+#
+#   pc/tools/benchmark/imports.py [-r 10] [-o results.json]
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/cp-sysmon
+# ----------------------------------------------------------------------------
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import compileall
+import subprocess
+import statistics
+from argparse import ArgumentParser
+
+TOOLS_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+REPO_DIR  = os.path.realpath(os.path.join(TOOLS_DIR,'..','..'))
+MCU_DIR   = os.path.join(REPO_DIR,'mcu')
+MODULES   = os.path.join(TOOLS_DIR,'emulator','modules')
+
+# modules of the MCU-program (without main, it runs the program)
+IMPORTS = ['dataviews.Base','dataviews.DataCell','dataviews.DataLabel',
+           'dataviews.DataBar','dataviews.DataHeatmap','dataviews.DataView',
+           'dataviews.DataPanel','dataviews.ListView','dataviews.LabelItem',
+           'sysmon.Layout','sysmon.Link','sysmon.Logger','sysmon.Pages']
+
+# libraries imported before the measurement
+PRELOAD = ['displayio','vectorio','terminalio','fontio',
+           'adafruit_display_text','adafruit_display_text.label',
+           'adafruit_bitmap_font.bitmap_font',
+           'adafruit_display_shapes.line','adafruit_display_shapes.rect',
+           'adafruit_display_shapes.roundrect']
+
+# measurement in a fresh interpreter (prints json)
+CHILD = f"""
+import sys, time, json, tracemalloc, importlib
+for name in {PRELOAD!r}:
+  try:
+    importlib.import_module(name)
+  except ImportError:
+    pass
+tracemalloc.start()
+start = time.perf_counter()
+for name in {IMPORTS!r}:
+  importlib.import_module(name)
+elapsed = time.perf_counter() - start
+print(json.dumps({{'ms': 1000*elapsed,
+                  'peak_kb': tracemalloc.get_traced_memory()[1]/1024}}))
+"""
+
+# --- create variants of the library   ---------------------------------------
+
+def create_variants(tmp):
+  """ copy lib as source and as sourceless bytecode, return paths """
+
+  src = os.path.join(tmp,'source')
+  pyc = os.path.join(tmp,'compiled')
+  ignore = shutil.ignore_patterns('__pycache__','*.pyc')
+  for path in [src,pyc]:
+    shutil.copytree(os.path.join(MCU_DIR,'lib'),path,ignore=ignore)
+  compileall.compile_dir(pyc,quiet=1,legacy=True)
+  for root,_,files in os.walk(pyc):
+    for name in files:
+      if name.endswith('.py'):
+        os.remove(os.path.join(root,name))
+  return {'source': src,'compiled': pyc}
+
+def size(path,suffix):
+  """ total size of all files with the suffix """
+  return sum(os.path.getsize(os.path.join(root,name))
+             for root,_,files in os.walk(path)
+             for name in files if name.endswith(suffix))
+
+# --- run benchmark   --------------------------------------------------------
+
+def run_variant(path,repeat):
+  """ import the modules repeat times, return list of measurements """
+
+  env = dict(os.environ,PYTHONDONTWRITEBYTECODE='1',
+             PYTHONPATH=os.pathsep.join([MODULES,path]))
+  runs = []
+  for _ in range(repeat):
+    result = subprocess.run([sys.executable,'-c',CHILD],env=env,
+                            capture_output=True,text=True,check=True)
+    runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+  return runs
+
+# --- main program   ---------------------------------------------------------
+
+if __name__ == '__main__':
+  parser = ArgumentParser(
+    description='import-time and heap of source vs. precompiled modules')
+  parser.add_argument('-r','--repeat',type=int,default=10,
+                      help='number of runs per variant (default: 10)')
+  parser.add_argument('-o','--output',help='write results to this file')
+  options = parser.parse_args()
+
+  tmp = tempfile.mkdtemp(prefix='cp_sysmon_')
+  try:
+    results = {}
+    for name,path in create_variants(tmp).items():
+      runs = run_variant(path,options.repeat)
+      results[name] = {
+        'bytes':   size(path,'.py' if name == 'source' else '.pyc'),
+        'ms':      round(statistics.median(r['ms'] for r in runs),2),
+        'peak_kb': round(max(r['peak_kb'] for r in runs),1)}
+  finally:
+    shutil.rmtree(tmp)
+
+  for name,r in results.items():
+    print(f"{name:10s} {r['bytes']:7d} bytes  import: {r['ms']:7.2f} ms  "
+          f"peak heap: {r['peak_kb']:7.1f} KB")
+  if options.output:
+    with open(options.output,'w') as f:
+      json.dump(results,f,indent=2)
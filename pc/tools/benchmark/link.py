@@ -0,0 +1,267 @@
+#!/usr/bin/python3
+# ----------------------------------------------------------------------------
+# link.py
+#
+# End-to-end throughput benchmark of the link (CPython).
+#
+# The benchmark runs the writer of cp_sysmon.py against a simulated MCU on
+# a pseudo-terminal. The MCU uses the Link class of mcu/lib/sysmon to
+# decode the frames and then sleeps for the render- and refresh-time of a
+# display profile. For a UART, the time on the wire is simulated from the
+# baudrate (8N1, 10 bits per byte), baudrate 0 is USB (no limit).
+#
+# The benchmark sweeps the frame rate (interval of the writer), the number
+# of fields, the encoding and the baudrate and reports the sustained frame
+# rate, the growth of the queue of unread bytes, the latency (send-time to
+# end of refresh) and dropped frames. At the end it prints the smallest
+# interval without backlog for every display profile. By default all
+# fields change with every frame, use --changing to keep most of them
+# constant (e.g. to compare the encodings bin and delta).
+#
+# Needs the requirements of the collector (pyserial, psutil).
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/cp-sysmon
+# ----------------------------------------------------------------------------
+
+import os
+import sys
+import json
+import time
+import tempfile
+import importlib.util
+import multiprocessing
+from argparse import ArgumentParser
+
+TOOLS_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+REPO_DIR  = os.path.realpath(os.path.join(TOOLS_DIR,'..','..'))
+PC_BIN    = os.path.join(REPO_DIR,'pc','files','usr','local','bin')
+PC_LIB    = os.path.join(REPO_DIR,'pc','files','usr','local','lib','cp_sysmon')
+
+sys.path[0:0] = [os.path.join(TOOLS_DIR,'emulator'),PC_LIB,
+                 os.path.join(REPO_DIR,'mcu','lib')]
+
+from ptyserial import PtySerial
+from sysmon.Layout import Layout
+from sysmon.Link import Link
+from collector.linkstats import percentiles
+
+# render- plus refresh-time per frame in ms. These are rough values from
+# the emulator, use the stats-log of the collector on the real device and
+# override them with --profile name=ms.
+PROFILES = {
+  'mini-pi-tft':   40,
+  'rp2040-geek':   50,
+  'res-touch-2.8': 65,
+  }
+
+# --- writer: cp_sysmon.py with synthetic metrics   --------------------------
+
+def writer(port,interval,encoding,ids,changing):
+  """ run the main loop of cp_sysmon.py (in a child process) """
+
+  sys.stdout = open(os.devnull,'w')
+  spec = importlib.util.spec_from_file_location(
+    'cp_sysmon',os.path.join(PC_BIN,'cp_sysmon.py'))
+  cp_sysmon = importlib.util.module_from_spec(spec)
+  spec.loader.exec_module(cp_sysmon)
+
+  cp_sysmon.INTERVAL       = interval
+  cp_sysmon.ENCODING       = encoding
+  cp_sysmon.STATS_INTERVAL = 0
+  cp_sysmon.HISTORY_FILE   = None
+  cp_sysmon.SHM_FILE       = None
+  cp_sysmon.CHANGE_DRIVEN  = False      # send every frame
+  for i,m in enumerate(ids):
+    if i < changing*len(ids):
+      cp_sysmon.METRICS[m] = (cp_sysmon.SCALAR,
+                              lambda i=i: (time.monotonic()*10+i) % 100)
+    else:
+      cp_sysmon.METRICS[m] = (cp_sysmon.SCALAR,lambda i=i: i % 100)
+  cp_sysmon.run(port)
+
+# --- simulated wire   -------------------------------------------------------
+
+class Wire:
+  """ stream counting the bytes read, simulates the time on the wire """
+
+  def __init__(self,serial,baud):
+    self._serial   = serial
+    self._baud     = baud
+    self._free     = 0             # wire is free after this time
+    self.connected = True
+    self.nbytes    = 0             # bytes read since last transfer()
+
+  def read(self,n=1):
+    data = self._serial.read(n)
+    self.nbytes += len(data)
+    return data
+
+  def readinto(self,buf):
+    n = self._serial.readinto(buf)
+    self.nbytes += n
+    return n
+
+  def readline(self):
+    data = self._serial.readline()
+    self.nbytes += len(data)
+    return data
+
+  def write(self,data):
+    return self._serial.write(data)
+
+  def transfer(self,sent_ms):
+    """ wait until the frame sent at sent_ms has passed the wire """
+
+    n,self.nbytes = self.nbytes,0
+    if not self._baud:
+      return n
+    start      = max(sent_ms/1000,self._free)
+    self._free = start + n*10/self._baud
+    delay = self._free - time.monotonic()
+    if delay > 0:
+      time.sleep(delay)
+    return n
+
+# --- create layout with n label-cells   -------------------------------------
+
+def create_layout(fields,interval):
+  """ create layout for the simulated MCU """
+
+  spec = {'period': int(interval*1000),
+          'view':   {'rows': [[{'metric': f"f{i}"}] for i in range(fields)]}}
+  with tempfile.NamedTemporaryFile('w',suffix='.json',delete=False) as f:
+    json.dump(spec,f)
+  try:
+    return Layout(f.name)
+  finally:
+    os.unlink(f.name)
+
+# --- run one configuration   ------------------------------------------------
+
+def run_link(delay_ms,interval,fields,encoding,baud,duration,changing=1):
+  """ run writer and simulated MCU, return result-dict """
+
+  serial = PtySerial(timeout=0.1)
+  wire   = Wire(serial,baud)
+  layout = create_layout(fields,interval)
+  link   = Link(wire,layout,encodings=encoding)
+  proc   = multiprocessing.Process(target=writer,daemon=True,
+                                   args=(serial.port,interval,encoding,
+                                         layout.metrics,changing))
+  proc.start()
+
+  latency = []
+  queue   = []
+  nbytes  = 0
+  try:
+    link.read()                        # first frame: handshake is done
+    wire.transfer(link.ts)
+    rx0,drop0 = link.rx,link.dropped
+    start = time.monotonic()
+    while time.monotonic() - start < duration:
+      link.read()
+      nbytes += wire.transfer(link.ts)
+      time.sleep(delay_ms/1000)        # render and refresh
+      latency.append((time.monotonic_ns()//1000000 - link.ts) & 0xFFFFFFFF)
+      queue.append(serial.queued)
+      link.report(int(delay_ms*1000),0)
+    elapsed = time.monotonic() - start
+  finally:
+    proc.terminate()
+    proc.join()
+    serial.close()
+
+  frames  = link.rx - rx0
+  p50,p90,p99,pmax = percentiles(latency)
+  result = {'profile_ms':  delay_ms,
+            'interval':    interval,
+            'fields':      fields,
+            'changing':    changing,
+            'encoding':    encoding,
+            'baud':        baud,
+            'frames':      frames,
+            'fps':         round(frames/elapsed,2),
+            'frame_bytes': nbytes//frames if frames else 0,
+            'queue_max':   max(queue,default=0),
+            'queue_growth': round((queue[-1]-queue[0])/elapsed,1) if queue else 0,
+            'latency_ms':  {'p50': p50,'p90': p90,'p99': p99,'max': pmax},
+            'drop':        link.dropped - drop0}
+  # sustainable: full frame rate, no drops, no backlog beyond two frames
+  result['ok'] = (result['fps'] >= 0.95/interval and not result['drop'] and
+                  result['queue_max'] <= 2*max(result['frame_bytes'],1))
+  return result
+
+# --- recommend interval   ---------------------------------------------------
+
+def recommend(results,profiles):
+  """ print smallest sustainable interval for every profile """
+
+  print("recommended INTERVAL (seconds):")
+  for name,delay_ms in profiles.items():
+    for baud in sorted({r['baud'] for r in results}):
+      for encoding in sorted({r['encoding'] for r in results}):
+        for fields in sorted({r['fields'] for r in results}):
+          runs = [r for r in results if r['profile_ms'] == delay_ms and
+                  r['baud'] == baud and r['encoding'] == encoding and
+                  r['fields'] == fields]
+          ok = [r['interval'] for r in runs if r['ok']]
+          link = f"uart {baud}" if baud else "usb"
+          value = min(ok) if ok else f"> {max(r['interval'] for r in runs)}"
+          print(f"  {name:15s} {link:12s} {encoding:4s} {fields:3d} fields: "
+                f"{value}")
+
+# --- main program   ---------------------------------------------------------
+
+def float_list(value):
+  return [float(v) for v in value.split(',')]
+
+def int_list(value):
+  return [int(v) for v in value.split(',')]
+
+if __name__ == '__main__':
+  parser = ArgumentParser(description='throughput benchmark of the link')
+  parser.add_argument('-i','--intervals',type=float_list,
+                      default=[1,0.5,0.2,0.1],
+                      help='intervals of the writer (default: 1,0.5,0.2,0.1)')
+  parser.add_argument('-f','--fields',type=int_list,default=[4,32],
+                      help='number of fields (default: 4,32)')
+  parser.add_argument('-c','--changing',type=float,default=1,
+                      help='fraction of fields changing every frame '
+                      '(default: 1)')
+  parser.add_argument('-e','--encodings',default='bin,csv',
+                      help='encodings (default: bin,csv)')
+  parser.add_argument('-b','--bauds',type=int_list,default=[0,115200],
+                      help='baudrates, 0 for USB (default: 0,115200)')
+  parser.add_argument('-p','--profile',action='append',default=[],
+                      metavar='NAME=MS',
+                      help='display profile with render+refresh time in ms')
+  parser.add_argument('-d','--duration',type=float,default=3,
+                      help='duration of every run in seconds (default: 3)')
+  parser.add_argument('-o','--output',help='write results to this file')
+  options = parser.parse_args()
+
+  profiles = PROFILES
+  if options.profile:
+    profiles = {}
+    for p in options.profile:
+      name,_,ms = p.partition('=')
+      profiles[name] = float(ms)
+
+  results = []
+  for delay_ms in profiles.values():
+    for baud in options.bauds:
+      for encoding in options.encodings.split(','):
+        for fields in options.fields:
+          for interval in options.intervals:
+            result = run_link(delay_ms,interval,fields,encoding,baud,
+                              options.duration,options.changing)
+            results.append(result)
+            print(json.dumps(result),file=sys.stderr)
+
+  if options.output:
+    with open(options.output,'w') as f:
+      json.dump(results,f,indent=2)
+  recommend(results,profiles)
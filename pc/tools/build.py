@@ -0,0 +1,166 @@
+#!/usr/bin/python3
+# ----------------------------------------------------------------------------
+# build.py
+#
+# Build a bundle of the MCU-program with precompiled libraries.
+#
+# CircuitPython compiles every imported .py on the device, which costs
+# startup time and heap. This tool compiles all modules below mcu/lib and
+# the main program with mpy-cross. The bundle contains boot.py, the layout
+# files, the fonts, lib/**/*.mpy and a main.py which only imports the
+# compiled main program (lib/sysmon_main.mpy). Copy the bundle to the
+# device (and remove old .py files of the libraries, they take precedence).
+#
+# mpy-cross must be the one of CircuitPython with the same major version
+# as the device, since the format of .mpy files changes between versions.
+# With --device (mount point or boot_out.txt) the versions are checked.
+# Every .mpy is validated: magic, version of the format and the same
+# format for all files.
+#
+#   pc/tools/build.py [-m mpy-cross] [-d /media/CIRCUITPY] [-o build/mcu]
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/cp-sysmon
+# ----------------------------------------------------------------------------
+
+import os
+import re
+import shutil
+import subprocess
+from argparse import ArgumentParser
+
+TOOLS_DIR = os.path.dirname(os.path.realpath(__file__))
+REPO_DIR  = os.path.realpath(os.path.join(TOOLS_DIR,'..','..'))
+MCU_DIR   = os.path.join(REPO_DIR,'mcu')
+BUILD_DIR = os.path.join(REPO_DIR,'build','mcu')
+
+MAIN_MODULE = 'sysmon_main'        # compiled main.py
+COPY        = ['boot.py','layout.json','layouts','fonts']
+
+# --- check versions   -------------------------------------------------------
+
+def mpy_cross_version(mpy_cross):
+  """ return (CircuitPython major version or None, version-string) """
+
+  try:
+    result = subprocess.run([mpy_cross,'--version'],capture_output=True,
+                            text=True,check=True)
+  except (OSError,subprocess.CalledProcessError) as ex:
+    raise SystemExit(f"{mpy_cross}: {ex}")
+  version = result.stdout.strip()
+  match   = re.search(r'CircuitPython (\d+)\.',version)
+  return (int(match.group(1)) if match else None),version
+
+def device_version(device):
+  """ return major version of CircuitPython from boot_out.txt """
+
+  path = (os.path.join(device,'boot_out.txt') if os.path.isdir(device)
+          else device)
+  with open(path,'r') as f:
+    line = f.readline()
+  match = re.search(r'CircuitPython (\d+)\.',line)
+  if not match:
+    raise SystemExit(f"{path}: no version of CircuitPython")
+  return int(match.group(1)),line.strip()
+
+# --- compile and validate   -------------------------------------------------
+
+def compile_mpy(mpy_cross,src,dest,name):
+  """ compile src to dest, name is the source-name in tracebacks """
+
+  os.makedirs(os.path.dirname(dest),exist_ok=True)
+  subprocess.run([mpy_cross,'-s',name,'-o',dest,src],check=True)
+
+def mpy_header(path):
+  """ return version of the format of a .mpy-file """
+
+  with open(path,'rb') as f:
+    header = f.read(4)
+  if len(header) < 4 or header[0] != ord('M'):
+    raise ValueError(f"{path}: not a .mpy-file")
+  return header[1]
+
+def sources():
+  """ yield (source,name in the bundle) of all modules """
+
+  lib = os.path.join(MCU_DIR,'lib')
+  for root,dirs,files in os.walk(lib):
+    dirs[:] = sorted(d for d in dirs if d != '__pycache__')
+    for name in sorted(files):
+      if name.endswith('.py'):
+        src = os.path.join(root,name)
+        yield src,os.path.relpath(src,MCU_DIR)
+  yield os.path.join(MCU_DIR,'main.py'),f"lib/{MAIN_MODULE}.py"
+
+# --- build bundle   ---------------------------------------------------------
+
+def build(mpy_cross,output):
+  """ build bundle, return list of (name,source-size,mpy-size) """
+
+  if os.path.exists(output):
+    shutil.rmtree(output)
+  os.makedirs(output)
+  for name in COPY:
+    src = os.path.join(MCU_DIR,name)
+    if os.path.isdir(src):
+      shutil.copytree(src,os.path.join(output,name))
+    elif os.path.exists(src):
+      shutil.copy2(src,output)
+  with open(os.path.join(output,'main.py'),'w') as f:
+    f.write(f"import {MAIN_MODULE}   # precompiled main.py (pc/tools/build.py)\n")
+
+  files   = []
+  version = None
+  for src,name in sources():
+    mpy = name[:-3] + '.mpy'
+    compile_mpy(mpy_cross,src,os.path.join(output,mpy),name)
+    v = mpy_header(os.path.join(output,mpy))
+    if version is None:
+      version = v
+    elif v != version:
+      raise ValueError(f"{mpy}: format {v}, other files {version}")
+    files.append((mpy,os.path.getsize(src),
+                  os.path.getsize(os.path.join(output,mpy))))
+  return files,version
+
+# --- main program   ---------------------------------------------------------
+
+if __name__ == '__main__':
+  parser = ArgumentParser(description='build bundle of the MCU-program')
+  parser.add_argument('-m','--mpy-cross',default='mpy-cross',
+                      help='mpy-cross of CircuitPython (default: mpy-cross)')
+  parser.add_argument('-d','--device',
+                      help='mount point of the device or its boot_out.txt')
+  parser.add_argument('-o','--output',default=BUILD_DIR,
+                      help=f"bundle directory (default: {BUILD_DIR})")
+  parser.add_argument('-z','--zip',action='store_true',
+                      help='also create a zip-archive of the bundle')
+  parser.add_argument('-f','--force',action='store_true',
+                      help='build even if the versions do not match')
+  options = parser.parse_args()
+
+  major,version = mpy_cross_version(options.mpy_cross)
+  print(f"mpy-cross: {version}")
+  if major is None and not options.force:
+    raise SystemExit("mpy-cross is not from CircuitPython (use --force)")
+  if options.device:
+    target,line = device_version(options.device)
+    print(f"device: {line}")
+    if target != major and not options.force:
+      raise SystemExit(f"mpy-cross is for CircuitPython {major}, "
+                       f"device runs {target} (use --force)")
+
+  try:
+    files,fmt = build(options.mpy_cross,options.output)
+  except (subprocess.CalledProcessError,ValueError) as ex:
+    raise SystemExit(ex)
+  for name,src_size,mpy_size in files:
+    print(f"  {name:32s} {src_size:7d} -> {mpy_size:6d} bytes")
+  print(f"{len(files)} files, .mpy format v{fmt}: "
+        f"{sum(f[1] for f in files)} -> {sum(f[2] for f in files)} bytes")
+  if options.zip:
+    archive = shutil.make_archive(options.output,'zip',options.output)
+    print(f"archive: {archive}")
+  print(f"bundle: {options.output}")
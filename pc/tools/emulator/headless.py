@@ -0,0 +1,97 @@
+# ----------------------------------------------------------------------------
+# headless.py
+#
+# Headless display and frame recorder for the MCU emulator.
+#
+# The display is a busdisplay.BusDisplay from Blinka-displayio on top of a
+# recording bus (see modules/fourwire.py). The bus tracks the windows
+# written to the display-RAM, i.e. the dirty area of every refresh.
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/cp-sysmon
+# ----------------------------------------------------------------------------
+
+import json
+import time
+
+# --- class Recorder   -------------------------------------------------------
+
+class Recorder:
+  """ collect per-frame timings and dirty areas """
+
+  def __init__(self):
+    self.output  = None            # file for json-lines
+    self.frames  = 0               # number of recorded frames
+    self.limit   = 0               # stop after n frames (0: never)
+    self.records = []
+    self._reset_dirty()
+
+  # --- reset dirty area   ---------------------------------------------------
+
+  def _reset_dirty(self):
+    """ reset dirty area """
+    self._dirty  = None            # bounding box (x0,y0,x1,y1)
+    self._pixels = 0               # number of written pixels
+    self._bytes  = 0               # number of bytes written to display-RAM
+
+  # --- add window written to the display-RAM   ------------------------------
+
+  def add_window(self,x0,y0,x1,y1,nbytes):
+    """ add window (inclusive coordinates) """
+
+    if self._dirty is None:
+      self._dirty = [x0,y0,x1,y1]
+    else:
+      d = self._dirty
+      d[0] = min(d[0],x0)
+      d[1] = min(d[1],y0)
+      d[2] = max(d[2],x1)
+      d[3] = max(d[3],y1)
+    self._pixels += (x1-x0+1)*(y1-y0+1)
+    self._bytes  += nbytes
+
+  # --- record frame   -------------------------------------------------------
+
+  def frame(self,args):
+    """ record statistics of a frame (arguments of the !stats line) """
+
+    self.frames += 1
+    record = {'frame':   self.frames,
+              'time':    time.monotonic(),
+              'seq':     int(args.get('seq',0)),
+              'parse':   int(args.get('parse',0)),
+              'render':  int(args.get('render',0)),
+              'refresh': int(args.get('refresh',0)),
+              'dirty':   self._dirty,
+              'pixels':  self._pixels,
+              'bytes':   self._bytes}
+    self.records.append(record)
+    if self.output:
+      self.output.write(json.dumps(record)+"\n")
+      self.output.flush()
+    self._reset_dirty()
+    if self.limit and self.frames >= self.limit:
+      raise SystemExit(0)
+
+RECORDER = Recorder()
+
+# --- settings for the builtin display   --------------------------------------
+
+BUILTIN = {'width': 240, 'height': 135, 'rotation': 0}
+
+# --- create headless display   ----------------------------------------------
+
+def create_display(bus=None,width=240,height=240,rotation=0,
+                   colstart=0,rowstart=0,**kwargs):
+  """ create display, ignoring backlight and other hardware settings """
+
+  import busdisplay
+  import fourwire
+  if bus is None:
+    bus = fourwire.FourWire(None,command=None,chip_select=None)
+  return busdisplay.BusDisplay(bus,b"",width=width,height=height,
+                               rotation=rotation,
+                               colstart=colstart,rowstart=rowstart,
+                               auto_refresh=False)
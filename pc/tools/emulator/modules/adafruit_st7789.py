@@ -0,0 +1,16 @@
+# ----------------------------------------------------------------------------
+# adafruit_st7789.py
+#
+# Emulator stand-in for the ST7789 driver: creates a headless display.
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/cp-sysmon
+# ----------------------------------------------------------------------------
+
+from headless import create_display
+
+def ST7789(bus,**kwargs):
+  """ create headless display """
+  return create_display(bus,**kwargs)
@@ -0,0 +1,43 @@
+# ----------------------------------------------------------------------------
+# board.py
+#
+# Emulator stand-in for board: every pin-name is valid, DISPLAY is a
+# headless display (size configured by the emulator).
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/cp-sysmon
+# ----------------------------------------------------------------------------
+
+import headless
+
+class Pin:
+  """ named pin """
+
+  def __init__(self,name):
+    self.name = name
+
+  def __repr__(self):
+    return f"board.{self.name}"
+
+_pins    = {}
+_display = None
+
+def __getattr__(name):
+  """ return display or pin for any name """
+  global _display
+  if name == 'DISPLAY':
+    if _display is None:
+      _display = headless.create_display(**headless.BUILTIN)
+    return _display
+  if name.startswith('_'):
+    raise AttributeError(name)
+  if name not in _pins:
+    _pins[name] = Pin(name)
+  return _pins[name]
+
+def SPI():
+  """ default SPI-bus """
+  import busio
+  return busio.SPI(clock=None)
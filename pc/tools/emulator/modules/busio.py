@@ -0,0 +1,48 @@
+# ----------------------------------------------------------------------------
+# busio.py
+#
+# Emulator stand-in for busio. SPI and I2C are placeholders for the
+# display-factory. UART uses a serial device (set by the emulator).
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/cp-sysmon
+# ----------------------------------------------------------------------------
+
+class SPI:
+  """ placeholder for SPI-bus """
+
+  def __init__(self,clock,MOSI=None,MISO=None):
+    self.clock = clock
+
+  def try_lock(self):
+    return True
+
+  def unlock(self):
+    pass
+
+  def configure(self,**kwargs):
+    pass
+
+  def write(self,data):
+    pass
+
+class I2C:
+  """ placeholder for I2C-bus """
+
+  def __init__(self,scl=None,sda=None,frequency=100000):
+    pass
+
+  def try_lock(self):
+    return True
+
+  def unlock(self):
+    pass
+
+# serial device used by UART (set by the emulator)
+uart_device = None
+
+def UART(tx,rx,baudrate=9600,**kwargs):
+  """ return the serial device of the emulator """
+  return uart_device
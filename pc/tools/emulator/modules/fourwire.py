@@ -0,0 +1,60 @@
+# ----------------------------------------------------------------------------
+# fourwire.py
+#
+# Emulator stand-in for fourwire: a display-bus that does not talk to any
+# hardware, but records the windows written to the display-RAM.
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/cp-sysmon
+# ----------------------------------------------------------------------------
+
+import struct
+
+from headless import RECORDER
+
+DISPLAY_COMMAND = 0
+CASET = 0x2A
+RASET = 0x2B
+RAMWR = 0x2C
+
+class FourWire:
+  """ recording display-bus """
+
+  def __init__(self,spi_bus,*,command,chip_select,reset=None,
+               baudrate=24000000,polarity=0,phase=0):
+    self._command = None
+    self._window  = [0,0,0,0]
+
+  def reset(self):
+    pass
+
+  def send(self,command,data,*,toggle_every_byte=False):
+    self._send(DISPLAY_COMMAND,0,bytes([command]))
+    self._send(1,0,data)
+
+  def _free(self):
+    return True
+
+  def _begin_transaction(self):
+    return True
+
+  def _end_transaction(self):
+    pass
+
+  def _release(self):
+    pass
+
+  def _send(self,data_type,chip_select,data):
+    """ track column/row window and writes to the display-RAM """
+
+    if data_type == DISPLAY_COMMAND:
+      self._command = data[0] if len(data) == 1 else None
+      return
+    if self._command == CASET and len(data) == 4:
+      self._window[0],self._window[2] = struct.unpack('>HH',data)
+    elif self._command == RASET and len(data) == 4:
+      self._window[1],self._window[3] = struct.unpack('>HH',data)
+    elif self._command == RAMWR:
+      RECORDER.add_window(*self._window,len(data))
@@ -0,0 +1,17 @@
+# ----------------------------------------------------------------------------
+# usb_cdc.py
+#
+# Emulator stand-in for usb_cdc: data is a serial device backed by the
+# master side of a pseudo-terminal (set by the emulator).
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/cp-sysmon
+# ----------------------------------------------------------------------------
+
+console = None
+data    = None
+
+def enable(console=True,data=False):
+  pass
@@ -0,0 +1,114 @@
+# ----------------------------------------------------------------------------
+# ptyserial.py
+#
+# Serial device on the master side of a pseudo-terminal with the interface
+# of usb_cdc.Serial/busio.UART. The collector opens the slave side.
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/cp-sysmon
+# ----------------------------------------------------------------------------
+
+import os
+import pty
+import fcntl
+import struct
+import termios
+import tty
+import select
+import time
+
+from headless import RECORDER
+
+# --- class PtySerial   ------------------------------------------------------
+
+class PtySerial:
+  """ serial device backed by a pty """
+
+  def __init__(self,timeout=1):
+    self._master,self._slave = pty.openpty()
+    tty.setraw(self._slave)            # no echo, no line-editing
+    self.port      = os.ttyname(self._slave)
+    self.timeout   = timeout
+    self.connected = True
+    self._buffer   = bytearray()
+    self._line     = bytearray()
+
+  # --- fill buffer   --------------------------------------------------------
+
+  def _fill(self,timeout):
+    """ read available data into the buffer, wait at most timeout """
+
+    ready,_,_ = select.select([self._master],[],[],timeout)
+    if ready:
+      self._buffer.extend(os.read(self._master,4096))
+      return True
+    return False
+
+  # --- read up to n bytes   -------------------------------------------------
+
+  def _read(self,n):
+    """ read n bytes or until timeout """
+
+    deadline = time.monotonic() + self.timeout
+    while len(self._buffer) < n:
+      remaining = deadline - time.monotonic()
+      if remaining <= 0 or not self._fill(remaining):
+        break
+    data = bytes(self._buffer[:n])
+    del self._buffer[:n]
+    return data
+
+  # --- serial interface   ---------------------------------------------------
+
+  @property
+  def in_waiting(self):
+    self._fill(0)
+    return len(self._buffer)
+
+  @property
+  def queued(self):
+    """ bytes in the pty and the buffer (without reading them) """
+    n = fcntl.ioctl(self._master,termios.FIONREAD,b'\0\0\0\0')
+    return struct.unpack('i',n)[0] + len(self._buffer)
+
+  def read(self,n=1):
+    return self._read(n)
+
+  def readinto(self,buf):
+    data = self._read(len(buf))
+    buf[:len(data)] = data
+    return len(data)
+
+  def readline(self):
+    deadline = time.monotonic() + self.timeout
+    while b'\n' not in self._buffer:
+      remaining = deadline - time.monotonic()
+      if remaining <= 0 or not self._fill(remaining):
+        break
+    pos = self._buffer.find(b'\n')
+    n = pos+1 if pos >= 0 else len(self._buffer)
+    data = bytes(self._buffer[:n])
+    del self._buffer[:n]
+    return data
+
+  def write(self,data):
+    """ write data, record statistics echoed by the MCU """
+
+    os.write(self._master,data)
+    self._line.extend(data)
+    while b'\n' in self._line:
+      pos  = self._line.find(b'\n')
+      line = bytes(self._line[:pos]).decode('utf-8','replace').split()
+      del self._line[:pos+1]
+      if line and line[0] == '!stats':
+        RECORDER.frame(dict([t.split('=',1) for t in line[1:] if '=' in t]))
+    return len(data)
+
+  def reset_input_buffer(self):
+    self._buffer.clear()
+
+  def close(self):
+    os.close(self._master)
+    os.close(self._slave)
@@ -0,0 +1,147 @@
+#!/usr/bin/python3
+# ----------------------------------------------------------------------------
+# run.py
+#
+# Run mcu/main.py unmodified on Linux (CPython).
+#
+# The emulator puts stand-ins for board, busio, usb_cdc, fourwire and the
+# display drivers in front of the module search path. Displays are headless
+# Blinka-displayio displays. usb_cdc.data (and busio.UART) is the master
+# side of a pseudo-terminal, the collector uses the slave side.
+#
+# For every frame the emulator records the parse-, render- and refresh-times
+# reported by main.py and the dirty area of the refresh as json-lines.
+#
+# Needs: adafruit-blinka-displayio, adafruit-circuitpython-display-text,
+#        adafruit-circuitpython-display-shapes, adafruit-circuitpython-bitmap-font
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/cp-sysmon
+# ----------------------------------------------------------------------------
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import subprocess
+import runpy
+import logging
+from argparse import ArgumentParser
+
+EMU_DIR   = os.path.dirname(os.path.realpath(__file__))
+REPO_DIR  = os.path.realpath(os.path.join(EMU_DIR,'..','..','..'))
+MCU_DIR   = os.path.join(REPO_DIR,'mcu')
+PC_BIN    = os.path.join(REPO_DIR,'pc','files','usr','local','bin')
+PC_LIB    = os.path.join(REPO_DIR,'pc','files','usr','local','lib','cp_sysmon')
+
+sys.path[0:0] = [os.path.join(EMU_DIR,'modules'),EMU_DIR,PC_LIB]
+
+import headless
+from ptyserial import PtySerial
+
+# --- parse arguments   ------------------------------------------------------
+
+def get_parser():
+  """ configure argument-parser """
+
+  parser = ArgumentParser(description='emulator for mcu/main.py')
+  parser.add_argument('-d','--drive',default=MCU_DIR,
+                      help='directory with main.py, lib and fonts (default: mcu)')
+  parser.add_argument('-l','--layout',
+                      help='layout file (default: layout.json of the drive)')
+  parser.add_argument('-W','--width',type=int,default=240,
+                      help='width of builtin display (default: 240)')
+  parser.add_argument('-H','--height',type=int,default=135,
+                      help='height of builtin display (default: 135)')
+  parser.add_argument('-o','--output',
+                      help='write per-frame records (json-lines) to this file')
+  parser.add_argument('-n','--frames',type=int,default=0,
+                      help='stop after n frames (default: run forever)')
+  parser.add_argument('-c','--collector',action='store_true',
+                      help='start cp_sysmon.py on the pty')
+  parser.add_argument('-L','--log-dir',
+                      help='log samples to this directory (instead of SD-card)')
+  return parser
+
+# --- create drive with a given layout   -------------------------------------
+
+def create_drive(drive,layout,log_dir=None):
+  """ create temporary drive: links to the drive plus the layout file """
+
+  tmp = tempfile.mkdtemp(prefix='cp_sysmon_')
+  for name in os.listdir(drive):
+    if name != 'layout.json':
+      os.symlink(os.path.join(drive,name),os.path.join(tmp,name))
+  with open(layout,'r') as f:
+    spec = json.load(f)
+  if log_dir:
+    # log to a local directory instead of the SD-card
+    spec['log'] = dict(spec.get('log',{}))
+    spec['log'].pop('sdcard',None)
+    spec['log']['path'] = log_dir
+  with open(os.path.join(tmp,'layout.json'),'w') as f:
+    json.dump(spec,f,indent=2)
+  return tmp
+
+# --- print summary   --------------------------------------------------------
+
+def summary(records):
+  """ print distribution of timings """
+
+  from collector.linkstats import percentiles
+  if not records:
+    print("no frames recorded")
+    return
+  print(f"frames: {len(records)}")
+  for key in ['parse','render','refresh','pixels','bytes']:
+    p50,p90,p99,pmax = percentiles([r[key] for r in records])
+    unit = 'us' if key in ['parse','render','refresh'] else ''
+    print(f"  {key:8s}{unit:2s}: p50={p50} p90={p90} p99={p99} max={pmax}")
+
+# --- main program   ---------------------------------------------------------
+
+if __name__ == '__main__':
+  options = get_parser().parse_args()
+
+  drive = os.path.realpath(options.drive)
+  temp_drive = options.layout or options.log_dir
+  if temp_drive:
+    layout = options.layout or os.path.join(drive,'layout.json')
+    log_dir = options.log_dir and os.path.realpath(options.log_dir)
+    drive = create_drive(drive,os.path.realpath(layout),log_dir)
+
+  headless.BUILTIN.update({'width': options.width,'height': options.height})
+  headless.RECORDER.limit = options.frames
+  if options.output:
+    headless.RECORDER.output = open(options.output,'w')
+
+  serial = PtySerial()
+  import usb_cdc, busio
+  usb_cdc.data      = serial
+  busio.uart_device = serial
+  print(f"emulated serial: {serial.port}")
+
+  collector = None
+  if options.collector:
+    collector = subprocess.Popen([sys.executable,
+                                  os.path.join(PC_BIN,'cp_sysmon.py'),
+                                  serial.port])
+
+  # the recorder stops main.py with SystemExit, i.e. within an asyncio-task
+  logging.getLogger('asyncio').setLevel(logging.CRITICAL)
+
+  sys.path[0:0] = [os.path.join(drive,'lib'),drive]
+  os.chdir(drive)
+  try:
+    runpy.run_path('main.py',run_name='__main__')
+  except (SystemExit,KeyboardInterrupt):
+    pass
+  finally:
+    if collector:
+      collector.terminate()
+    if temp_drive:
+      shutil.rmtree(drive)
+    summary(headless.RECORDER.records)
@@ -0,0 +1,90 @@
+#!/usr/bin/python3
+# ----------------------------------------------------------------------------
+# logdecode.py
+#
+# Convert binary log-files of the MCU (see mcu/lib/sysmon/Logger.py) to csv.
+#
+# Columns are seq, t (send-time of the collector in ms) and one column per
+# metric. Arrays are written as hex-strings, missing values as empty fields.
+# A new header-line is written if the metrics change between files.
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/cp-sysmon
+# ----------------------------------------------------------------------------
+
+import sys
+import csv
+import json
+import struct
+from argparse import ArgumentParser
+
+MAGIC    = b'SYSMONLOG'
+BLOCK    = 512
+NO_VALUE = -0x8000
+ARRAY    = 1
+
+# --- read records of a log-file   -------------------------------------------
+
+def read_log(path):
+  """ return header and list of records of a log-file """
+
+  with open(path,'rb') as f:
+    data = f.read()
+  if not data.startswith(MAGIC):
+    raise ValueError(f"{path}: not a log-file")
+  end    = data.index(b'\n')
+  header = json.loads(data[len(MAGIC):end])
+  size   = header['size']
+  fmt    = header['format']
+  block  = header['block']
+  pad    = b'\xff'*size
+
+  # whole records per block, the rest of the block is padding
+  records = []
+  start   = end+1 + (-(end+1) % BLOCK)
+  for first in range(start,len(data),block):
+    for pos in range(first,first+block-size+1,size):
+      record = data[pos:pos+size]
+      if record == pad:
+        break                           # padding of the block
+      records.append(struct.unpack(fmt,record))
+  return header,records
+
+# --- convert record to csv-fields   -----------------------------------------
+
+def to_fields(header,record):
+  """ convert values of a record """
+
+  fields = list(record[:2])
+  for kind,value in zip(header['kinds'],record[2:]):
+    if kind == ARRAY:
+      fields.append(value.hex())
+    elif value == NO_VALUE:
+      fields.append('')
+    else:
+      fields.append(value/10)
+  return fields
+
+# --- main program   ---------------------------------------------------------
+
+if __name__ == '__main__':
+  parser = ArgumentParser(description='convert log-files of the MCU to csv')
+  parser.add_argument('-o','--output',help='csv-file (default: stdout)')
+  parser.add_argument('files',nargs='+',metavar='file',
+                      help='log-files (in order)')
+  options = parser.parse_args()
+
+  out    = open(options.output,'w',newline='') if options.output else sys.stdout
+  writer = csv.writer(out)
+  ids    = None
+  for path in options.files:
+    header,records = read_log(path)
+    if header['ids'] != ids:
+      ids = header['ids']
+      writer.writerow(['seq','t']+ids)
+    for record in records:
+      writer.writerow(to_fields(header,record))
+  if options.output:
+    out.close()
@@ -0,0 +1,399 @@
+#!/usr/bin/python3
+# ----------------------------------------------------------------------------
+# mkfont.py
+#
+# Create the fonts of the MCU from the layouts: a minimal PCF-font with
+# exactly the glyphs the layouts can display.
+#
+# The glyphs are collected from the static texts, the titles and footers
+# and the formats of all layouts using a font: the literal text of a format
+# and the characters its fields can produce (e.g. digits, '.' and '-' for
+# '{0:.1f}'). A label without a value shows its format, so these characters
+# are also needed. Cells of type text show arbitrary text and need all
+# printable ASCII-characters.
+#
+# adafruit_bitmap_font parses BDF-fonts (text) line by line for every new
+# glyph, a PCF-font (binary) is read with a few seeks. The PCF-font has the
+# tables needed by adafruit_bitmap_font (properties, accelerators, metrics,
+# bitmaps and encodings, big endian, rows padded to 32 bits).
+#
+# The source is the BDF-font with the name of the font of the layout (or
+# --source), the PCF-font is written next to it. A glyph missing in the
+# source is an error. After creating the font, load-time and heap of the
+# BDF- and PCF-font are compared (needs the requirements of the emulator).
+# With --check, the tool only checks that the fonts of the layouts have all
+# glyphs and no unused ones (e.g. after changing a format).
+#
+#   pc/tools/mkfont.py [-s source.bdf] [-x chars] [-c] [layout.json ...]
+#
+# Author: Bernhard Bablok
+# License: GPL3
+#
+# Website: https://github.com/bablokb/cp-sysmon
+# ----------------------------------------------------------------------------
+
+import os
+import re
+import sys
+import gc
+import glob
+import time
+import struct
+import string
+import statistics
+import tracemalloc
+from argparse import ArgumentParser
+
+TOOLS_DIR = os.path.dirname(os.path.realpath(__file__))
+REPO_DIR  = os.path.realpath(os.path.join(TOOLS_DIR,'..','..'))
+MCU_DIR   = os.path.join(REPO_DIR,'mcu')
+
+sys.path.insert(0,os.path.join(MCU_DIR,'lib'))
+from sysmon.Layout import Layout
+
+# characters of fields of formats (by type of the format-spec)
+DIGITS    = '0123456789'
+FLOAT     = DIGITS + '.-e+'
+PRINTABLE = ''.join(chr(c) for c in range(32,127))
+FIELD_CHARS = {
+  '': FLOAT, 'g': FLOAT, 'n': FLOAT, 'G': DIGITS + '.-E+',
+  'e': FLOAT, 'E': DIGITS + '.-E+', 'f': DIGITS + '.-', 'F': DIGITS + '.-',
+  '%': DIGITS + '.-%', 'd': DIGITS + '-', 'x': DIGITS + 'abcdef-',
+  'X': DIGITS + 'ABCDEF-', 'o': '01234567-', 'b': '01-',
+  's': PRINTABLE, 'c': PRINTABLE}
+FORMAT_SPEC = re.compile(r'(?:(?P<fill>.)?[<>=^])?(?P<sign>[-+ ])?z?'
+                         r'(?P<alt>#)?0?(?P<width>\d*)(?P<group>[,_])?'
+                         r'(?:\.\d+)?(?P<type>[a-zA-Z%]?)$')
+
+# PCF: types and formats of tables
+PCF_MAGIC            = b'\x01fcp'
+PCF_PROPERTIES       = 1<<0
+PCF_ACCELERATORS     = 1<<1
+PCF_METRICS          = 1<<2
+PCF_BITMAPS          = 1<<3
+PCF_BDF_ENCODINGS    = 1<<5
+PCF_FORMAT           = 0x0c       # big endian, most significant bit first
+PCF_COMPRESSED       = 0x100      # metrics as bytes
+PCF_BYTE_MASK        = 1<<2
+PCF_GLYPH_PAD        = 2          # rows of bitmaps padded to 1<<2 bytes
+NO_GLYPH             = 0xffff
+
+# --- glyphs of the layouts   ------------------------------------------------
+
+def format_chars(fmt,text=False):
+  """ return characters a format (text: of a text-cell) can produce """
+
+  if not fmt:
+    return set(PRINTABLE if text else FLOAT)   # str(value)
+  chars = set()
+  for literal,field,spec,_ in string.Formatter().parse(fmt):
+    chars.update(literal)
+    if field is None:
+      continue
+    match = FORMAT_SPEC.match(spec or '')
+    if not match:
+      raise ValueError(f"invalid format: {fmt}")
+    chars.update(PRINTABLE if text else FIELD_CHARS[match.group('type')])
+    if match.group('width') or match.group('fill'):
+      chars.add(match.group('fill') or ' ')
+    for key in ['sign','group']:
+      if match.group(key):
+        chars.add(match.group(key))
+    if match.group('alt'):
+      chars.update('0xXob')
+  return chars
+
+def layout_glyphs(path):
+  """ return dict font -> characters needed by the layout """
+
+  layout = Layout(path)
+  fonts  = {}
+  for page in layout.pages:
+    spec  = page['spec']
+    types = {}                                   # cell-index -> spec
+    for r,c,ctype,cspec in page['objects']:
+      types[c+r*page['dim'][1]] = (ctype,cspec)
+
+    chars = fonts.setdefault(layout.font,set())
+    for r,row in enumerate(spec['rows']):
+      for c,cell in enumerate(row):
+        index = c+r*page['dim'][1]
+        if 'text' in cell:
+          chars.update(cell['text'])
+          continue
+        ctype,cspec = types.get(index,('label',{}))
+        fmt = cspec.get('format',None) or page['formats'][index] or ''
+        if ctype == 'heatmap':
+          continue
+        if ctype == 'bar':
+          chars.update(format_chars(fmt) if fmt else ())
+          continue
+        # labels show their format without a value
+        chars.update(fmt)
+        chars.update(format_chars(fmt,text=ctype=='text'))
+
+    for key in ['title','footer']:
+      if key in spec:
+        fonts.setdefault(spec[key].get('font',None),set()).update(
+          spec[key].get('text',''))
+  fonts.pop(None,None)                           # builtin font
+  return fonts
+
+# --- read fonts   -----------------------------------------------------------
+
+def read_bdf(path):
+  """ return properties (list of (name,value)) and glyphs (code -> glyph) """
+
+  props  = []
+  glyphs = {}
+  with open(path,'r',encoding='latin-1') as f:
+    lines = iter(f.read().splitlines())
+  for line in lines:
+    key,_,value = line.partition(' ')
+    if key == 'FONT':
+      name = value
+    elif key == 'STARTPROPERTIES':
+      for line in lines:
+        if line == 'ENDPROPERTIES':
+          break
+        pkey,_,pvalue = line.partition(' ')
+        if pvalue.startswith('"'):
+          props.append((pkey,pvalue[1:-1].replace('""','"')))
+        else:
+          props.append((pkey,int(pvalue)))
+    elif key == 'STARTCHAR':
+      glyph = {'name': value}
+      for line in lines:
+        gkey,_,gvalue = line.partition(' ')
+        if gkey == 'ENCODING':
+          glyph['code'] = int(gvalue.split()[0])
+        elif gkey == 'DWIDTH':
+          glyph['width'] = int(gvalue.split()[0])
+        elif gkey == 'BBX':
+          glyph['bbx'] = tuple(int(v) for v in gvalue.split())
+        elif gkey == 'BITMAP':
+          rows = []
+          for line in lines:
+            if line == 'ENDCHAR':
+              break
+            rows.append(bytes.fromhex(line))
+          glyph['rows'] = rows
+          break
+      if glyph.get('code',-1) >= 0:
+        glyphs[glyph['code']] = glyph
+  if not any(key == 'FONT' for key,_ in props):
+    props.insert(0,('FONT',name))
+  return props,glyphs
+
+def read_pcf_codes(path):
+  """ return code-points of the glyphs of a PCF-font """
+
+  with open(path,'rb') as f:
+    data = f.read()
+  if data[:4] != PCF_MAGIC:
+    raise ValueError(f"{path}: not a PCF-font")
+  count, = struct.unpack_from('<I',data,4)
+  for i in range(count):
+    ttype,_,_,offset = struct.unpack_from('<4I',data,8+16*i)
+    if ttype == PCF_BDF_ENCODINGS:
+      break
+  else:
+    raise ValueError(f"{path}: no encodings")
+  fmt, = struct.unpack_from('<I',data,offset)
+  order = '>' if fmt & PCF_BYTE_MASK else '<'
+  min2,max2,min1,max1,_ = struct.unpack_from(order+'5h',data,offset+4)
+  n       = (max2-min2+1)*(max1-min1+1)
+  indices = struct.unpack_from(f"{order}{n}H",data,offset+14)
+  return {((i // (max2-min2+1)) + min1) << 8 | (i % (max2-min2+1)) + min2
+          for i,index in enumerate(indices) if index != NO_GLYPH}
+
+def font_codes(path):
+  """ return code-points of the glyphs of a BDF- or PCF-font """
+  if path.endswith('.pcf'):
+    return read_pcf_codes(path)
+  return set(read_bdf(path)[1])
+
+# --- write PCF-font   -------------------------------------------------------
+
+def _metrics(glyph):
+  """ return metrics (lsb,rsb,width,ascent,descent) of a glyph """
+  w,h,x,y = glyph['bbx']
+  return (x,x+w,glyph['width'],h+y,-y)
+
+def _bitmap(glyph,pad):
+  """ return rows of the glyph padded to pad bytes """
+  w  = glyph['bbx'][0]
+  nb = (w+8*pad-1)//(8*pad)*pad
+  return b''.join(row[:nb].ljust(nb,b'\x00') for row in glyph['rows'])
+
+def _properties(props):
+  strings = bytearray()
+  def offset(s):
+    pos = len(strings)
+    strings.extend(s.encode('latin-1')+b'\x00')
+    return pos
+  entries = b''.join(struct.pack('>IBI',offset(key),isinstance(value,str),
+                                 offset(value) if isinstance(value,str)
+                                 else value & 0xffffffff)
+                     for key,value in props)
+  pad = (4 - len(props) % 4) % 4
+  return (PCF_FORMAT,struct.pack('>I',len(props)) + entries + bytes(pad) +
+          struct.pack('>I',len(strings)) + bytes(strings))
+
+def _accelerators(metrics,props):
+  minb = [min(m[i] for m in metrics) for i in range(5)]
+  maxb = [max(m[i] for m in metrics) for i in range(5)]
+  ascent  = props.get('FONT_ASCENT',maxb[3])
+  descent = props.get('FONT_DESCENT',maxb[4])
+  overlap = max(m[1]-m[2] for m in metrics)
+  constant_metrics = minb == maxb
+  ink_inside = all(m[0] >= 0 and m[1] <= m[2] and m[3] <= ascent and
+                   m[4] <= descent for m in metrics)
+  data = struct.pack('>8B3i',overlap <= minb[0],constant_metrics,
+                     constant_metrics and minb[0] >= 0 and ink_inside,
+                     minb[2] == maxb[2],ink_inside,0,0,0,
+                     ascent,descent,overlap)
+  data += struct.pack('>5hH',*minb,0) + struct.pack('>5hH',*maxb,0)
+  return PCF_FORMAT,data
+
+def _metrics_table(metrics):
+  if all(-128 <= v < 128 for m in metrics for v in m):
+    return (PCF_FORMAT | PCF_COMPRESSED,struct.pack('>h',len(metrics)) +
+            b''.join(bytes(v+0x80 for v in m) for m in metrics))
+  return (PCF_FORMAT,struct.pack('>i',len(metrics)) +
+          b''.join(struct.pack('>5hH',*m,0) for m in metrics))
+
+def _bitmaps(glyphs):
+  data    = [_bitmap(g,1<<PCF_GLYPH_PAD) for g in glyphs]
+  offsets = [sum(len(d) for d in data[:i]) for i in range(len(data))]
+  sizes   = [sum(len(_bitmap(g,1<<pad)) for g in glyphs) for pad in range(4)]
+  return (PCF_FORMAT | PCF_GLYPH_PAD,
+          struct.pack(f">I{len(data)}I4I",len(data),*offsets,*sizes) +
+          b''.join(data))
+
+def _encodings(codes):
+  min1,max1 = min(c >> 8 for c in codes),max(c >> 8 for c in codes)
+  min2,max2 = min(c & 0xff for c in codes),max(c & 0xff for c in codes)
+  indices = [NO_GLYPH]*((max1-min1+1)*(max2-min2+1))
+  for i,code in enumerate(codes):
+    indices[((code >> 8)-min1)*(max2-min2+1) + (code & 0xff)-min2] = i
+  default = 32 if 32 in codes else codes[0]
+  return (PCF_FORMAT,struct.pack(f">5h{len(indices)}H",min2,max2,min1,max1,
+                                 default,*indices))
+
+def write_pcf(path,props,glyphs):
+  """ write glyphs (dict code -> glyph) as PCF-font """
+
+  codes   = sorted(glyphs)
+  glyphs  = [glyphs[c] for c in codes]
+  metrics = [_metrics(g) for g in glyphs]
+  tables  = [(PCF_PROPERTIES,_properties(props)),
+             (PCF_ACCELERATORS,_accelerators(metrics,dict(props))),
+             (PCF_METRICS,_metrics_table(metrics)),
+             (PCF_BITMAPS,_bitmaps(glyphs)),
+             (PCF_BDF_ENCODINGS,_encodings(codes))]
+
+  toc    = PCF_MAGIC + struct.pack('<I',len(tables))
+  body   = b''
+  offset = len(toc) + 16*len(tables)
+  for ttype,(fmt,data) in tables:
+    table = struct.pack('<I',fmt) + data
+    table += bytes(-len(table) % 4)
+    toc   += struct.pack('<4I',ttype,fmt,len(table),offset+len(body))
+    body  += table
+  with open(path,'wb') as f:
+    f.write(toc+body)
+
+# --- compare load-time and heap   -------------------------------------------
+
+def load_report(paths,chars,repeat):
+  """ print load-time and heap of the fonts (with the needed glyphs) """
+
+  try:
+    from adafruit_bitmap_font import bitmap_font
+  except ImportError:
+    print("  (install the requirements of the emulator for load-times)")
+    return
+  for path in paths:
+    runs = []
+    for _ in range(repeat):
+      gc.collect()
+      tracemalloc.start()
+      start = time.perf_counter()
+      font  = bitmap_font.load_font(path)
+      font.load_glyphs({ord(c) for c in chars})
+      elapsed = time.perf_counter() - start
+      current,peak = tracemalloc.get_traced_memory()
+      tracemalloc.stop()
+      del font
+      runs.append((elapsed,current,peak))
+    print(f"  {os.path.basename(path):32s} "
+          f"load: {1000*statistics.median(r[0] for r in runs):7.2f} ms  "
+          f"heap: {runs[-1][1]/1024:6.1f} KB (peak {runs[-1][2]/1024:6.1f} KB)")
+
+# --- main program   ---------------------------------------------------------
+
+def show(chars):
+  """ printable representation of a set of characters """
+  return ''.join(sorted(chars))
+
+if __name__ == '__main__':
+  layouts = ([os.path.join(MCU_DIR,'layout.json')] +
+             sorted(glob.glob(os.path.join(MCU_DIR,'layouts','*.json'))))
+  parser = ArgumentParser(description='create fonts of the MCU from layouts')
+  parser.add_argument('-s','--source',
+                      help='BDF-font with all glyphs (default: from layout)')
+  parser.add_argument('-x','--extra',default='',
+                      help='additional characters')
+  parser.add_argument('-c','--check',action='store_true',
+                      help='only check the fonts of the layouts')
+  parser.add_argument('-r','--repeat',type=int,default=5,
+                      help='runs of the load-report (default: 5, 0: off)')
+  parser.add_argument('layouts',nargs='*',metavar='layout',default=layouts,
+                      help='layout-files (default: all layouts of mcu)')
+  options = parser.parse_args()
+
+  # glyphs of all fonts (fonts are relative to the root of the device)
+  fonts = {}
+  for path in options.layouts:
+    for font,chars in layout_glyphs(path).items():
+      fonts.setdefault(os.path.join(MCU_DIR,font),set()).update(chars)
+  for chars in fonts.values():
+    chars.update(options.extra)
+
+  errors = 0
+  for font,chars in fonts.items():
+    codes = {ord(c) for c in chars}
+    name  = os.path.relpath(font,MCU_DIR)
+    if options.check:
+      have    = font_codes(font)
+      missing = codes - have
+      unused  = have - codes
+      print(f"{name}: {len(codes)} glyphs needed, {len(have)} in font")
+      if missing:
+        print(f"  missing: {show(chr(c) for c in missing)}")
+        errors += 1
+      if unused:
+        print(f"  unused:  {show(chr(c) for c in unused)}")
+      continue
+
+    source  = options.source or os.path.splitext(font)[0] + '.bdf'
+    output  = os.path.splitext(font)[0] + '.pcf'
+    props,glyphs = read_bdf(source)
+    missing = codes - set(glyphs)
+    if missing:
+      print(f"{os.path.relpath(source)}: missing glyphs "
+            f"{show(chr(c) for c in missing)} for {name}")
+      errors += 1
+      continue
+    write_pcf(output,props,{c: glyphs[c] for c in codes})
+    print(f"{os.path.relpath(output)}: {len(codes)} of {len(glyphs)} glyphs "
+          f"({show(chars)})")
+    print(f"  {os.path.getsize(source)} -> {os.path.getsize(output)} bytes")
+    if options.repeat > 0:
+      load_report([source,output],chars,options.repeat)
+    if not name.endswith('.pcf'):
+      print(f"  change \"font\" of the layouts to "
+            f"\"{os.path.relpath(output,MCU_DIR)}\"")
+
+  sys.exit(1 if errors else 0)